@@ -0,0 +1,287 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: benchmarks of FFIEC_Client against the local stub FFIEC server
+# Usage: python -m benchmarks.bench [--panel-size 5000] [--latency 0.05] ...
+#   from the repository root; prints client startup time, calls per second,
+#   per-call latency, parse time and peak RSS for each retrieve_* method
+# ------------------------------------------------------------------------------
+
+# PSL
+import argparse
+import gc
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from functools import partial
+
+# ffipy
+from ffipy import FFIEC_Client, fast, template
+from ffipy.bulk import RETRY_ERRORS
+from ffipy.parse import parse_facsimile
+from ffipy.transport import PooledTransport
+
+from tests.stub_server import StubServer
+from tests.utils import seed_cache
+
+PERIOD = '3/31/2017'
+
+
+def _calls(func, n):
+    """Calls func n times.
+
+    Returns:
+        times (list of floats): seconds taken by each call
+        failures (int): calls that raised a fault or network error
+    """
+    times = []
+    failures = 0
+    for _ in range(n):
+        start = time.perf_counter()
+        try:
+            func()
+        except RETRY_ERRORS:
+            failures += 1
+        times.append(time.perf_counter() - start)
+    return times, failures
+
+
+def _stub(args):
+    return StubServer(panel_size=args.panel_size, pdf_size=args.pdf_size,
+                      items=args.items, latency=args.latency,
+                      fault_rate=args.fault_rate)
+
+
+def bench_startup_cold(args, stub):
+    """Client creation, downloading and parsing the WSDL."""
+    class StubClient(FFIEC_Client):
+        wsdl = stub.url + '?WSDL'
+
+    def create():
+        StubClient(wsse=('user', 'token'), check_login=False,
+                   transport=PooledTransport())
+    return _calls(create, max(1, args.calls // 10))
+
+
+def bench_startup_warm(args, stub):
+    """Client creation with the WSDL cached."""
+    cache = seed_cache()
+
+    def create():
+        FFIEC_Client(wsse=('user', 'token'), check_login=False,
+                     transport=PooledTransport(cache=cache))
+    return _calls(create, max(1, args.calls // 10))
+
+
+def _method(name, memo=False, **kwargs):
+    """Returns a benchmark of calling client method `name`.
+
+    Memoization is off unless `memo` is True, so each call goes to the stub;
+    with it, calls after the first time memo hits.
+    """
+    def bench(args, stub):
+        client = stub.client(memo_ttls=None if memo else {})
+        return _calls(partial(getattr(client, name), **kwargs), args.calls)
+    return bench
+
+
+def bench_retrieve_facsimiles(args, stub):
+    """retrieve_facsimiles of PDFs with `--workers` threads, per facsimile."""
+    client = stub.client(transport=PooledTransport(
+        pool_size=args.workers, cache=seed_cache()))
+    requests = [('Call', PERIOD, 'ID_RSSD', n, 'PDF')
+                for n in range(1, args.calls + 1)]
+    start = time.perf_counter()
+    results = list(client.retrieve_facsimiles(requests,
+                                              max_workers=args.workers,
+                                              retries=0))
+    elapsed = time.perf_counter() - start
+    failures = sum(result.error is not None for result in results)
+    return [elapsed / len(results)] * len(results), failures
+
+
+def _parse(operation, params, parse=None):
+    """Returns a benchmark of parsing one response to `operation` called
+    with `params`, with `parse`, or with zeep if it is None."""
+    def bench(args, stub):
+        client = stub.client()
+        service = client.service
+        binding = service._binding
+        envelope, headers = binding._create(
+            operation, params, {}, client=client,
+            options=service._binding_options)
+        response = client.transport.post_xml(
+            service._binding_options['address'], envelope, headers)
+        if parse is None:
+            func = partial(binding.process_reply, client,
+                           binding.get(operation), response)
+        else:
+            func = partial(parse, response.content)
+        return _calls(func, max(1, args.calls // 5))
+    return bench
+
+
+def _request(templated):
+    """Returns a benchmark of building one RetrieveFacsimile request, from
+    its template or by zeep."""
+    def bench(args, stub):
+        client = stub.client()
+        if not templated:
+            # Without templates, requests are built by zeep
+            client.request_templates = None
+        func = partial(template.request, client, 'RetrieveFacsimile',
+                       ('Call', PERIOD, 'ID_RSSD', 1, 'PDF'))
+        return _calls(func, args.calls * 50)
+    return bench
+
+
+def _parse_facsimile(fmt):
+    """Returns a benchmark of parse_facsimile on a `fmt` facsimile."""
+    def bench(args, stub):
+        facsimile = stub.client().retrieve_facsimile(
+            fiID=1, facsimile_fmt=fmt)
+        return _calls(partial(parse_facsimile, facsimile), args.calls)
+    return bench
+
+
+BENCHMARKS = [
+    ('startup_cold', bench_startup_cold),
+    ('startup_warm', bench_startup_warm),
+    ('test_user_access', _method('test_user_access')),
+    ('retrieve_reporting_periods', _method('retrieve_reporting_periods')),
+    ('retrieve_ubpr_reporting_periods',
+     _method('retrieve_ubpr_reporting_periods')),
+    ('retrieve_panel_of_reporters', _method('retrieve_panel_of_reporters')),
+    ('retrieve_panel_of_reporters_raw',
+     _method('retrieve_panel_of_reporters', raw=True)),
+    ('retrieve_reporting_periods_memo',
+     _method('retrieve_reporting_periods', memo=True)),
+    ('retrieve_panel_of_reporters_memo',
+     _method('retrieve_panel_of_reporters', memo=True)),
+    ('retrieve_filers_since_date', _method('retrieve_filers_since_date')),
+    ('retrieve_filers_since_date_raw',
+     _method('retrieve_filers_since_date', raw=True)),
+    ('retrieve_filers_submission_datetime',
+     _method('retrieve_filers_submission_datetime')),
+    ('retrieve_filers_submission_datetime_raw',
+     _method('retrieve_filers_submission_datetime', raw=True)),
+    ('retrieve_facsimile_pdf', _method('retrieve_facsimile',
+                                       facsimile_fmt='PDF')),
+    ('retrieve_facsimile_xbrl', _method('retrieve_facsimile',
+                                        facsimile_fmt='XBRL')),
+    ('retrieve_facsimile_sdf', _method('retrieve_facsimile',
+                                       facsimile_fmt='SDF')),
+    ('retrieve_ubpr_xbrl_facsimile', _method('retrieve_ubpr_xbrl_facsimile')),
+    ('retrieve_facsimiles', bench_retrieve_facsimiles),
+    ('parse_user_access_zeep', _parse('TestUserAccess', ())),
+    ('parse_reporting_periods_zeep', _parse('RetrieveReportingPeriods',
+                                            ('Call',))),
+    ('parse_ubpr_reporting_periods_zeep',
+     _parse('RetrieveUBPRReportingPeriods', ())),
+    ('parse_panel_zeep', _parse('RetrievePanelOfReporters',
+                                ('Call', PERIOD))),
+    ('parse_panel_fast', _parse('RetrievePanelOfReporters', ('Call', PERIOD),
+                                fast.parse_panel_of_reporters)),
+    ('parse_filers_since_date_zeep',
+     _parse('RetrieveFilersSinceDate', ('Call', PERIOD, PERIOD))),
+    ('parse_filers_since_date_fast',
+     _parse('RetrieveFilersSinceDate', ('Call', PERIOD, PERIOD),
+            fast.parse_filers_since_date)),
+    ('parse_filers_submission_datetime_zeep',
+     _parse('RetrieveFilersSubmissionDateTime', ('Call', PERIOD, PERIOD))),
+    ('parse_filers_submission_datetime_fast',
+     _parse('RetrieveFilersSubmissionDateTime', ('Call', PERIOD, PERIOD),
+            fast.parse_filers_submission_datetime)),
+    ('parse_facsimile_pdf_zeep',
+     _parse('RetrieveFacsimile', ('Call', PERIOD, 'ID_RSSD', 1, 'PDF'))),
+    ('parse_facsimile_pdf_fast',
+     _parse('RetrieveFacsimile', ('Call', PERIOD, 'ID_RSSD', 1, 'PDF'),
+            fast.parse_facsimile_result)),
+    ('parse_ubpr_xbrl_facsimile_zeep',
+     _parse('RetrieveUBPRXBRLFacsimile', (PERIOD, 'ID_RSSD', 1))),
+    ('parse_ubpr_xbrl_facsimile_fast',
+     _parse('RetrieveUBPRXBRLFacsimile', (PERIOD, 'ID_RSSD', 1),
+            fast.parse_ubpr_xbrl_facsimile_result)),
+    ('request_zeep', _request(False)),
+    ('request_template', _request(True)),
+    ('parse_xbrl', _parse_facsimile('XBRL')),
+    ('parse_sdf', _parse_facsimile('SDF')),
+]
+
+
+def run_one(name, args):
+    """Runs benchmark `name` against a fresh stub; returns its summary."""
+    bench = dict(BENCHMARKS)[name]
+    with _stub(args) as stub:
+        gc.collect()
+        times, failures = bench(args, stub)
+    times.sort()
+    total = sum(times)
+    return {'name': name, 'calls': len(times), 'failures': failures,
+            'seconds': total,
+            'calls_per_sec': len(times) / total if total else float('inf'),
+            'p50_ms': 1000 * times[len(times) // 2],
+            'p95_ms': 1000 * times[min(len(times) - 1,
+                                       int(len(times) * 0.95))],
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF)
+            .ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks FFIEC_Client against a local stub server.')
+    parser.add_argument('names', nargs='*', metavar='benchmark',
+                        help='benchmarks to run (default is all): %s'
+                        % ', '.join(name for name, _ in BENCHMARKS))
+    parser.add_argument('--calls', type=int, default=20,
+                        help='calls per benchmark (default is 20)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='threads for retrieve_facsimiles (default is 8)')
+    parser.add_argument('--panel-size', type=int, default=5000,
+                        help='institutions in the panel (default is 5000)')
+    parser.add_argument('--pdf-size', type=int, default=300 * 1024,
+                        help='bytes per PDF facsimile (default is 300 KiB)')
+    parser.add_argument('--items', type=int, default=2000,
+                        help='items per SDF/XBRL facsimile (default is 2000)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the stub delays replies (default is 0)')
+    parser.add_argument('--fault-rate', type=float, default=0.0,
+                        help='probability a call faults (default is 0)')
+    parser.add_argument('--no-isolate', action='store_true',
+                        help='run all benchmarks in this process, so peak '
+                             'RSS accumulates')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON lines')
+    args = parser.parse_args(argv)
+    names = args.names or [name for name, _ in BENCHMARKS]
+    unknown = set(names) - set(dict(BENCHMARKS))
+    if unknown:
+        parser.error('unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+
+    if not args.json:
+        print('%-40s %6s %6s %10s %9s %9s %9s'
+              % ('benchmark', 'calls', 'failed', 'calls/s', 'p50 ms',
+                 'p95 ms', 'RSS MB'))
+    for name in names:
+        if args.no_isolate:
+            result = run_one(name, args)
+        else:
+            # A process per benchmark, so peak RSS is the benchmark's own
+            ctx = multiprocessing.get_context('spawn')
+            with ctx.Pool(1) as pool:
+                result = pool.apply(run_one, (name, args))
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print('%-40s %6d %6d %10.1f %9.2f %9.2f %9.1f'
+                  % (name, result['calls'], result['failures'],
+                     result['calls_per_sec'],
+                     result['p50_ms'], result['p95_ms'],
+                     result['peak_rss_mb']))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
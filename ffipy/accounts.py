@@ -0,0 +1,383 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: spread high-volume retrievals over several FFIEC accounts
+# Usage: ClientPool() loads every `[wsse]` / `[wsse:<name>]` section of
+#   `~/.ffiec` (or FFIEC_USER_CONF), keeps a client per account, and shards
+#   `retrieve_facsimiles` requests (or any method via `call`) over the accounts
+#   that are healthy and under quota
+# ------------------------------------------------------------------------------
+
+# PSL
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from functools import partial
+
+# 3rd party libs
+import zeep
+from zeep.wsse.username import UsernameToken
+
+# ffipy
+from . import bulk, snapshot
+from .cache import WSDLCache
+from .ffipy import FFIEC_Client
+from .transport import PooledTransport
+
+# Fault messages that mean the account's login was rejected
+LOGIN_FAULT = re.compile(r'login|password|token|authenticat|unauthori|'
+                         r'credential', re.IGNORECASE)
+
+
+def is_login_fault(error):
+    """Returns True if `error` means the FFIEC site rejected the login."""
+    if isinstance(error, zeep.exceptions.Fault):
+        return bool(LOGIN_FAULT.search(error.message or ''))
+    if isinstance(error, zeep.exceptions.TransportError):
+        return error.status_code in (401, 403)
+    return False
+
+
+class Account(object):
+    """ An FFIEC account of a ClientPool and its health.
+
+    Args:
+        name (str): name of the account
+        wsse (UsernameToken or tuple): the account's login
+        quota (int): calls the account may make per quota period; the pool's
+            quota, if None (default is None)
+
+    Attributes:
+        client (FFIEC_Client): the account's client, once the pool made it
+        active (int): calls in progress
+        calls (int): calls finished
+        errors (int): calls that failed with a fault or network error
+        failures (int): consecutive calls that failed
+        cooldown_until (float): `time.monotonic()` until which the account is
+            out of rotation after `max_failures` failures
+        disabled (str): why the account is out of rotation for good (e.g. its
+            login fault); None while it is in rotation
+        used (int): calls started in the current quota period
+    """
+
+    def __init__(self, name, wsse, quota=None):
+        self.name = name
+        self.wsse = (wsse if isinstance(wsse, UsernameToken)
+                     else UsernameToken(*wsse))
+        self.quota = quota
+        self.client = None
+        self.active = 0
+        self.calls = 0
+        self.errors = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.disabled = None
+        self.used = 0
+        self.period_start = time.monotonic()
+        self.last_used = 0.0
+
+    @property
+    def state(self):
+        """Returns 'disabled', 'cooling', 'exhausted' or 'ok'."""
+        if self.disabled is not None:
+            return 'disabled'
+        if self.cooldown_until > time.monotonic():
+            return 'cooling'
+        if self.quota is not None and self.used >= self.quota:
+            return 'exhausted'
+        return 'ok'
+
+    def __repr__(self):
+        return ('Account(%r, state=%r, active=%d, calls=%d, errors=%d)'
+                % (self.name, self.state, self.active, self.calls,
+                   self.errors))
+
+
+def load_accounts(path=None):
+    """Loads the accounts in an FFIEC login file.
+
+    The file is the one FFIEC_Client writes, with one section per account:
+    `[wsse]` and/or `[wsse:<name>]`, each with `username` and `password` and
+    an optional `quota` of calls per quota period.
+
+    Args:
+        path (str): path to the file (default is FFIEC_USER_CONF or
+            ~/.ffiec)
+
+    Returns:
+        accounts (list of Accounts): in the order of the file; the account
+            of `[wsse]` is named by its username
+
+    Raises:
+        ValueError: if the file is missing or has no accounts
+    """
+    if path is None:
+        path = os.getenv('FFIEC_USER_CONF',
+                         os.path.join(os.environ['HOME'], '.ffiec'))
+    conf = ConfigParser()
+    if not conf.read(path):
+        raise ValueError('No FFIEC login file at %s' % path)
+    accounts = []
+    for section in conf.sections():
+        if section != 'wsse' and not section.startswith('wsse:'):
+            continue
+        options = conf[section]
+        name = section[5:].strip() or options['username']
+        accounts.append(Account(name, (options['username'],
+                                       options['password']),
+                                options.getint('quota', fallback=None)))
+    if not accounts:
+        raise ValueError('No [wsse] sections in %s' % path)
+    return accounts
+
+
+class ClientPool(object):
+    """ A warm FFIEC_Client per account, sharded over by calls.
+
+    Each call goes to the account in rotation with the fewest calls in
+    progress. An account leaves the rotation for `cooldown` seconds after
+    `max_failures` consecutive faults or network errors, while it has used
+    its quota of calls for the quota period, and for good after a login
+    fault (see `enable`). Calls wait while every account is cooling down or
+    out of quota; they fail at once if every account is disabled.
+
+    The clients share one connection pool and parse the WSDL from memory
+    after the first. They are non-interactive and never store logins. Pass a
+    `ffipy.throttle.Scheduler` as `scheduler` to rate limit each account.
+
+    Args:
+        accounts (list of Accounts, or dict): the accounts, or a dict
+            mapping account name to login; loaded with `load_accounts`
+            from `path`, if None (default is None)
+        path (str): FFIEC login file; see `load_accounts` (default is None)
+        quota (int): calls per account per quota period, for accounts
+            without their own; unlimited, if None (default is None)
+        quota_period (float): seconds per quota period (default is 3600)
+        max_failures (int): consecutive failures taking an account out of
+            rotation (default is 3)
+        cooldown (float): seconds a failing account is out of rotation
+            (default is 60)
+        check_login (bool): If True, test each account's access at start
+            and disable those without it (default is True)
+        cls (type): FFIEC_Client or a subclass (default is FFIEC_Client)
+        kwargs: other keyword args of the clients, e.g. `scheduler` or
+            `metrics`
+
+    Attributes:
+        accounts (list of Accounts): the accounts and their health
+    """
+
+    def __init__(self, accounts=None, path=None, quota=None,
+                 quota_period=3600.0, max_failures=3, cooldown=60.0,
+                 check_login=True, cls=FFIEC_Client, **kwargs):
+        if accounts is None:
+            accounts = load_accounts(path)
+        elif isinstance(accounts, dict):
+            accounts = [Account(name, wsse)
+                        for name, wsse in accounts.items()]
+        if not accounts:
+            raise ValueError('ClientPool needs at least one account')
+        self.accounts = list(accounts)
+        self.quota = quota
+        self.quota_period = quota_period
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.__cond = threading.Condition()
+        for account in self.accounts:
+            if account.quota is None:
+                account.quota = quota
+
+        kwargs.update(store_login=False, check_login=False, interactive=False)
+        wsdl_cache = kwargs.pop('wsdl_cache', None)
+        transport = kwargs.pop('transport', None) or PooledTransport(
+            cache=wsdl_cache if wsdl_cache is not None else WSDLCache())
+        documents = {}
+        for n, account in enumerate(self.accounts):
+            if n and isinstance(transport, PooledTransport):
+                transport = transport.shared()
+            with snapshot.documents(transport, documents):
+                account.client = cls(wsse=account.wsse, transport=transport,
+                                     **kwargs)
+            documents.update(account.client.wsdl_documents)
+        if check_login:
+            self.check_logins()
+
+    def __check(self, account):
+        try:
+            if account.client.test_user_access():
+                return
+            reason = 'no user access'
+        except bulk.RETRY_ERRORS as err:
+            if not is_login_fault(err):
+                # The site, not the login, failed (e.g. a busy fault); the
+                # account stays in rotation
+                return
+            reason = getattr(err, 'message', None) or str(err)
+        self.disable(account.name, reason)
+
+    def check_logins(self):
+        """Tests each account's access, disabling those without it."""
+        with ThreadPoolExecutor(max_workers=len(self.accounts)) as executor:
+            list(executor.map(self.__check, self.accounts))
+
+    def __account(self, name):
+        for account in self.accounts:
+            if account.name == name:
+                return account
+        raise KeyError(name)
+
+    def disable(self, name, reason='disabled'):
+        """Takes account `name` out of rotation until `enable` is called."""
+        with self.__cond:
+            self.__account(name).disabled = reason
+
+    def enable(self, name):
+        """Puts account `name` back into rotation, e.g. after a new login."""
+        with self.__cond:
+            account = self.__account(name)
+            account.disabled = None
+            account.failures = 0
+            account.cooldown_until = 0.0
+            self.__cond.notify_all()
+
+    def acquire(self, timeout=None):
+        """Waits for an account in rotation and starts a call with it.
+
+        Args:
+            timeout (float): seconds to wait at most; forever, if None
+                (default is None)
+
+        Returns:
+            account (Account): the account to call with; pass it to
+                `release` when the call is done
+
+        Raises:
+            RuntimeError: if every account is disabled
+            TimeoutError: if no account was in rotation within `timeout`
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__cond:
+            while True:
+                now = time.monotonic()
+                best = None
+                wait = None
+                for account in self.accounts:
+                    if account.disabled is not None:
+                        continue
+                    if now - account.period_start >= self.quota_period:
+                        account.period_start = now
+                        account.used = 0
+                    ready = account.cooldown_until
+                    if account.quota is not None and \
+                            account.used >= account.quota:
+                        ready = max(ready, account.period_start +
+                                    self.quota_period)
+                    if ready > now:
+                        wait = ready - now if wait is None else \
+                            min(wait, ready - now)
+                    elif best is None or (account.active, account.last_used) \
+                            < (best.active, best.last_used):
+                        best = account
+                if best is not None:
+                    best.active += 1
+                    best.used += 1
+                    best.last_used = now
+                    return best
+                if wait is None:
+                    raise RuntimeError('All FFIEC accounts are disabled: %s'
+                                       % ', '.join('%s (%s)'
+                                                   % (a.name, a.disabled)
+                                                   for a in self.accounts))
+                if deadline is not None:
+                    left = deadline - now
+                    if left <= 0:
+                        raise TimeoutError('No FFIEC account in rotation')
+                    wait = min(wait, left)
+                self.__cond.wait(wait)
+
+    def release(self, account, error=None):
+        """Ends a call started with `acquire` and updates the account's health.
+
+        Args:
+            account (Account): the account returned by `acquire`
+            error (Exception): the error the call raised, if any (default is
+                None); only faults and network errors count against the
+                account
+        """
+        with self.__cond:
+            account.active = max(0, account.active - 1)
+            account.calls += 1
+            if error is None:
+                account.failures = 0
+            elif isinstance(error, bulk.RETRY_ERRORS):
+                account.errors += 1
+                account.failures += 1
+                if is_login_fault(error):
+                    account.disabled = str(error)
+                elif account.failures >= self.max_failures:
+                    account.cooldown_until = time.monotonic() + self.cooldown
+            self.__cond.notify_all()
+
+    def call(self, method, *args, **kwargs):
+        """Calls a client method with the next account in rotation.
+
+        Args:
+            method (str): name of the FFIEC_Client method, e.g.
+                'retrieve_facsimile'
+            args, kwargs: args of the method
+
+        Returns:
+            result: the method's result
+        """
+        account = self.acquire()
+        try:
+            result = getattr(account.client, method)(*args, **kwargs)
+        except BaseException as err:
+            self.release(account, err)
+            raise
+        self.release(account)
+        return result
+
+    def __bulk(self, method, requests, outfile, return_result, max_workers,
+               retries, **kwargs):
+        if max_workers is None:
+            max_workers = 4 * sum(account.disabled is None
+                                  for account in self.accounts) or 1
+        return bulk.run(partial(self.call, method, **kwargs), requests,
+                        outfile=outfile, return_result=return_result,
+                        max_workers=max_workers, retries=retries)
+
+    def retrieve_facsimiles(self, requests, outfile=None, return_result=True,
+                            max_workers=None, retries=2, stream=False):
+        """Retrieves many facsimiles concurrently over the accounts.
+
+        A request that fails is retried with the next account in rotation.
+        See `FFIEC_Client.retrieve_facsimiles`; `max_workers` defaults to 4
+        per account in rotation.
+        """
+        return self.__bulk('retrieve_facsimile', requests, outfile,
+                           return_result, max_workers, retries, stream=stream)
+
+    def retrieve_ubpr_xbrl_facsimiles(self, requests, outfile=None,
+                                      return_result=True, max_workers=None,
+                                      retries=2, stream=False):
+        """Retrieves many UBPR XBRL facsimiles concurrently over the accounts.
+
+        See `retrieve_facsimiles` and
+        `FFIEC_Client.retrieve_ubpr_xbrl_facsimiles`.
+        """
+        return self.__bulk('retrieve_ubpr_xbrl_facsimile', requests, outfile,
+                           return_result, max_workers, retries, stream=stream)
+
+    def stats(self):
+        """Returns a dict mapping account name to its health and call counts.
+        """
+        with self.__cond:
+            return {account.name: {'state': account.state,
+                                   'active': account.active,
+                                   'calls': account.calls,
+                                   'errors': account.errors,
+                                   'used': account.used}
+                    for account in self.accounts}
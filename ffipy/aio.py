@@ -0,0 +1,406 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: an asyncio interface for retrieving reports from the FFIEC site
+# Usage: AsyncFFIEC_Client mirrors FFIEC_Client, except its retrieve_* methods
+#   and test_user_access are coroutines; requires aiohttp
+# Docs: python -c "import ffipy.aio; help('ffipy.aio.AsyncFFIEC_Client')"
+# ------------------------------------------------------------------------------
+
+# PSL
+import asyncio
+import logging
+from itertools import islice
+
+# 3rd party libs
+import aiohttp
+import requests
+import zeep
+import zeep.asyncio
+from zeep.exceptions import TransportError
+
+# ffipy
+from . import snapshot
+from .bulk import BulkResult, RETRY_ERRORS
+from .cache import WSDLCache
+from .ffipy import FFIEC_Client
+from .throttle import backoff_delay
+from .panel import ReporterPanel
+
+
+class AsyncTransport(zeep.asyncio.AsyncTransport):
+    """ zeep's asyncio transport, updated for aiohttp 3.
+
+    The aiohttp session is created on first use, so the transport may be built
+    outside of the event loop it is used in. WSDL/XSD documents are loaded
+    with a blocking request (only on a cache miss) so that the client can be
+    created whether or not an event loop is running.
+
+    Args:
+        cache (zeep.cache.Base): cache for WSDL/XSD documents
+        timeout (int): timeout in seconds for loading WSDL/XSD documents
+        operation_timeout (int): timeout in seconds for operations (default
+            is None, no timeout)
+        session (aiohttp.ClientSession): session to post requests with;
+            created on first use if None
+    """
+
+    def __init__(self, cache=None, timeout=300, operation_timeout=None,
+                 session=None):
+        self.cache = cache
+        self.load_timeout = timeout
+        self.operation_timeout = operation_timeout
+        self.logger = logging.getLogger(__name__)
+        self.session = session
+        self._close_session = session is None
+        self._headers = {'User-Agent': 'Zeep/%s (www.python-zeep.org)'
+                         % zeep.__version__}
+
+    def __del__(self):
+        pass
+
+    def _get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(headers=self._headers)
+        return self.session
+
+    def _load_remote_data(self, url):
+        response = requests.get(url, timeout=self.load_timeout,
+                                headers=self._headers)
+        response.raise_for_status()
+        return response.content
+
+    async def post(self, address, message, headers):
+        self.logger.debug('HTTP Post to %s:\n%s', address, message)
+        timeout = aiohttp.ClientTimeout(total=self.operation_timeout)
+        response = await self._get_session().post(
+            address, data=message, headers=headers, timeout=timeout)
+        self.logger.debug('HTTP Response from %s (status: %d)', address,
+                          response.status)
+        return response
+
+    async def get(self, address, params, headers):
+        timeout = aiohttp.ClientTimeout(total=self.operation_timeout)
+        response = await self._get_session().get(
+            address, params=params, headers=headers, timeout=timeout)
+        return await self.new_response(response)
+
+    async def new_response(self, response):
+        """Convert an aiohttp response to a requests.Response object"""
+        try:
+            return await zeep.asyncio.AsyncTransport.new_response(self,
+                                                                  response)
+        except aiohttp.ClientError as err:
+            raise TransportError(message=str(err))
+
+    async def close(self):
+        """Closes the aiohttp session, if it was created by the transport."""
+        if self._close_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncFFIEC_Client(FFIEC_Client):
+    """ An asyncio version of FFIEC_Client.
+
+    Args:
+        Same as FFIEC_Client, except:
+            `transport` must be an asyncio transport (default is a new
+                `AsyncTransport`);
+            there is no `store_login` or `check_login`, because login is never
+                tested on creation; await `test_user_access` to check it;
+            there is no `scheduler`, as its slots block the calling thread
+                (and so the event loop); limit concurrency with the
+                `max_workers` of the bulk methods instead;
+            `metrics` records calls, faults and latency per operation, but not
+                the SOAP round trip or HTTP metrics (zeep's plugins and the
+                requests response hook do not apply to concurrent coroutines
+                sharing a thread);
+            there is no `memo_ttls`, as the async methods are not memoized;
+            `facsimile_cache` is read and written in the loop's default
+                executor, so its disk I/O does not block the event loop.
+
+    Attributes:
+        Same as FFIEC_Client. The client never prompts for a login; if no
+        `wsse` is given and none is configured, ValueError is raised.
+
+    Methods:
+        Same as FFIEC_Client, but the retrieve_* methods and test_user_access
+        are coroutines, and the bulk methods are async generators. Use
+        `async with` or await `close` to release the HTTP session. The results
+        of the async methods are not memoized, and the client cannot be
+        pickled or snapshot, as its transport holds an aiohttp session.
+    """
+    interactive = False
+
+    def __init__(self, wsse=None, transport=None, service_name=None,
+                 port_name=None, plugins=None, strict=True,
+                 xml_huge_tree=False, wsdl_cache=None, facsimile_cache=None,
+                 metrics=None):
+        self._init_state(wsse, service_name, port_name, strict, xml_huge_tree,
+                         facsimile_cache, None, metrics, {})
+        if transport is None:
+            if wsdl_cache is None:
+                wsdl_cache = WSDLCache()
+            transport = AsyncTransport(cache=wsdl_cache)
+        with self._timer('ffipy_wsdl_load_seconds'), \
+                snapshot.documents(transport, self.wsdl_documents):
+            zeep.Client.__init__(self, self.wsdl, self.wsse, transport,
+                                 service_name, port_name, plugins, strict,
+                                 xml_huge_tree)
+
+    def __reduce__(self):
+        raise TypeError('AsyncFFIEC_Client cannot be pickled; pickle an '
+                        'FFIEC_Client instead')
+
+    def snapshot(self):
+        """Not supported: raises TypeError."""
+        raise TypeError('AsyncFFIEC_Client cannot be snapshot; snapshot an '
+                        'FFIEC_Client instead')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes the HTTP session of the client's transport."""
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            await close()
+
+    async def __cached(self, operation, args):
+        """Returns the cached facsimile of a call, or None if not cached."""
+        if self.facsimile_cache is None:
+            return None
+        cache = self.facsimile_cache
+        return await asyncio.get_running_loop().run_in_executor(
+            None, cache.get, cache.key(operation, *args))
+
+    async def __cache(self, operation, args, facsimile, reporting_pd_end):
+        """Adds the facsimile of a call to the cache, if there is one."""
+        if self.facsimile_cache is None or facsimile is None:
+            return
+        cache = self.facsimile_cache
+        await asyncio.get_running_loop().run_in_executor(
+            None, cache.add, cache.key(operation, *args), facsimile,
+            reporting_pd_end)
+
+    async def retrieve_facsimile(self, ds_name='Call',
+                                 reporting_pd_end='3/31/2017',
+                                 fiID_type='ID_RSSD', fiID=64150,
+                                 facsimile_fmt='PDF',
+                                 outfile=None, return_result=True):
+        """Retrieves a facsimile (e.g., a report) from FFIEC site.
+
+        See `FFIEC_Client.retrieve_facsimile`.
+        """
+        # Set up kw args
+        data_series = self.get_type('ns0:ReportingDataSeriesName')
+        ds_name = data_series(ds_name)
+        fiID_type_type = self.get_type('ns0:FinancialInstitutionIDType')
+        fiID_type = fiID_type_type(fiID_type)
+        fiID = self._fi_id(fiID)
+        facsimile_fmt_type = self.get_type('ns0:FacsimileFormat')
+        facsimile_fmt = facsimile_fmt_type(facsimile_fmt)
+
+        # Get results, from the cache if possible
+        key = (ds_name, reporting_pd_end, fiID_type, fiID, facsimile_fmt)
+        facsimile = await self.__cached('RetrieveFacsimile', key)
+        if facsimile is None:
+            with self._call('RetrieveFacsimile', ds_name):
+                facsimile = await self.service.RetrieveFacsimile(*key)
+            await self.__cache('RetrieveFacsimile', key, facsimile,
+                               reporting_pd_end)
+
+        # Write file
+        if outfile:
+            with open(outfile, 'wb') as f:
+                f.write(facsimile)
+
+        # Return results
+        if return_result:
+            return facsimile
+
+    async def retrieve_facsimiles(self, requests, outfile=None,
+                                  return_result=True, max_workers=4,
+                                  retries=2):
+        """Retrieves many facsimiles concurrently from FFIEC site.
+
+        See `FFIEC_Client.retrieve_facsimiles`; `max_workers` limits the
+        number of requests in flight.
+        """
+        async for result in _run(self.retrieve_facsimile, requests,
+                                 outfile, return_result, max_workers,
+                                 retries, retried=self._retried(
+                                     'RetrieveFacsimile', True)):
+            yield result
+
+    async def retrieve_filers_since_date(self, ds_name='Call',
+                                         reporting_pd_end='3/31/2017',
+                                         last_update_date='3/31/2017'):
+        """Retrieves ID RSSDs of filers after given date for given reporting pd.
+
+        See `FFIEC_Client.retrieve_filers_since_date`.
+        """
+        data_series = self.get_type('ns0:ReportingDataSeriesName')
+        ds_name = data_series(ds_name)
+        with self._call('RetrieveFilersSinceDate', ds_name):
+            filers = await self.service.RetrieveFilersSinceDate(
+                ds_name, reporting_pd_end, last_update_date)
+        return filers
+
+    async def retrieve_filers_submission_datetime(
+            self, ds_name='Call', reporting_pd_end='3/31/2017',
+            last_update_date='3/31/2017'):
+        """Retrieves ID RSSD, DateTime of filers after given date, reporting pd.
+
+        See `FFIEC_Client.retrieve_filers_submission_datetime`.
+        """
+        data_series = self.get_type('ns0:ReportingDataSeriesName')
+        ds_name = data_series(ds_name)
+        with self._call('RetrieveFilersSubmissionDateTime', ds_name):
+            results = await self.service.RetrieveFilersSubmissionDateTime(
+                ds_name, reporting_pd_end, last_update_date)
+        return results
+
+    async def retrieve_panel_of_reporters(self, ds_name='Call',
+                                          reporting_pd_end='3/31/2017'):
+        """Retrieves Fin Insts in Panel of Reporters for given reporting pd.
+
+        See `FFIEC_Client.retrieve_panel_of_reporters`.
+        """
+        data_series = self.get_type('ns0:ReportingDataSeriesName')
+        ds_name = data_series(ds_name)
+        with self._call('RetrievePanelOfReporters', ds_name):
+            results = await self.service.RetrievePanelOfReporters(
+                ds_name, reporting_pd_end)
+        return results
+
+    async def retrieve_reporter_panel(self, ds_name='Call',
+                                      reporting_pd_end='3/31/2017',
+                                      refresh=False):
+        """Retrieves the Panel of Reporters as an indexed ReporterPanel.
+
+        See `FFIEC_Client.retrieve_reporter_panel`.
+        """
+        key = (ds_name, reporting_pd_end)
+        if refresh or key not in self.reporter_panels:
+            reporters = await self.retrieve_panel_of_reporters(
+                ds_name, reporting_pd_end)
+            self.reporter_panels[key] = ReporterPanel(reporters or (),
+                                                      ds_name,
+                                                      reporting_pd_end)
+        return self.reporter_panels[key]
+
+    async def retrieve_reporting_periods(self, ds_name='Call'):
+        """Retrieves end dates of financial reporting periods.
+
+        See `FFIEC_Client.retrieve_reporting_periods`.
+        """
+        data_series = self.get_type('ns0:ReportingDataSeriesName')
+        ds_name = data_series(ds_name)
+        with self._call('RetrieveReportingPeriods', ds_name):
+            dates = await self.service.RetrieveReportingPeriods(ds_name)
+        return dates
+
+    async def retrieve_ubpr_reporting_periods(self):
+        """Retrieves end dates of UBPR reporting periods.
+
+        See `FFIEC_Client.retrieve_ubpr_reporting_periods`.
+        """
+        with self._call('RetrieveUBPRReportingPeriods'):
+            dates = await self.service.RetrieveUBPRReportingPeriods()
+        return dates
+
+    async def retrieve_ubpr_xbrl_facsimile(self, reporting_pd_end='3/31/2017',
+                                           fiID_type='ID_RSSD', fiID=64150,
+                                           outfile=None, return_result=True):
+        """Retrieves a UBPR facsimile in XBRL format from FFIEC site.
+
+        See `FFIEC_Client.retrieve_ubpr_xbrl_facsimile`.
+        """
+        fiID_type_type = self.get_type('ns0:FinancialInstitutionIDType')
+        fiID_type = fiID_type_type(fiID_type)
+        fiID = self._fi_id(fiID)
+        key = (reporting_pd_end, fiID_type, fiID)
+        facsimile = await self.__cached('RetrieveUBPRXBRLFacsimile', key)
+        if facsimile is None:
+            with self._call('RetrieveUBPRXBRLFacsimile'):
+                facsimile = await self.service.RetrieveUBPRXBRLFacsimile(*key)
+            await self.__cache('RetrieveUBPRXBRLFacsimile', key, facsimile,
+                               reporting_pd_end)
+
+        if outfile:
+            with open(outfile, 'wb') as f:
+                f.write(facsimile)
+
+        if return_result:
+            return facsimile
+
+    async def retrieve_ubpr_xbrl_facsimiles(self, requests, outfile=None,
+                                            return_result=True,
+                                            max_workers=4, retries=2):
+        """Retrieves many UBPR facsimiles concurrently from FFIEC site.
+
+        See `FFIEC_Client.retrieve_ubpr_xbrl_facsimiles`; `max_workers`
+        limits the number of requests in flight.
+        """
+        async for result in _run(self.retrieve_ubpr_xbrl_facsimile, requests,
+                                 outfile, return_result, max_workers,
+                                 retries, retried=self._retried(
+                                     'RetrieveUBPRXBRLFacsimile')):
+            yield result
+
+    async def test_user_access(self):
+        """Tests whether or not user has access to FFIEC SOAP service
+
+        See `FFIEC_Client.test_user_access`.
+        """
+        with self._call('TestUserAccess'):
+            result = await self.service.TestUserAccess()
+        return result
+
+
+async def _run(func, requests, outfile, return_result, max_workers, retries,
+               backoff=1.0, retried=None):
+    """Async counterpart of `ffipy.bulk.run`, yielding BulkResults."""
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def attempt(request):
+        try:
+            path = outfile(request) if outfile else None
+        except Exception as err:
+            return BulkResult(request, None, err, 0)
+        async with semaphore:
+            for n in range(retries + 1):
+                try:
+                    result = await func(*request, outfile=path,
+                                        return_result=return_result)
+                    return BulkResult(request, result, None, n + 1)
+                except RETRY_ERRORS as err:
+                    error = err
+                    if n < retries:
+                        if retried is not None:
+                            retried(request, err)
+                        await asyncio.sleep(backoff_delay(n, backoff))
+                except Exception as err:
+                    return BulkResult(request, None, err, n + 1)
+            return BulkResult(request, None, error, retries + 1)
+
+    # Keep a bounded window of tasks, so a large batch is not all started
+    requests = iter(requests)
+    pending = {asyncio.ensure_future(attempt(tuple(request)))
+               for request in islice(requests, 2 * max_workers)}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for request in islice(requests, 1):
+                    pending.add(asyncio.ensure_future(
+                        attempt(tuple(request))))
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
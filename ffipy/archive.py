@@ -0,0 +1,427 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: a columnar, partitioned archive of parsed facsimile data
+# Usage: Archive(root).write(panel, 'Call') stores a FacsimilePanel under
+#   root/ds_name=Call/period=YYYY-MM-DD/, one partition per reporting period;
+#   Archive(root).scan('Call', columns=['RCON2170'], id_rssd=[37]) reads back
+#   only those columns and rows as a FacsimilePanel
+# Docs: python -c "import ffipy.archive; help('ffipy.archive')"
+# ------------------------------------------------------------------------------
+
+# PSL
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from itertools import chain
+
+# ffipy
+from .parse import NAN, FacsimilePanel, Filing, build_panel, format_period
+
+FORMAT = 'ffipy-archive'
+VERSION = 1
+
+META = 'meta.json'
+ID_RSSD = 'id_rssd.i8'
+
+
+def _partition_name(name, value):
+    return '%s=%s' % (name, value)
+
+
+def _period_dir(period):
+    """Returns 'YYYY-MM-DD' for a period, so partitions sort by date."""
+    date = datetime.strptime(format_period(period), '%m/%d/%Y')
+    return date.strftime('%Y-%m-%d')
+
+
+def _extend(target, source):
+    """Appends a whole array or memory-mapped view to an array."""
+    if isinstance(source, memoryview):
+        source = source.cast('B')
+    target.frombytes(source)
+
+
+def _is_numeric(values):
+    return all(value is None or isinstance(value, float) for value in values)
+
+
+class Partition(object):
+    """ A memory-mapped reader of one partition (ds_name, period).
+
+    Rows are sorted by ID RSSD. Numeric columns and the ID RSSDs are raw
+    arrays of doubles / 64-bit ints, mapped into memory on first use, so
+    reading a few rows of a column touches only their pages; other columns
+    are JSON lists. Close the partition (or use it as a context manager) to
+    unmap its files.
+
+    Args:
+        path (str): directory of the partition
+
+    Attributes:
+        meta (dict): the partition's metadata
+        ds_name (str): its DataSeriesName
+        period (str): its reporting period, e.g. '3/31/2017'
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != FORMAT or \
+                self.meta.get('version') != VERSION:
+            raise ValueError('Not a version %d %s partition: %s'
+                             % (VERSION, FORMAT, path))
+        self.ds_name = self.meta['ds_name']
+        self.period = self.meta['period']
+        self.__columns = {column['name']: column
+                          for column in self.meta['columns']}
+        self.__maps = []
+        self.__cache = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __contains__(self, name):
+        return name in self.__columns
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def names(self):
+        """Returns the column names of the partition."""
+        return [column['name'] for column in self.meta['columns']]
+
+    def is_numeric(self, name):
+        """Returns True if column `name` holds floats (NaN if missing)."""
+        return self.__columns[name]['type'] == 'f8'
+
+    def __array(self, filename, typecode):
+        """Returns a file of the partition as an array-like of `typecode`."""
+        view = self.__cache.get(filename)
+        if view is not None:
+            return view
+        with open(os.path.join(self.path, filename), 'rb') as f:
+            if self.meta['byteorder'] == sys.byteorder:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.__maps.append(mapped)
+                view = memoryview(mapped).cast(typecode)
+            else:
+                view = array(typecode)
+                view.frombytes(f.read())
+                view.byteswap()
+        self.__cache[filename] = view
+        return view
+
+    @property
+    def id_rssd(self):
+        """Returns the sorted ID RSSDs of the rows, memory-mapped."""
+        if not len(self):
+            return array('q')
+        return self.__array(ID_RSSD, 'q')
+
+    def column(self, name):
+        """Returns column `name`: memory-mapped doubles, or a list.
+
+        Raises:
+            KeyError: if the partition has no column `name`
+        """
+        column = self.__columns[name]
+        if column['type'] == 'f8':
+            return self.__array(column['file'], 'd')
+        values = self.__cache.get(column['file'])
+        if values is None:
+            with open(os.path.join(self.path, column['file'])) as f:
+                values = self.__cache[column['file']] = json.load(f)
+        return values
+
+    def find(self, id_rssd):
+        """Returns the sorted row numbers of the ID RSSDs in `id_rssd`.
+
+        Partitions whose ID RSSD range misses every wanted ID are skipped
+        without reading their rows.
+        """
+        wanted = sorted(set(id_rssd))
+        low, high = self.meta['id_rssd_min'], self.meta['id_rssd_max']
+        if not len(self) or not wanted or wanted[0] > high or \
+                wanted[-1] < low:
+            return []
+        ids = self.id_rssd
+        rows = []
+        for value in wanted:
+            i = bisect_left(ids, value)
+            if i < len(ids) and ids[i] == value:
+                rows.append(i)
+        return rows
+
+    def close(self):
+        """Unmaps the partition's files."""
+        for view in self.__cache.values():
+            if isinstance(view, memoryview):
+                view.release()
+        self.__cache.clear()
+        for mapped in self.__maps:
+            mapped.close()
+        self.__maps = []
+
+
+def write_partition(path, panel, rows, ds_name, period):
+    """Writes rows of a panel, sorted by ID RSSD, as a partition.
+
+    The partition is written next to `path` and then moved there, so readers
+    never see it half-written.
+
+    Args:
+        path (str): directory of the partition
+        panel (FacsimilePanel): the panel holding the rows
+        rows (list of ints): row numbers of the partition's rows
+        ds_name (str): DataSeriesName of the rows
+        period (str): reporting period of the rows
+    """
+    rows = sorted(rows, key=panel.id_rssd.__getitem__)
+    tmp = '%s.tmp-%d' % (path, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    ids = array('q', (panel.id_rssd[i] for i in rows))
+    with open(os.path.join(tmp, ID_RSSD), 'wb') as f:
+        ids.tofile(f)
+
+    columns = []
+    for name in panel.items:
+        source = panel.columns[name]
+        values = [source[i] for i in rows]
+        if isinstance(source, array):
+            if all(value != value for value in values):
+                continue
+            numeric = True
+        else:
+            if all(value is None for value in values):
+                continue
+            numeric = _is_numeric(values)
+        filename = 'c%d.%s' % (len(columns), 'f8' if numeric else 'json')
+        with open(os.path.join(tmp, filename),
+                  'wb' if numeric else 'w') as f:
+            if numeric:
+                array('d', (NAN if value is None else value
+                            for value in values)).tofile(f)
+            else:
+                json.dump(values, f)
+        columns.append({'name': name, 'type': 'f8' if numeric else 'json',
+                        'file': filename})
+
+    meta = {'format': FORMAT, 'version': VERSION, 'ds_name': ds_name,
+            'period': format_period(period), 'rows': len(ids),
+            'byteorder': sys.byteorder,
+            'id_rssd_min': ids[0] if ids else None,
+            'id_rssd_max': ids[-1] if ids else None, 'columns': columns}
+    with open(os.path.join(tmp, META), 'w') as f:
+        json.dump(meta, f)
+
+    old = None
+    if os.path.exists(path):
+        old = '%s.old-%d' % (path, os.getpid())
+        os.rename(path, old)
+    os.rename(tmp, path)
+    if old is not None:
+        shutil.rmtree(old)
+
+
+class Archive(object):
+    """ A directory of facsimile data partitioned by ds_name and period.
+
+    Each (ds_name, reporting period) is a partition directory,
+    `ds_name=<name>/period=<YYYY-MM-DD>`, holding one file per column (see
+    `Partition`), so adding a period writes only its partition, and scans
+    open only the partitions, columns and rows they need.
+
+    Args:
+        root (str): directory of the archive; created when first written
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def __ds_path(self, ds_name):
+        return os.path.join(self.root, _partition_name('ds_name', ds_name))
+
+    def __path(self, ds_name, period):
+        return os.path.join(self.__ds_path(ds_name),
+                            _partition_name('period', _period_dir(period)))
+
+    def ds_names(self):
+        """Returns the sorted DataSeriesNames in the archive."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name.split('=', 1)[1] for name in os.listdir(self.root)
+                      if name.startswith('ds_name='))
+
+    def periods(self, ds_name='Call'):
+        """Returns the reporting periods archived for `ds_name`, oldest first.
+        """
+        path = self.__ds_path(ds_name)
+        if not os.path.isdir(path):
+            return []
+        return [format_period(name.split('=', 1)[1])
+                for name in sorted(os.listdir(path))
+                if name.startswith('period=') and '.' not in name]
+
+    def partition(self, ds_name, period):
+        """Returns the Partition of (ds_name, period).
+
+        Raises:
+            KeyError: if the archive has no such partition
+        """
+        path = self.__path(ds_name, period)
+        if not os.path.isfile(os.path.join(path, META)):
+            raise KeyError((ds_name, format_period(period)))
+        return Partition(path)
+
+    def write(self, panel, ds_name='Call', replace=False):
+        """Writes a FacsimilePanel, one partition per reporting period.
+
+        Args:
+            panel (FacsimilePanel): e.g. from `ffipy.parse.parse_facsimiles`
+            ds_name (str): DataSeriesName of the panel (default is 'Call')
+            replace (bool): If True, a period already archived is replaced by
+                the panel's rows; otherwise the panel's rows are merged into
+                it, replacing rows of the same ID RSSD (default is False)
+
+        Returns:
+            periods (list of strs): the periods written
+
+        """
+        by_period = {}
+        for i, period in enumerate(panel.period):
+            by_period.setdefault(format_period(period), []).append(i)
+        for period, rows in by_period.items():
+            path = self.__path(ds_name, period)
+            if not replace and os.path.exists(path):
+                with Partition(path) as old:
+                    merged = build_panel(chain(
+                        self.__filings(old), (
+                            Filing(panel.id_rssd[i], period,
+                                   panel.row(panel.id_rssd[i],
+                                             panel.period[i]))
+                            for i in rows)))
+                write_partition(path, merged, range(len(merged)), ds_name,
+                                period)
+            else:
+                write_partition(path, panel, rows, ds_name, period)
+        return list(by_period)
+
+    def append(self, filings, ds_name='Call', replace=False):
+        """Writes parsed filings; see `write`.
+
+        Args:
+            filings (iterable of Filings): e.g. from `ffipy.parse` or
+                `ffipy.pipeline.Pipeline`
+        """
+        return self.write(build_panel(filings), ds_name, replace)
+
+    @staticmethod
+    def __filings(partition):
+        """Yields the rows of a partition as Filings."""
+        columns = [(name, partition.column(name)) for name in partition.names]
+        for i, id_rssd in enumerate(partition.id_rssd):
+            values = {}
+            for name, column in columns:
+                value = column[i]
+                if value is not None and value == value:
+                    values[name] = value
+            yield Filing(id_rssd, partition.period, values)
+
+    def scan(self, ds_name='Call', columns=None, id_rssd=None, periods=None):
+        """Reads part of the archive into a FacsimilePanel.
+
+        Args:
+            ds_name (str): DataSeriesName to read (default is 'Call')
+            columns (iterable of strs): columns to read; all, if None
+                (default is None)
+            id_rssd (int or iterable of ints): ID RSSDs of the rows to read;
+                all, if None (default is None)
+            periods (iterable of strs): reporting periods to read; all, if
+                None (default is None)
+
+        Returns:
+            panel (FacsimilePanel): rows in order of period, then ID RSSD
+
+        """
+        if periods is None:
+            periods = self.periods(ds_name)
+        else:
+            archived = set(self.periods(ds_name))
+            periods = sorted({format_period(p) for p in periods} & archived,
+                             key=_period_dir)
+        if isinstance(id_rssd, int):
+            id_rssd = [id_rssd]
+        if columns is not None:
+            columns = list(dict.fromkeys(columns))
+
+        partitions = []
+        try:
+            for period in periods:
+                partition = self.partition(ds_name, period)
+                partitions.append(partition)
+            selected = []
+            for partition in partitions:
+                rows = (range(len(partition)) if id_rssd is None
+                        else partition.find(id_rssd))
+                if len(rows):
+                    selected.append((partition, rows))
+            return self.__panel(selected, columns)
+        finally:
+            for partition in partitions:
+                partition.close()
+
+    @staticmethod
+    def __panel(selected, names):
+        """Copies the selected rows of partitions into a FacsimilePanel."""
+        n = sum(len(rows) for _, rows in selected)
+        id_rssd = array('q')
+        period = []
+        columns = {}
+        offset = 0
+        for partition, rows in selected:
+            ids = partition.id_rssd
+            whole = isinstance(rows, range)
+            if whole:
+                _extend(id_rssd, ids)
+            else:
+                id_rssd.extend(ids[i] for i in rows)
+            period.extend([partition.period] * len(rows))
+            wanted = partition.names if names is None else \
+                [name for name in names if name in partition]
+            for name in wanted:
+                source = partition.column(name)
+                numeric = partition.is_numeric(name)
+                column = columns.get(name)
+                if column is None:
+                    column = columns[name] = (array('d', [NAN]) * n
+                                              if numeric else [None] * n)
+                elif not numeric and isinstance(column, array):
+                    column = columns[name] = [None if value != value
+                                              else value for value in column]
+                end = offset + len(rows)
+                if whole and isinstance(column, array):
+                    values = array('d')
+                    _extend(values, source)
+                    column[offset:end] = values
+                elif whole:
+                    column[offset:end] = [
+                        None if value != value else value
+                        for value in source]
+                else:
+                    for j, i in enumerate(rows):
+                        value = source[i]
+                        if value == value or isinstance(column, array):
+                            column[offset + j] = value
+            offset += len(rows)
+        return FacsimilePanel(id_rssd, period, columns)
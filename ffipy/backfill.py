@@ -0,0 +1,521 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: planned, resumable download of the facsimiles of every reporting
+#   period
+# Usage: Backfill(client, 'backfill.db', outfile).run() plans the work once
+#   (every filer of every period, most recent period first, skipping what is
+#   already downloaded), then works through it, checkpointing progress in the
+#   sqlite store so a crashed run resumes where it stopped; from a shell:
+#   python -m ffipy.backfill --db backfill.db --outdir facsimiles
+# ------------------------------------------------------------------------------
+
+# PSL
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+# ffipy
+from .parse import format_period
+
+# States of a work item
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+# Work items read from the store at a time
+PAGE_SIZE = 1000
+
+BackfillProgress = namedtuple('BackfillProgress', ['done', 'failed',
+                                                   'pending', 'total',
+                                                   'rate', 'eta'])
+BackfillProgress.__doc__ = """Progress of a backfill.
+
+    Attributes:
+        done (int): work items finished, including ones skipped as present
+        failed (int): work items that failed in this or an earlier run
+        pending (int): work items left
+        total (int): work items planned
+        rate (float): work items finished per second in this run
+        eta (float): seconds left at `rate`; None if unknown
+"""
+
+
+def _period_date(period):
+    return datetime.strptime(format_period(period), '%m/%d/%Y')
+
+
+def format_progress(progress):
+    """Returns a one-line summary of a BackfillProgress with its ETA."""
+    if progress.eta is None:
+        eta = '--:--:--'
+    else:
+        seconds = int(progress.eta)
+        eta = '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60,
+                                seconds % 60)
+    return ('%d/%d done, %d failed, %d pending, %.1f/s, ETA %s'
+            % (progress.done, progress.total, progress.failed,
+               progress.pending, progress.rate, eta))
+
+
+class BackfillState(object):
+    """ The sqlite store of a backfill's plan and progress.
+
+    Tables:
+        periods: (ds_name, period) pairs whose filers are in the plan
+        work: one row per facsimile, with its priority and state (PENDING,
+            DONE or FAILED)
+
+    Args:
+        path (str): path of the sqlite database
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        with self.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS periods
+                (ds_name text, period text, planned timestamp,
+                 PRIMARY KEY (ds_name, period));
+                CREATE TABLE IF NOT EXISTS work
+                (ds_name text, period text, id_rssd integer,
+                 priority real, state integer, attempts integer,
+                 error text,
+                 PRIMARY KEY (ds_name, period, id_rssd));
+                CREATE INDEX IF NOT EXISTS work_order
+                ON work (state, priority, ds_name, period, id_rssd);
+            """)
+
+    @contextmanager
+    def connection(self):
+        """Yields a connection, committing on success."""
+        with self._lock:
+            conn = sqlite3.connect(self.path, timeout=30,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def planned(self, ds_name):
+        """Returns the set of periods of `ds_name` in the plan."""
+        with self.connection() as conn:
+            rows = conn.execute('SELECT period FROM periods WHERE ds_name=?',
+                                (ds_name,))
+            return {row[0] for row in rows}
+
+    def add_period(self, ds_name, period, work):
+        """Adds a period's work items to the plan in one transaction.
+
+        Args:
+            work (iterable of tuples): (id_rssd, priority, state) of each
+                item; items already planned are left as they are
+        """
+        with self.connection() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO work VALUES (?, ?, ?, ?, ?, 0, NULL)',
+                [(ds_name, period, id_rssd, priority, state)
+                 for id_rssd, priority, state in work])
+            conn.execute('INSERT OR REPLACE INTO periods VALUES (?, ?, ?)',
+                         (ds_name, period, datetime.now()))
+
+    def pending(self, page_size=PAGE_SIZE):
+        """Yields (ds_name, period, id_rssd) of pending items in order.
+
+        Items are read a page at a time, so items finished while iterating
+        are not yielded again.
+        """
+        last = (float('-inf'), '', '', -1)
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    'SELECT priority, ds_name, period, id_rssd FROM work '
+                    'WHERE state=? AND (priority, ds_name, period, id_rssd)'
+                    ' > (?, ?, ?, ?) ORDER BY priority, ds_name, period, '
+                    'id_rssd LIMIT ?', (PENDING,) + last + (page_size,)
+                ).fetchall()
+            for row in rows:
+                yield row[1:]
+            if len(rows) < page_size:
+                return
+            last = rows[-1]
+
+    def finish(self, done=(), failed=()):
+        """Records finished work items.
+
+        Args:
+            done (iterable of tuples): (ds_name, period, id_rssd) of items
+                that succeeded
+            failed (iterable of tuples): (ds_name, period, id_rssd, error)
+                of items that failed
+        """
+        with self.connection() as conn:
+            conn.executemany(
+                'UPDATE work SET state=?, attempts=attempts+1, error=NULL '
+                'WHERE ds_name=? AND period=? AND id_rssd=?',
+                [(DONE,) + tuple(key) for key in done])
+            conn.executemany(
+                'UPDATE work SET state=?, attempts=attempts+1, error=? '
+                'WHERE ds_name=? AND period=? AND id_rssd=?',
+                [(FAILED, str(item[3])) + tuple(item[:3])
+                 for item in failed])
+
+    def retry_failed(self):
+        """Makes failed items pending again; returns how many there were."""
+        with self.connection() as conn:
+            return conn.execute('UPDATE work SET state=? WHERE state=?',
+                                (PENDING, FAILED)).rowcount
+
+    def counts(self):
+        """Returns dict of state to number of work items."""
+        with self.connection() as conn:
+            rows = conn.execute('SELECT state, COUNT(*) FROM work '
+                                'GROUP BY state')
+            counts = dict(rows.fetchall())
+        return {state: counts.get(state, 0)
+                for state in (PENDING, DONE, FAILED)}
+
+    def failures(self):
+        """Returns dict of (ds_name, period, id_rssd) to error of failed items.
+        """
+        with self.connection() as conn:
+            rows = conn.execute('SELECT ds_name, period, id_rssd, error '
+                                'FROM work WHERE state=?', (FAILED,))
+            return {row[:3]: row[3] for row in rows}
+
+
+class Backfill(object):
+    """ Downloads the facsimiles of every filer of every reporting period.
+
+    `plan` builds the whole work set once: the reporting periods of
+    `ds_name`, and the Panel of Reporters of each, each filer being one work
+    item. Items whose outfile exists, or whose rows are in `archive`, are
+    planned as done. Items are worked in order of `priority`, by default
+    most recent period first. `run` checkpoints finished items every
+    `checkpoint` items or `interval` seconds, so a crashed run repeats at
+    most that much work; periods already planned are not asked for again.
+
+    Facsimiles are written to `outfile` with `FFIEC_Client.retrieve_facsimiles`
+    or, with `archive`, parsed with `ffipy.pipeline.Pipeline` and appended to
+    the archive (SDF and XBRL formats only). Archived filings are appended a
+    period at a time, once all of the period's items have finished, so with
+    `archive` a crashed run repeats at most the periods in progress.
+
+    Args:
+        client (FFIEC_Client): client to retrieve with
+        path (str): path of the sqlite state store
+        outfile (callable): takes a request tuple (ds_name, reporting_pd_end,
+            fiID_type, fiID, facsimile_fmt) and returns the path to write the
+            facsimile to (default is None)
+        archive (ffipy.archive.Archive): archive to append parsed facsimiles
+            to instead (default is None)
+        ds_name (str): DataSeriesName (default is 'Call')
+        facsimile_fmt (str): Format of facsimiles to retrieve (default is
+            'PDF')
+        periods (iterable of strs): reporting periods to backfill; all
+            periods from `retrieve_reporting_periods`, if None (default is
+            None)
+        since (str): skip periods ending before this date (default is None)
+        priority (callable): takes (ds_name, period, id_rssd, rank), where
+            rank is 0 for the most recent period, 1 for the next, etc., and
+            returns the item's priority, lower first; e.g. rank the largest
+            institutions first (default is the rank)
+        has_filed (bool): If True, only plan filers with
+            HasFiledForReportingPeriod set (default is True)
+        max_workers (int): number of concurrent downloads (default is 4)
+        retries (int): number of times a download is retried (default is 2)
+        checkpoint (int): items between checkpoints (default is 100)
+        interval (float): seconds between checkpoints (default is 10)
+    """
+
+    def __init__(self, client, path, outfile=None, archive=None,
+                 ds_name='Call', facsimile_fmt='PDF', periods=None,
+                 since=None, priority=None, has_filed=True, max_workers=4,
+                 retries=2, checkpoint=100, interval=10.0):
+        if (outfile is None) == (archive is None):
+            raise ValueError('Backfill needs exactly one of outfile and '
+                             'archive')
+        if archive is not None and str(facsimile_fmt).upper() not in (
+                'SDF', 'XBRL'):
+            raise ValueError('Only SDF and XBRL facsimiles can be archived, '
+                             'not %s' % facsimile_fmt)
+        self.client = client
+        self.state = BackfillState(path)
+        self.outfile = outfile
+        self.archive = archive
+        self.ds_name = ds_name
+        self.facsimile_fmt = facsimile_fmt
+        self.periods = list(periods) if periods is not None else None
+        self.since = since
+        self.priority = priority
+        self.has_filed = has_filed
+        self.max_workers = max_workers
+        self.retries = retries
+        self.checkpoint = checkpoint
+        self.interval = interval
+
+    def __request(self, ds_name, period, id_rssd):
+        return (ds_name, period, 'ID_RSSD', id_rssd, self.facsimile_fmt)
+
+    def __present(self, period, ids):
+        """Returns the ID RSSDs of a period that are already downloaded."""
+        if self.archive is not None:
+            try:
+                partition = self.archive.partition(self.ds_name, period)
+            except KeyError:
+                return set()
+            with partition:
+                return {partition.id_rssd[i] for i in partition.find(ids)}
+        return {id_rssd for id_rssd in ids if os.path.exists(
+            self.outfile(self.__request(self.ds_name, period, id_rssd)))}
+
+    def plan(self):
+        """Adds the periods not yet planned to the plan.
+
+        Returns:
+            added (int): work items added to the plan
+
+        """
+        periods = self.periods
+        if periods is None:
+            periods = self.client.retrieve_reporting_periods(self.ds_name)
+        periods = sorted({format_period(str(p)) for p in periods},
+                         key=_period_date, reverse=True)
+        if self.since is not None:
+            since = _period_date(self.since)
+            periods = [p for p in periods if _period_date(p) >= since]
+
+        planned = self.state.planned(self.ds_name)
+        added = 0
+        for rank, period in enumerate(periods):
+            if period in planned:
+                continue
+            panel = self.client.retrieve_reporter_panel(self.ds_name, period)
+            if self.has_filed:
+                panel = panel.filter(has_filed=True)
+            ids = list(panel.columns['ID_RSSD'])
+            present = self.__present(period, ids)
+            work = []
+            for id_rssd in ids:
+                priority = (rank if self.priority is None else
+                            self.priority(self.ds_name, period, id_rssd,
+                                          rank))
+                work.append((id_rssd, priority,
+                             DONE if id_rssd in present else PENDING))
+            self.state.add_period(self.ds_name, period, work)
+            added += len(work)
+        return added
+
+    def progress(self, started=None, finished=0):
+        """Returns the BackfillProgress.
+
+        Args:
+            started (float): `time.monotonic()` when this run started
+            finished (int): items finished in this run
+        """
+        counts = self.state.counts()
+        total = sum(counts.values())
+        elapsed = time.monotonic() - started if started is not None else 0
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        eta = counts[PENDING] / rate if rate else None
+        return BackfillProgress(counts[DONE], counts[FAILED],
+                                counts[PENDING], total, rate, eta)
+
+    def __results(self, requests):
+        """Yields (request, error) for each request as it finishes."""
+        if self.archive is None:
+            results = self.client.retrieve_facsimiles(
+                requests, outfile=self.outfile, return_result=False,
+                max_workers=self.max_workers, retries=self.retries,
+                stream=True)
+            for result in results:
+                yield result.request, result.error
+            return
+
+        from .pipeline import Pipeline
+        pipeline = Pipeline(self.client, fetch_workers=self.max_workers,
+                            retries=self.retries)
+        # A period's filings are buffered and appended in one write once all
+        # of its requests have finished, as each append rewrites the
+        # partition; items count as done once their filings are in the
+        # archive
+        issued, buffered = {}, {}
+        current = []
+
+        def tracked():
+            try:
+                for request in requests:
+                    period = request[1]
+                    issued[period] = issued.get(period, 0) + 1
+                    current[:] = [period]
+                    yield request
+            finally:
+                current[:] = []
+
+        def flush(period):
+            filings, finished = buffered.pop(period)
+            if filings:
+                self.archive.append(filings, self.ds_name)
+            return finished
+
+        for result in pipeline.run(tracked()):
+            period = result.request[1]
+            issued[period] -= 1
+            if result.error is not None:
+                yield result.request, result.error
+            else:
+                filings, finished = buffered.setdefault(period, ([], []))
+                filings.append(result.filing)
+                finished.append(result.request)
+            # Requests come in order of priority, so a period is complete
+            # once the requests have moved on to another period
+            for period in [p for p in buffered
+                           if not issued[p] and [p] != current]:
+                for request in flush(period):
+                    yield request, None
+        for period in list(buffered):
+            for request in flush(period):
+                yield request, None
+
+    def run(self, callback=None, limit=None, retry_failed=True):
+        """Plans, then works through the pending items.
+
+        Args:
+            callback (callable): called with the BackfillProgress at each
+                checkpoint (default is None)
+            limit (int): stop after this many items; all, if None (default
+                is None)
+            retry_failed (bool): If True, retry items that failed in earlier
+                runs (default is True)
+
+        Returns:
+            progress (BackfillProgress): the progress at the end of the run
+
+        """
+        self.plan()
+        if retry_failed:
+            self.state.retry_failed()
+
+        def requests():
+            for n, key in enumerate(self.state.pending()):
+                if limit is not None and n >= limit:
+                    return
+                yield self.__request(*key)
+
+        started = last = time.monotonic()
+        finished = 0
+        done, failed = [], []
+        for request, error in self.__results(requests()):
+            key = (request[0], request[1], request[3])
+            if error is None:
+                done.append(key)
+            else:
+                failed.append(key + (error,))
+            finished += 1
+            if len(done) + len(failed) >= self.checkpoint or \
+                    time.monotonic() - last >= self.interval:
+                self.state.finish(done, failed)
+                done, failed = [], []
+                last = time.monotonic()
+                if callback is not None:
+                    callback(self.progress(started, finished))
+        self.state.finish(done, failed)
+        progress = self.progress(started, finished)
+        if callback is not None:
+            callback(progress)
+        return progress
+
+
+def outdir_outfile(outdir):
+    """Returns an outfile callable writing facsimiles under `outdir`.
+
+    Facsimiles go to `<outdir>/<ds_name>/<YYYY-MM-DD>/<fiID>.<format>`; the
+    directories are created as needed.
+    """
+    def outfile(request):
+        ds_name, period, _, fiID, fmt = request
+        path = os.path.join(outdir, str(ds_name),
+                            _period_date(period).strftime('%Y-%m-%d'))
+        os.makedirs(path, exist_ok=True)
+        return os.path.join(path, '%s.%s' % (fiID, str(fmt).lower()))
+    return outfile
+
+
+def main(argv=None, client=None):
+    """Runs a backfill from the command line; see --help."""
+    parser = argparse.ArgumentParser(
+        prog='python -m ffipy.backfill',
+        description='Downloads the facsimiles of every filer of every '
+                    'reporting period, resuming where the last run stopped.')
+    parser.add_argument('--db', required=True,
+                        help='sqlite file of the plan and progress')
+    sink = parser.add_mutually_exclusive_group(required=True)
+    sink.add_argument('--outdir', help='directory to write facsimiles to')
+    sink.add_argument('--archive',
+                      help='ffipy.archive directory to append parsed '
+                           'facsimiles to (SDF or XBRL)')
+    parser.add_argument('--ds-name', default='Call',
+                        help='DataSeriesName (default is Call)')
+    parser.add_argument('--format', type=str.upper,
+                        choices=('PDF', 'SDF', 'XBRL'),
+                        help='facsimile format (default is PDF, or SDF with '
+                             '--archive)')
+    parser.add_argument('--periods', nargs='+',
+                        help='reporting periods (default is all)')
+    parser.add_argument('--since', help='skip periods ending before this')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='concurrent downloads (default is 4)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='retries per download (default is 2)')
+    parser.add_argument('--limit', type=int,
+                        help='stop after this many facsimiles')
+    parser.add_argument('--plan', action='store_true',
+                        help='only plan, then print the progress')
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = 'SDF' if args.archive else 'PDF'
+    elif args.archive and args.format == 'PDF':
+        parser.error('--archive needs --format SDF or XBRL')
+
+    if client is None:
+        from .ffipy import FFIEC_Client
+        client = FFIEC_Client()
+    if args.archive:
+        from .archive import Archive
+        sinks = {'archive': Archive(args.archive)}
+    else:
+        sinks = {'outfile': outdir_outfile(args.outdir)}
+    backfill = Backfill(client, args.db, ds_name=args.ds_name,
+                        facsimile_fmt=args.format, periods=args.periods,
+                        since=args.since, max_workers=args.workers,
+                        retries=args.retries, **sinks)
+
+    if args.plan:
+        backfill.plan()
+        print(format_progress(backfill.progress()))
+        return 0
+
+    def show(progress):
+        sys.stdout.write('\r' + format_progress(progress) + '\033[K')
+        sys.stdout.flush()
+
+    progress = backfill.run(callback=show if sys.stdout.isatty() else
+                            lambda p: print(format_progress(p)),
+                            limit=args.limit)
+    print()
+    for (ds_name, period, id_rssd), error in sorted(
+            backfill.state.failures().items()):
+        print('failed: %s %s %s: %s' % (ds_name, period, id_rssd, error))
+    return 1 if progress.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
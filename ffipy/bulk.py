@@ -0,0 +1,102 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: concurrent bulk retrieval for FFIEC_Client
+# Usage: FFIEC_Client.retrieve_facsimiles and
+#   FFIEC_Client.retrieve_ubpr_xbrl_facsimiles run their requests through
+#   `run`, which calls a retrieve_* method on a bounded thread pool
+# ------------------------------------------------------------------------------
+
+# PSL
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+# 3rd party libs
+import zeep
+from requests import RequestException
+
+# ffipy
+from . import throttle
+
+# Errors worth retrying; anything else (e.g. a bad argument) fails immediately
+RETRY_ERRORS = (zeep.exceptions.Fault, zeep.exceptions.TransportError,
+                RequestException)
+
+BulkResult = namedtuple('BulkResult', ['request', 'result', 'error',
+                                       'attempts'])
+BulkResult.__doc__ = """Outcome of one request in a bulk retrieval.
+
+    Attributes:
+        request (tuple): the request as it was given
+        result: the value returned for the request (None on error or if
+            results are not returned)
+        error (Exception): the last error raised for the request; None if
+            the request succeeded
+        attempts (int): number of times the request was tried; 0 if
+            `outfile` failed for it
+"""
+
+
+def run(func, requests, outfile=None, return_result=True, max_workers=4,
+        retries=2, backoff=1.0, retried=None):
+    """Calls `func` for each request on a thread pool, yielding as they finish.
+
+    Args:
+        func (callable): a retrieve_* method that accepts `outfile` and
+            `return_result` keyword args
+        requests (iterable of tuples): positional args for `func`; consumed
+            lazily, so it may be a generator
+        outfile (callable): takes a request tuple and returns the path to
+            write its result to; no output, if None (default is None)
+        return_result (bool): If True, include results in the yielded
+            BulkResults (default is True)
+        max_workers (int): number of worker threads (default is 4)
+        retries (int): number of times a request is retried after a fault or
+            network error (default is 2)
+        backoff (float): upper bound in seconds of the jittered wait before
+            the first retry, doubled on each later retry (default is 1.0); see
+            `ffipy.throttle.backoff_delay`
+        retried (callable): called as retried(request, error) before each
+            retry, e.g. to count retries (default is None)
+
+    Returns:
+        results (generator of BulkResults): one per request, in completion
+            order; a failed request yields a BulkResult with its error rather
+            than raising, so the rest of the batch continues. Calls are made
+            with `ffipy.throttle.BULK` priority, so a client's scheduler lets
+            interactive calls go first
+
+    """
+    def attempt(request):
+        try:
+            path = outfile(request) if outfile else None
+        except Exception as err:
+            return BulkResult(request, None, err, 0)
+        for n in range(retries + 1):
+            try:
+                with throttle.priority(throttle.BULK):
+                    result = func(*request, outfile=path,
+                                  return_result=return_result)
+                return BulkResult(request, result, None, n + 1)
+            except RETRY_ERRORS as err:
+                error = err
+                if n < retries:
+                    if retried is not None:
+                        retried(request, err)
+                    time.sleep(throttle.backoff_delay(n, backoff))
+            except Exception as err:
+                return BulkResult(request, None, err, n + 1)
+        return BulkResult(request, None, error, retries + 1)
+
+    requests = iter(requests)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Keep a bounded window of requests in flight
+        pending = {executor.submit(attempt, tuple(request))
+                   for request in islice(requests, 2 * max_workers)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                for request in islice(requests, 1):
+                    pending.add(executor.submit(attempt, tuple(request)))
@@ -0,0 +1,321 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: caches used by ffipy to avoid repeated trips to the FFIEC SOAP
+#   servers
+# Usage: WSDLCache is passed to a zeep.Transport (FFIEC_Client does this by
+#   default) so the RetrievalService WSDL/XSD documents are only downloaded
+#   once per ffipy version and staleness period; FacsimileCache is passed to
+#   FFIEC_Client as `facsimile_cache` to reuse retrieved facsimiles;
+#   MemoCache holds FFIEC_Client's memoized metadata calls in memory
+# ------------------------------------------------------------------------------
+
+# PSL
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from datetime import datetime
+
+# 3rd party libs
+from zeep.cache import SqliteCache
+
+# ffipy
+from . import __version__
+
+# Seconds before a cached WSDL/XSD document is considered stale (one week)
+WSDL_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# Default size cap of the FacsimileCache in bytes (compressed; 1 GiB)
+FACSIMILE_CACHE_SIZE = 1024 ** 3
+
+# Default seconds FFIEC_Client memoizes the results of its metadata calls
+MEMO_TTLS = {'retrieve_reporting_periods': 6 * 60 * 60,
+             'retrieve_ubpr_reporting_periods': 6 * 60 * 60,
+             'retrieve_panel_of_reporters': 60 * 60}
+
+
+def get_cache_dir():
+    """Returns the directory for ffipy's caches, creating it if necessary.
+
+    The directory is `~/.cache/ffipy` by default, or can be set in the
+    environment variable FFIEC_CACHE_DIR.
+    """
+    path = os.getenv('FFIEC_CACHE_DIR',
+                     os.path.join(os.environ['HOME'], '.cache', 'ffipy'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class WSDLCache(SqliteCache):
+    """ A persistent, versioned cache of the WSDL/XSD documents.
+
+    Entries are tagged with the ffipy version that wrote them, so upgrading
+    ffipy invalidates the cache, and entries older than `timeout` seconds are
+    treated as stale and downloaded again.
+
+    Args:
+        path (str): path of the sqlite database; defaults to
+            `wsdl-<version>.db` in the directory returned by `get_cache_dir`
+        timeout (int): seconds before an entry is stale; entries never go
+            stale if None (default is WSDL_CACHE_TIMEOUT, one week)
+    """
+    _version = 'ffipy-%s' % __version__
+
+    def __init__(self, path=None, timeout=WSDL_CACHE_TIMEOUT):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'wsdl-%s.db' % __version__)
+        SqliteCache.__init__(self, path=path, timeout=timeout)
+
+    @property
+    def path(self):
+        """Returns the path of the sqlite database backing the cache"""
+        return self._db_path
+
+    def __getstate__(self):
+        # The lock is process-local; a new one is made when unpickled
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def clear(self):
+        """Removes all documents from the cache."""
+        with self.db_connection() as conn:
+            conn.execute('DELETE FROM request')
+            conn.commit()
+
+
+class PeriodTTL(object):
+    """ Time-to-live rule for cached facsimiles, based on the reporting period.
+
+    Facsimiles for recent periods may still be amended, so they expire after
+    `ttl` seconds; periods that ended more than `open_days` days ago are
+    closed, and their facsimiles never expire.
+
+    Args:
+        open_days (int): days after the end of a period during which it may
+            be amended (default is 400)
+        ttl (int): seconds before a facsimile of an open period expires
+            (default is 86400, one day)
+    """
+
+    def __init__(self, open_days=400, ttl=24 * 60 * 60):
+        self.open_days = open_days
+        self.ttl = ttl
+
+    def __call__(self, reporting_pd_end):
+        """Returns seconds to live for a period, or None if it is closed."""
+        try:
+            end = datetime.strptime(reporting_pd_end, '%m/%d/%Y')
+        except (TypeError, ValueError):
+            return self.ttl
+        if (datetime.now() - end).days > self.open_days:
+            return None
+        return self.ttl
+
+
+class FacsimileCache(object):
+    """ A size-bounded, on-disk cache of retrieved facsimiles.
+
+    Facsimiles are stored zlib-compressed in a sqlite database, keyed by the
+    full request (operation and arguments). When the total compressed size
+    exceeds `max_size`, the least recently used facsimiles are evicted. sqlite
+    locking makes the cache safe to share between processes on one host.
+
+    Args:
+        path (str): path of the sqlite database; defaults to `facsimiles.db`
+            in the directory returned by `get_cache_dir`
+        max_size (int): maximum total size in bytes of the compressed
+            facsimiles (default is FACSIMILE_CACHE_SIZE, 1 GiB)
+        ttl (callable): takes a reporting period end date and returns the
+            seconds before its facsimiles expire, or None if they never expire
+            (default is PeriodTTL())
+    """
+
+    def __init__(self, path=None, max_size=FACSIMILE_CACHE_SIZE, ttl=None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'facsimiles.db')
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl if ttl is not None else PeriodTTL()
+        conn = self.connection()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS facsimile
+                (key text PRIMARY KEY, content blob, size integer,
+                 expires real, accessed real)
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS facsimile_accessed '
+                         'ON facsimile (accessed)')
+        finally:
+            conn.close()
+
+    def connection(self):
+        """Returns a new connection; use as a context manager to commit."""
+        return sqlite3.connect(self.path, timeout=30,
+                               isolation_level='IMMEDIATE')
+
+    @staticmethod
+    def key(operation, *args):
+        """Returns the cache key of a request."""
+        return '|'.join(str(arg) for arg in (operation,) + args)
+
+    def get(self, key):
+        """Returns the cached facsimile for `key`, or None on a miss."""
+        now = time.time()
+        conn = self.connection()
+        try:
+            with conn:
+                row = conn.execute(
+                    'SELECT content, expires FROM facsimile WHERE key=?',
+                    (key,)).fetchone()
+                if row is None:
+                    return None
+                content, expires = row
+                if expires is not None and expires < now:
+                    conn.execute('DELETE FROM facsimile WHERE key=?', (key,))
+                    return None
+                conn.execute('UPDATE facsimile SET accessed=? WHERE key=?',
+                             (now, key))
+        finally:
+            conn.close()
+        return zlib.decompress(content)
+
+    def add(self, key, content, reporting_pd_end=None):
+        """Caches a facsimile, evicting least recently used ones as needed.
+
+        Args:
+            key (str): key of the request, see `FacsimileCache.key`
+            content (bytes): the facsimile
+            reporting_pd_end (str): end of the facsimile's reporting period,
+                used to find its time-to-live
+        """
+        now = time.time()
+        ttl = self.ttl(reporting_pd_end)
+        expires = now + ttl if ttl is not None else None
+        data = zlib.compress(content)
+        if len(data) > self.max_size:
+            return
+        conn = self.connection()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO facsimile VALUES (?, ?, ?, ?, ?)',
+                    (key, data, len(data), expires, now))
+                self.__evict(conn)
+        finally:
+            conn.close()
+
+    def __evict(self, conn):
+        """Deletes expired, then least recently used, entries over max_size."""
+        conn.execute('DELETE FROM facsimile WHERE expires < ?', (time.time(),))
+        size, = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM facsimile').fetchone()
+        if size <= self.max_size:
+            return
+        evict = []
+        rows = conn.execute('SELECT key, size FROM facsimile '
+                            'ORDER BY accessed')
+        for key, entry_size in rows:
+            if size <= self.max_size:
+                break
+            evict.append((key,))
+            size -= entry_size
+        conn.executemany('DELETE FROM facsimile WHERE key=?', evict)
+
+    @property
+    def size(self):
+        """Returns the total size in bytes of the compressed facsimiles"""
+        conn = self.connection()
+        try:
+            size, = conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM facsimile').fetchone()
+        finally:
+            conn.close()
+        return size
+
+    def clear(self):
+        """Removes all facsimiles from the cache."""
+        conn = self.connection()
+        try:
+            with conn:
+                conn.execute('DELETE FROM facsimile')
+        finally:
+            conn.close()
+
+
+class MemoCache(object):
+    """ A thread-safe, in-memory cache of call results with time-to-live.
+
+    Concurrent calls for a key that is not cached collapse into one: the
+    first caller makes the call and the others wait for its result (or
+    error), which is cached for `ttl` seconds only if it succeeded.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__values = {}
+        self.__flights = {}
+        self.__generation = 0
+
+    def get(self, key, ttl, func):
+        """Returns the cached result for `key`, or calls `func` for it.
+
+        Args:
+            key (tuple): key of the call; its first item names the method
+            ttl (float): seconds to cache the result of `func` for
+            func (callable): takes no args and returns the result
+        """
+        with self.__lock:
+            entry = self.__values.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            flight = self.__flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.__flights[key] = Future()
+                generation = self.__generation
+        if not leader:
+            return flight.result()
+
+        try:
+            value = func()
+        except BaseException as err:
+            with self.__lock:
+                del self.__flights[key]
+            flight.set_exception(err)
+            raise
+        with self.__lock:
+            del self.__flights[key]
+            # Results of calls that overlapped an invalidation may be stale
+            if generation == self.__generation:
+                self.__values[key] = (time.monotonic() + ttl, value)
+        flight.set_result(value)
+        return value
+
+    def invalidate(self, method=None, *args):
+        """Removes cached results.
+
+        Args:
+            method (str): method whose results to remove; all, if None
+            args: remove only the result of the call with these args
+        """
+        with self.__lock:
+            self.__generation += 1
+            if method is None:
+                self.__values.clear()
+            elif args:
+                self.__values.pop((method,) + args, None)
+            else:
+                for key in [key for key in self.__values
+                            if key[0] == method]:
+                    del self.__values[key]
+
+    def __len__(self):
+        return len(self.__values)
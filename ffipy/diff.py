@@ -0,0 +1,243 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: item-level deltas between versions of a refiled facsimile
+# Usage: FingerprintStore().update(filing) stores the fingerprint of a parsed
+#   filing and returns a FilingDelta with only the items that were added,
+#   changed or removed since the version stored before, so downstream loads
+#   of amendments touch just those items
+# ------------------------------------------------------------------------------
+
+# PSL
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from collections import namedtuple
+
+# ffipy
+from .cache import get_cache_dir
+from .parse import format_period
+
+# Bytes of the item and section hashes
+DIGEST_SIZE = 8
+
+Fingerprint = namedtuple('Fingerprint', ['raw', 'digest', 'sections',
+                                         'items'])
+Fingerprint.__doc__ = """Hashes of one version of a filing.
+
+    Attributes:
+        raw (str): hex digest of the facsimile's bytes; None if unknown
+        digest (str): hex digest of all the filing's items
+        sections (dict): maps section (see `section_of`) to the hex digest
+            of its items
+        items (dict): maps item name to the int hash of its value
+"""
+
+FilingDelta = namedtuple('FilingDelta', ['id_rssd', 'period', 'changed',
+                                         'removed', 'previous'])
+FilingDelta.__doc__ = """Items of a filing that differ from its stored version.
+
+    A delta with no changed or removed items means the refiling changed
+    nothing.
+
+    Attributes:
+        id_rssd (int): ID RSSD of the filer
+        period (str): reporting period, e.g. '3/31/2017'
+        changed (dict): maps each added or changed item to its new value
+        removed (tuple of strs): items in the stored version but not this one
+        previous (bool): False if no version was stored, in which case every
+            item is in `changed`
+"""
+
+
+def section_of(item):
+    """Returns the section of an item: its MDRM mnemonic (e.g. 'RCON')."""
+    return item[:4]
+
+
+def _hash(name, value):
+    if isinstance(value, float):
+        value = repr(value)
+    data = ('%s\0%s' % (name, value)).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=DIGEST_SIZE)
+                          .digest(), 'big')
+
+
+def _digest(hashes):
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for value in sorted(hashes):
+        h.update(value.to_bytes(DIGEST_SIZE, 'big') if isinstance(value, int)
+                 else value.encode('ascii'))
+    return h.hexdigest()
+
+
+def fingerprint(values, facsimile=None, section=section_of):
+    """Returns the Fingerprint of a filing's items.
+
+    Args:
+        values (dict): maps item name to value, as in `ffipy.parse.Filing`
+        facsimile (bytes): the facsimile the values were parsed from, to
+            fingerprint its bytes too (default is None)
+        section (callable): takes an item name and returns its section
+            (default is `section_of`)
+    """
+    items = {name: _hash(name, value) for name, value in values.items()
+             if value is not None}
+    grouped = {}
+    for name, item_hash in items.items():
+        grouped.setdefault(section(name), []).append(item_hash)
+    sections = {name: _digest(hashes) for name, hashes in grouped.items()}
+    raw = (hashlib.blake2b(facsimile).hexdigest()
+           if facsimile is not None else None)
+    return Fingerprint(raw, _digest(sections.values()), sections, items)
+
+
+def diff(old, new, values, section=section_of):
+    """Returns the items of `values` that changed between two fingerprints.
+
+    Only the items of sections whose digests differ are compared.
+
+    Args:
+        old (Fingerprint): the stored version
+        new (Fingerprint): the fingerprint of `values`
+        values (dict): the new version's items
+        section (callable): see `fingerprint`
+
+    Returns:
+        changed (dict): maps each added or changed item to its new value
+        removed (tuple of strs): items only in the old version
+
+    """
+    if old.digest == new.digest:
+        return {}, ()
+    stale = {name for name, digest in new.sections.items()
+             if old.sections.get(name) != digest}
+    stale.update(name for name in old.sections if name not in new.sections)
+    changed = {name: values[name] for name, item_hash in new.items.items()
+               if section(name) in stale
+               and old.items.get(name) != item_hash}
+    removed = tuple(sorted(name for name in old.items
+                           if section(name) in stale
+                           and name not in new.items))
+    return changed, removed
+
+
+def apply_delta(values, delta):
+    """Returns a copy of a filing's items with a FilingDelta applied."""
+    values = dict(values)
+    values.update(delta.changed)
+    for name in delta.removed:
+        values.pop(name, None)
+    return values
+
+
+class FingerprintStore(object):
+    """ An on-disk store of the last fingerprint of each filing.
+
+    Fingerprints are stored zlib-compressed in a sqlite database, keyed by
+    (ds_name, reporting period, ID RSSD); sqlite locking makes the store safe
+    to share between processes on one host.
+
+    Args:
+        path (str): path of the sqlite database; defaults to
+            `fingerprints.db` in the directory returned by `get_cache_dir`
+        section (callable): takes an item name and returns its section
+            (default is `section_of`)
+    """
+
+    def __init__(self, path=None, section=section_of):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'fingerprints.db')
+        self.path = path
+        self.section = section
+        conn = self.connection()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprint
+                (ds_name text, period text, id_rssd integer, raw text,
+                 content blob, updated real,
+                 PRIMARY KEY (ds_name, period, id_rssd))
+            """)
+        finally:
+            conn.close()
+
+    def connection(self):
+        """Returns a new connection; use as a context manager to commit."""
+        return sqlite3.connect(self.path, timeout=30,
+                               isolation_level='IMMEDIATE')
+
+    @staticmethod
+    def __key(ds_name, period, id_rssd):
+        return str(ds_name), format_period(period), int(id_rssd)
+
+    def get(self, ds_name, period, id_rssd):
+        """Returns the stored Fingerprint of a filing, or None."""
+        conn = self.connection()
+        try:
+            row = conn.execute(
+                'SELECT raw, content FROM fingerprint WHERE ds_name=? AND '
+                'period=? AND id_rssd=?',
+                self.__key(ds_name, period, id_rssd)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        digest, sections, items = json.loads(zlib.decompress(row[1]))
+        return Fingerprint(row[0], digest, sections, items)
+
+    def put(self, ds_name, period, id_rssd, fp):
+        """Stores the Fingerprint of a filing, replacing the previous one."""
+        content = zlib.compress(json.dumps(
+            [fp.digest, fp.sections, fp.items],
+            separators=(',', ':')).encode('utf-8'))
+        conn = self.connection()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO fingerprint VALUES '
+                    '(?, ?, ?, ?, ?, ?)',
+                    self.__key(ds_name, period, id_rssd) +
+                    (fp.raw, content, time.time()))
+        finally:
+            conn.close()
+
+    def unchanged(self, ds_name, period, id_rssd, facsimile):
+        """Returns True if a facsimile has the bytes of the stored version.
+
+        Such a refiling can be skipped without parsing it.
+        """
+        fp = self.get(ds_name, period, id_rssd)
+        return (fp is not None and fp.raw is not None
+                and fp.raw == hashlib.blake2b(facsimile).hexdigest())
+
+    def update(self, filing, ds_name='Call', facsimile=None):
+        """Stores a filing's fingerprint and returns its FilingDelta.
+
+        Args:
+            filing (ffipy.parse.Filing): the parsed filing
+            ds_name (str): DataSeriesName of the filing (default is 'Call')
+            facsimile (bytes): the facsimile the filing was parsed from; if
+                given, its bytes are fingerprinted for `unchanged` (default
+                is None)
+
+        Returns:
+            delta (FilingDelta): the items that differ from the stored
+                version; all items, if none was stored
+
+        """
+        period = format_period(filing.period)
+        old = self.get(ds_name, period, filing.id_rssd)
+        new = fingerprint(filing.values, facsimile, self.section)
+        if old is None:
+            changed = {name: value for name, value in filing.values.items()
+                       if value is not None}
+            removed = ()
+        else:
+            changed, removed = diff(old, new, filing.values, self.section)
+        if old is None or old.digest != new.digest or old.raw != new.raw:
+            self.put(ds_name, period, filing.id_rssd, new)
+        return FilingDelta(filing.id_rssd, period, changed, removed,
+                           old is not None)
@@ -0,0 +1,215 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: a fast path for the FFIEC operations returning large lists
+# Usage: FFIEC_Client.retrieve_panel_of_reporters,
+#   retrieve_filers_submission_datetime and retrieve_filers_since_date take
+#   `raw=True` to parse the response with a specialized lxml iterparse instead
+#   of zeep's generic deserialization; retrieve_facsimile and
+#   retrieve_ubpr_xbrl_facsimile always post a precompiled request (see
+#   `ffipy.template`) and decode the base64 result directly
+# ------------------------------------------------------------------------------
+
+# PSL
+import base64
+import binascii
+import io
+import logging
+from collections import namedtuple
+
+# 3rd party libs
+from lxml import etree
+
+# ffipy
+from . import template
+from .metrics import metrics_plugins
+from .panel import FIELDS as REPORTER_FIELDS, ID_FIELDS
+
+logger = logging.getLogger(__name__)
+
+NS = 'http://cdr.ffiec.gov/public/services'
+
+
+class SchemaMismatch(Exception):
+    """The response is not in the form the fast path expects."""
+
+
+class _ByName(object):
+    """Mixin letting namedtuple rows also be indexed by field name, like the
+    objects returned by zeep."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+
+class Reporter(_ByName, namedtuple('Reporter', REPORTER_FIELDS)):
+    """An institution in the Panel of Reporters."""
+    __slots__ = ()
+
+
+class FilerSubmission(_ByName, namedtuple('FilerSubmission',
+                                          ['ID_RSSD', 'DateTime'])):
+    """The ID RSSD and submission DateTime of a filer."""
+    __slots__ = ()
+
+
+def _to_bool(text):
+    if text == 'true' or text == '1':
+        return True
+    if text == 'false' or text == '0':
+        return False
+    raise SchemaMismatch('Not a boolean: %r' % text)
+
+
+def _to_int(text):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        raise SchemaMismatch('Not an int: %r' % text)
+
+
+def _iter_rows(content, operation, row_tag):
+    """Yields the row elements of `<operation>Result` in a response.
+
+    Each row is cleared after it is consumed, so the document is never held
+    in memory as a whole.
+
+    Raises:
+        SchemaMismatch: if the response has no `<operation>Result` element
+    """
+    result_tag = '{%s}%sResult' % (NS, operation)
+    row_tag = '{%s}%s' % (NS, row_tag)
+    found = False
+    for event, elem in etree.iterparse(io.BytesIO(content),
+                                       events=('start', 'end'),
+                                       resolve_entities=False,
+                                       huge_tree=True):
+        if event == 'start':
+            if elem.tag == result_tag:
+                found = True
+            continue
+        if elem.tag == row_tag:
+            yield elem
+            elem.clear()
+            parent = elem.getparent()
+            while elem.getprevious() is not None:
+                del parent[0]
+    if not found:
+        raise SchemaMismatch('No %s in response' % result_tag)
+
+
+def _children(elem, fields):
+    """Returns list of the text of elem's children in the order of fields."""
+    values = [None] * len(fields)
+    for child in elem:
+        tag = child.tag
+        if not isinstance(tag, str):
+            continue
+        try:
+            values[fields[tag]] = child.text
+        except KeyError:
+            raise SchemaMismatch('Unexpected element %s' % tag)
+    return values
+
+
+def parse_panel_of_reporters(content):
+    """Parses a RetrievePanelOfReporters response into Reporters."""
+    fields = {'{%s}%s' % (NS, field): i
+              for i, field in enumerate(REPORTER_FIELDS)}
+    n_ids = len(ID_FIELDS)
+    reporters = []
+    for elem in _iter_rows(content, 'RetrievePanelOfReporters',
+                           'ReportingFinancialInstitution'):
+        values = _children(elem, fields)
+        for i in range(n_ids):
+            values[i] = _to_int(values[i])
+        values[-1] = _to_bool(values[-1])
+        reporters.append(Reporter._make(values))
+    return reporters
+
+
+def parse_filers_submission_datetime(content):
+    """Parses a RetrieveFilersSubmissionDateTime response into
+    FilerSubmissions."""
+    fields = {'{%s}ID_RSSD' % NS: 0, '{%s}DateTime' % NS: 1}
+    filers = []
+    for elem in _iter_rows(content, 'RetrieveFilersSubmissionDateTime',
+                           'RetrieveFilersDateTime'):
+        id_rssd, dt = _children(elem, fields)
+        filers.append(FilerSubmission(_to_int(id_rssd), dt))
+    return filers
+
+
+def parse_filers_since_date(content):
+    """Parses a RetrieveFilersSinceDate response into a list of ID RSSDs."""
+    return [_to_int(elem.text) for elem in
+            _iter_rows(content, 'RetrieveFilersSinceDate', 'int')]
+
+
+def parse_base64_result(operation):
+    """Returns a parser of the base64Binary `<operation>Result` of a response,
+    decoding it to bytes (or None if it is nil)."""
+    result_tag = '{%s}%sResult' % (NS, operation)
+    nil = '{http://www.w3.org/2001/XMLSchema-instance}nil'
+
+    def parse(content):
+        # Parsers are not shared, as lxml parsers are not thread-safe
+        parser = etree.XMLParser(resolve_entities=False, no_network=True,
+                                 huge_tree=True)
+        root = etree.fromstring(content, parser)
+        result = next(root.iter(result_tag), None)
+        if result is None:
+            raise SchemaMismatch('No %s in response' % result_tag)
+        if result.get(nil) in ('true', '1'):
+            return None
+        try:
+            return base64.b64decode(result.text or '')
+        except binascii.Error as err:
+            raise SchemaMismatch('Invalid base64 in %s: %s'
+                                 % (result_tag, err))
+    return parse
+
+
+parse_facsimile_result = parse_base64_result('RetrieveFacsimile')
+parse_ubpr_xbrl_facsimile_result = parse_base64_result(
+    'RetrieveUBPRXBRLFacsimile')
+
+
+def call(client, operation, args, parse):
+    """Calls an operation, parsing the response with `parse`.
+
+    The request comes from the operation's precompiled template in
+    `ffipy.template`, or is built by zeep if it has none (e.g. with a digest
+    login or plugins). If the response is a fault or not in the form `parse`
+    expects, it is handed to zeep's deserialization instead, so errors and
+    schema changes behave as on the zeep path.
+
+    Args:
+        client (zeep.Client): client whose service, wsse and transport to use
+        operation (str): name of the operation
+        args (tuple): positional args for the operation
+        parse (callable): takes the response content and returns the result;
+            raises SchemaMismatch if it cannot
+
+    Returns:
+        result: the value returned by `parse`, or by zeep on fallback
+
+    """
+    address, body, http_headers = template.request(client, operation, args)
+    response = client.transport.post(address, body, http_headers)
+    if response.status_code == 200:
+        try:
+            result = parse(response.content)
+        except (SchemaMismatch, etree.XMLSyntaxError) as err:
+            logger.debug('Falling back to zeep for %s: %s', operation, err)
+        else:
+            for plugin in metrics_plugins(client):
+                plugin.finish(operation)
+            return result
+    binding = client.service._binding
+    return binding.process_reply(client, binding.get(operation), response)
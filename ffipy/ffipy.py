@@ -11,6 +11,8 @@
 # PSL
 import sys
 import os
+from contextlib import ExitStack, nullcontext
+from functools import partial
 from warnings import warn
 from configparser import ConfigParser
 
@@ -18,6 +20,14 @@ from configparser import ConfigParser
 import zeep
 from zeep.wsse.username import UsernameToken
 
+# ffipy
+from . import bulk, fast, snapshot
+from .cache import MEMO_TTLS, MemoCache, WSDLCache
+from .metrics import MetricsPlugin
+from .panel import ReporterPanel
+from .stream import post_streaming
+from .transport import PooledTransport
+
 
 class FFIEC_Client(zeep.Client):
     """ A wrapper class of zeep.Client for connecting to FFIEC's SOAP server.
@@ -29,6 +39,38 @@ class FFIEC_Client(zeep.Client):
                 FFIEC_USER_CONF environment variable) in INI format under
                 section `[wsse]`
             `wsdl` is not passed as an argument, b/c `wsdl` is constant.
+            `store_login` is `bool`; see Attributes.
+            `check_login` is `bool` that if set to False skips the
+                `TestUserAccess` round trip (and the login prompts) when the
+                client is created (default is True).
+            `memo_ttls` is a `dict` mapping the names of the metadata
+                methods retrieve_reporting_periods,
+                retrieve_ubpr_reporting_periods and
+                retrieve_panel_of_reporters to the seconds their results are
+                memoized for; a method left out or mapped to 0 is not
+                memoized (default is `ffipy.cache.MEMO_TTLS`). See
+                `invalidate`.
+            `interactive` is `bool` that if set to False never prompts for a
+                login: a missing login raises ValueError, and a refused one
+                raises ValueError or the zeep Fault (default is True).
+            `transport` defaults to a new `ffipy.transport.PooledTransport`;
+                pass `other_client.transport.shared()` to share its
+                connection pool.
+            `wsdl_cache` is a `zeep.cache.Base` used to cache the WSDL/XSD
+                documents when `transport` is None (default is a `WSDLCache`
+                on disk, so only the first client downloads the WSDL).
+            `facsimile_cache` is an optional `ffipy.cache.FacsimileCache`
+                that retrieve_facsimile and retrieve_ubpr_xbrl_facsimile
+                check before (and fill after) calling the FFIEC site (default
+                is None, no caching).
+            `scheduler` is an optional `ffipy.throttle.Scheduler`, shared by
+                clients, that every call to the FFIEC site waits on for a
+                rate and concurrency slot of the client's account (default is
+                None, no throttling).
+            `metrics` is an optional `ffipy.metrics.Metrics` recording the
+                latency, payload bytes, faults and retries of each operation,
+                and the time spent loading the WSDL, looking up types and
+                writing outfiles (default is None, no metrics).
 
     Attributes:
         Similar to parent class `zeep.Client`, except:
@@ -40,6 +82,21 @@ class FFIEC_Client(zeep.Client):
                 FFIEC login info for future use. The path of this file is
                 `~/.ffiec` by default, or can be set in the environment
                 variable FFIEC_USER_CONF.
+            `memo` is the `ffipy.cache.MemoCache` of memoized results.
+            `xsd_types` is a `dict` caching the types returned by
+                `get_type`.
+            `request_templates` is a `dict` of the precompiled requests of
+                the facsimile operations; see `ffipy.template`.
+            `wsdl_documents` is a `dict` mapping URL to the content of the
+                WSDL/XSD documents the client was built from.
+            `reporter_panels` is a `dict` caching the `ReporterPanel`s
+                returned by `retrieve_reporter_panel` per (ds_name,
+                reporting_pd_end).
+
+    Pickling:
+        A client pickles as an `ffipy.snapshot.ClientSnapshot` holding the
+        WSDL documents and login, and unpickles as a non-interactive client
+        without downloading anything; see `ffipy.snapshot` for process pools.
 
     Methods:
         See https://cdr.ffiec.gov/Public/PWS/WebServices/RetrievalService.asmx
@@ -48,24 +105,46 @@ class FFIEC_Client(zeep.Client):
     wsdl = ('https://cdr.ffiec.gov/Public/PWS/WebServices/'
             'RetrievalService.asmx?WSDL')
 
+    # If False, a missing login raises ValueError instead of prompting for one
+    interactive = True
+    facsimile_cache = None
+    scheduler = None
+    metrics = None
+
     def __init__(self, wsse=None, transport=None, service_name=None,
                  port_name=None, plugins=None, strict=True,
-                 xml_huge_tree=False, store_login=True):
-        self.wsse_path = os.getenv('FFIEC_USER_CONF',
-                                   os.path.join(os.environ['HOME'], '.ffiec'))
-        self.wsse = wsse
-        zeep.Client.__init__(self, self.wsdl, self.wsse, transport,
-                             service_name, port_name, plugins, strict,
-                             xml_huge_tree)
-
-        # Ensure that user login (i.e., the wsse variable) was good
+                 xml_huge_tree=False, store_login=True, check_login=True,
+                 wsdl_cache=None, facsimile_cache=None, scheduler=None,
+                 metrics=None, interactive=True, memo_ttls=None):
+        self.interactive = interactive
+        self._init_state(wsse, service_name, port_name, strict, xml_huge_tree,
+                         facsimile_cache, scheduler, metrics, memo_ttls)
+        if transport is None:
+            if wsdl_cache is None:
+                wsdl_cache = WSDLCache()
+            transport = PooledTransport(cache=wsdl_cache)
+        if metrics is not None:
+            plugins = list(plugins or []) + [MetricsPlugin(metrics)]
+            # Transports without a requests session get no HTTP metrics
+            session = getattr(transport, 'session', None)
+            if session is not None:
+                hooks = session.hooks.setdefault('response', [])
+                if metrics.response_hook not in hooks:
+                    hooks.append(metrics.response_hook)
+        with self._timer('ffipy_wsdl_load_seconds'), \
+                snapshot.documents(transport, self.wsdl_documents):
+            zeep.Client.__init__(self, self.wsdl, self.wsse, transport,
+                                 service_name, port_name, plugins, strict,
+                                 xml_huge_tree)
+        if not check_login:
+            return
+
+        # Ensure that user login (i.e., the wsse variable) was good; the
+        # parsed wsdl does not depend on the login, so only wsse is replaced
         retry = self.__check_login()
         while retry and retry.startswith(('y', 'Y')):
             username, password = self.__get_login()
             self.wsse = UsernameToken(username, password)
-            zeep.Client.__init__(self, self.wsdl.location, self.wsse,
-                                 transport, service_name, port_name, plugins,
-                                 strict, xml_huge_tree)
             retry = self.__check_login()
 
         if retry is None:
@@ -74,6 +153,39 @@ class FFIEC_Client(zeep.Client):
             if store_login and not wsse_via_file:
                 self.__store_login()
 
+    def _init_state(self, wsse, service_name=None, port_name=None,
+                    strict=True, xml_huge_tree=False, facsimile_cache=None,
+                    scheduler=None, metrics=None, memo_ttls=None):
+        """Sets the attributes of the client, before zeep loads the WSDL.
+
+        Subclasses that do not call FFIEC_Client.__init__ (e.g.
+        `ffipy.aio.AsyncFFIEC_Client`) call it, so the inherited methods find
+        the state they use.
+        """
+        self.memo_ttls = dict(MEMO_TTLS if memo_ttls is None else memo_ttls)
+        self.memo = MemoCache()
+        self.xsd_types = {}
+        self.request_templates = {}
+        self.facsimile_cache = facsimile_cache
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.reporter_panels = {}
+        self.wsdl_documents = {}
+        self.zeep_options = {'service_name': service_name,
+                             'port_name': port_name, 'strict': strict,
+                             'xml_huge_tree': xml_huge_tree}
+        self.wsse_path = os.getenv('FFIEC_USER_CONF',
+                                   os.path.join(os.environ['HOME'], '.ffiec'))
+        self.wsse = wsse
+
+    def __reduce__(self):
+        return snapshot.restore, (self.snapshot(),)
+
+    def snapshot(self):
+        """Returns the picklable `ffipy.snapshot.ClientSnapshot` of the client.
+        """
+        return snapshot.snapshot(self)
+
     @property
     def wsse(self):
         """Returns the wsse property of the class"""
@@ -91,9 +203,12 @@ class FFIEC_Client(zeep.Client):
             conf.read(self.wsse_path)
             self.__wsse = UsernameToken(conf['wsse']['username'],
                                         conf['wsse']['password'])
-        else:
+        elif self.interactive:
             username, password = self.__get_login()
             self.__wsse = UsernameToken(username, password)
+        else:
+            raise ValueError('No FFIEC login given and none configured in %s'
+                             % self.wsse_path)
 
     def __check_login(self):
         """Checks for user access and asks user to retry if no access / error.
@@ -109,11 +224,15 @@ class FFIEC_Client(zeep.Client):
         try:
             if self.test_user_access():  # User has access
                 return None
+            elif not self.interactive:
+                raise ValueError('FFIEC login does not have user access')
             else:
                 print('FFIEC login does not have user access...')
 
         # Catch any login errors and print message from error
         except zeep.exceptions.Fault as err:
+            if not self.interactive:
+                raise
             print('Error with FFIEC login: %s...\n' % err.message)
 
         # Give user the chance to retry
@@ -144,11 +263,131 @@ class FFIEC_Client(zeep.Client):
         with open(self.wsse_path, 'w') as f:
             conf.write(f)
 
+    def _call(self, operation, ds_name=None):
+        """Returns a context manager around a call to the FFIEC site.
+
+        It holds a slot of the client's scheduler and records the call in the
+        client's metrics; it does nothing if neither is set.
+        """
+        if self.scheduler is None and self.metrics is None:
+            return nullcontext()
+        stack = ExitStack()
+        if self.scheduler is not None:
+            stack.enter_context(self.scheduler.slot(self.wsse.username))
+        if self.metrics is not None:
+            stack.enter_context(self.metrics.track(
+                operation, str(ds_name) if ds_name is not None else None))
+        return stack
+
+    def _timer(self, name, **labels):
+        """Returns a context manager timing its block in the metrics."""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.timer(name, **labels)
+
+    def get_type(self, name):
+        """Returns the type `name` from the WSDL; see `zeep.Client`.
+
+        Types are looked up once per client and then cached in `xsd_types`.
+        """
+        xsd_type = self.xsd_types.get(name)
+        if xsd_type is None:
+            with self._timer('ffipy_get_type_seconds', type=name):
+                xsd_type = zeep.Client.get_type(self, name)
+            self.xsd_types[name] = xsd_type
+        return xsd_type
+
+    def __memoized(self, method, args, func):
+        """Returns func(), memoized for the method's TTL in `memo_ttls`.
+
+        Lists are copied, so callers may modify the results they get.
+        """
+        ttl = self.memo_ttls.get(method)
+        if not ttl:
+            return func()
+        result = self.memo.get((method,) + args, ttl, func)
+        return list(result) if isinstance(result, list) else result
+
+    def invalidate(self, method=None, *args):
+        """Forgets memoized results, so the next calls go to the FFIEC site.
+
+        Args:
+            method (str): name of the method whose results to forget, e.g.
+                'retrieve_panel_of_reporters'; all methods, if None
+            args: forget only the results of calls with these args, as
+                (ds_name,) for retrieve_reporting_periods, () for
+                retrieve_ubpr_reporting_periods, and (ds_name,
+                reporting_pd_end, raw) for retrieve_panel_of_reporters
+
+        """
+        self.memo.invalidate(method, *args)
+
+    def _retried(self, operation, ds_name=False):
+        """Returns a `bulk.run` retried callback counting retries, or None.
+
+        If `ds_name` is True, the ds_name is taken from the requests.
+        """
+        if self.metrics is None:
+            return None
+
+        def retried(request, error):
+            self.metrics.inc('ffipy_retries_total', operation=operation,
+                             ds_name=request[0] if ds_name else None)
+        return retried
+
+    @staticmethod
+    def _fi_id(fiID):
+        """Returns fiID as an int, as the service's xsd:int fiID.
+
+        zeep sends any value as is, so an invalid fiID is rejected here,
+        before a request is made or retried.
+
+        Raises:
+            ValueError: if fiID is not an integer
+        """
+        try:
+            return int(str(fiID).strip(), 10)
+        except ValueError:
+            raise ValueError('Invalid fiID: %r' % (fiID,))
+
+    def __write(self, facsimile, outfile, operation):
+        """Writes a facsimile to a path or file-like outfile."""
+        if self.metrics is not None:
+            self.metrics.inc('ffipy_write_bytes_total', len(facsimile),
+                             operation=operation)
+        with self._timer('ffipy_write_seconds', operation=operation):
+            if hasattr(outfile, 'write'):
+                outfile.write(facsimile)
+            else:
+                with open(outfile, 'wb') as f:
+                    f.write(facsimile)
+
+    def __stream(self, operation, args, outfile, ds_name=None):
+        """Streams the facsimile of an operation to a path or file-like.
+
+        A path is written via a temporary `.part` file that is renamed when
+        the facsimile is complete, so a failed stream leaves no partial file.
+        """
+        if not outfile:
+            raise ValueError('An outfile is required to stream a facsimile')
+        if hasattr(outfile, 'write'):
+            with self._call(operation, ds_name):
+                return post_streaming(self, operation, args, outfile)
+        part = outfile + '.part'
+        try:
+            with open(part, 'wb') as f, self._call(operation, ds_name):
+                size = post_streaming(self, operation, args, f)
+            os.replace(part, outfile)
+        finally:
+            if os.access(part, os.F_OK):
+                os.remove(part)
+        return size
+
     def retrieve_facsimile(self, ds_name='Call',
                            reporting_pd_end='3/31/2017',
                            fiID_type='ID_RSSD', fiID=64150,
                            facsimile_fmt='PDF',
-                           outfile=None, return_result=True):
+                           outfile=None, return_result=True, stream=False):
         """Retrieves a facsimile (e.g., a report) from FFIEC site.
 
         Args:
@@ -159,42 +398,87 @@ class FFIEC_Client(zeep.Client):
             fiID (int): Financial Inst ID (default is 64150, for testing)
             facsimile_fmt (str): Format of facsimile to retrieve (default is
                 'PDF')
-            outfile (str): path to write facsimile to; no ouput, if None
-                (default is None)
+            outfile (str or file-like): path or file object to write
+                facsimile to; no ouput, if None (default is None)
             return_result (bool): If True, return the retrieved facsimile
                 (default is True)
+            stream (bool): If True, decode the response straight into
+                `outfile` in chunks instead of building the facsimile in
+                memory; the facsimile cache is bypassed and `return_result`
+                is ignored (default is False)
 
         Returns:
             facsimile (bytes): the revtrieved facsimile (only if
-                return_result==True)
+                return_result==True); if stream==True, the number of bytes
+                written to outfile instead
 
         """
-        # Set up kw args
-        data_series = self.get_type('ns0:ReportingDataSeriesName')
-        ds_name = data_series(ds_name)
-        fiID_type_type = self.get_type('ns0:FinancialInstitutionIDType')
-        fiID_type = fiID_type_type(fiID_type)
-        facsimile_fmt_type = self.get_type('ns0:FacsimileFormat')
-        facsimile_fmt = facsimile_fmt_type(facsimile_fmt)
-
-        # Get results
-        facsimile = self.service.RetrieveFacsimile(ds_name,
-                                                   reporting_pd_end,
-                                                   fiID_type, fiID,
-                                                   facsimile_fmt)
+        # The enumerations are plain strings in the request, so the request
+        # template is filled in with the args as given
+        fiID = self._fi_id(fiID)
+        if stream:
+            return self.__stream('RetrieveFacsimile',
+                                 (ds_name, reporting_pd_end, fiID_type, fiID,
+                                  facsimile_fmt), outfile, ds_name)
+
+        # Get results, from the cache if possible
+        facsimile = None
+        if self.facsimile_cache is not None:
+            key = self.facsimile_cache.key('RetrieveFacsimile', ds_name,
+                                           reporting_pd_end, fiID_type, fiID,
+                                           facsimile_fmt)
+            facsimile = self.facsimile_cache.get(key)
+        if facsimile is None:
+            with self._call('RetrieveFacsimile', ds_name):
+                facsimile = fast.call(self, 'RetrieveFacsimile',
+                                      (ds_name, reporting_pd_end, fiID_type,
+                                       fiID, facsimile_fmt),
+                                      fast.parse_facsimile_result)
+            if self.facsimile_cache is not None and facsimile is not None:
+                self.facsimile_cache.add(key, facsimile, reporting_pd_end)
+
         # Write file
         if outfile:
-            mode = 'wb' if facsimile_fmt == 'PDF' else 'w'
-            with open(outfile, mode) as f:
-                f.write(facsimile)
+            self.__write(facsimile, outfile, 'RetrieveFacsimile')
 
         # Return results
         if return_result:
             return facsimile
 
+    def retrieve_facsimiles(self, requests, outfile=None, return_result=True,
+                            max_workers=4, retries=2, stream=False):
+        """Retrieves many facsimiles concurrently from FFIEC site.
+
+        Args:
+            requests (iterable of tuples): (ds_name, reporting_pd_end,
+                fiID_type, fiID, facsimile_fmt) for each facsimile; see
+                `retrieve_facsimile`
+            outfile (callable): takes a request tuple and returns the path to
+                write its facsimile to; no output, if None (default is None)
+            return_result (bool): If True, include the retrieved facsimiles
+                in the results (default is True)
+            max_workers (int): number of concurrent requests (default is 4)
+            retries (int): number of times a request is retried after a
+                fault or network error (default is 2)
+            stream (bool): If True, stream each facsimile to its outfile; see
+                `retrieve_facsimile` (default is False)
+
+        Returns:
+            results (generator of ffipy.bulk.BulkResults): one per request in
+                completion order, with the facsimile in `result` or the
+                failure in `error`
+
+        """
+        func = partial(self.retrieve_facsimile, stream=stream)
+        return bulk.run(func, requests, outfile=outfile,
+                        return_result=return_result, max_workers=max_workers,
+                        retries=retries,
+                        retried=self._retried('RetrieveFacsimile', True))
+
     def retrieve_filers_since_date(self, ds_name='Call',
                                    reporting_pd_end='3/31/2017',
-                                   last_update_date='3/31/2017'):
+                                   last_update_date='3/31/2017',
+                                   raw=False):
         """Retrieves ID RSSDs of filers after given date for given reporting pd.
 
         Args:
@@ -203,6 +487,8 @@ class FFIEC_Client(zeep.Client):
                 (default is 3/31/17)
             last_update_date (str): Specifies date that filers filed after
                 (default is 3/31/17)
+            raw (bool): If True, parse the response with the lxml fast path
+                in `ffipy.fast` instead of zeep (default is False)
 
         Returns:
             filers (list of ints): ID RSSDs of filers
@@ -211,16 +497,23 @@ class FFIEC_Client(zeep.Client):
         # Set up kw args
         data_series = self.get_type('ns0:ReportingDataSeriesName')
         ds_name = data_series(ds_name)
+        if raw:
+            with self._call('RetrieveFilersSinceDate', ds_name):
+                return fast.call(self, 'RetrieveFilersSinceDate',
+                                 (ds_name, reporting_pd_end, last_update_date),
+                                 fast.parse_filers_since_date)
 
         # Get and return results
-        filers = self.service.RetrieveFilersSinceDate(ds_name,
-                                                      reporting_pd_end,
-                                                      last_update_date)
+        with self._call('RetrieveFilersSinceDate', ds_name):
+            filers = self.service.RetrieveFilersSinceDate(ds_name,
+                                                          reporting_pd_end,
+                                                          last_update_date)
         return filers
 
     def retrieve_filers_submission_datetime(self, ds_name='Call',
                                             reporting_pd_end='3/31/2017',
-                                            last_update_date='3/31/2017'):
+                                            last_update_date='3/31/2017',
+                                            raw=False):
         """Retrieves ID RSSD, DateTime of filers after given date, reporting pd.
 
         Args:
@@ -229,6 +522,9 @@ class FFIEC_Client(zeep.Client):
                 (default is 3/31/17)
             last_update_date (str): Specifies date that filers filed after
                 (default is 3/31/17)
+            raw (bool): If True, parse the response with the lxml fast path
+                in `ffipy.fast`, returning lightweight
+                `ffipy.fast.FilerSubmission` tuples (default is False)
 
         Returns:
             results (list of dicts): dict for each filer with keys 'ID_RSSD',
@@ -238,22 +534,32 @@ class FFIEC_Client(zeep.Client):
         # Set up kw args
         data_series = self.get_type('ns0:ReportingDataSeriesName')
         ds_name = data_series(ds_name)
+        if raw:
+            with self._call('RetrieveFilersSubmissionDateTime', ds_name):
+                return fast.call(self, 'RetrieveFilersSubmissionDateTime',
+                                 (ds_name, reporting_pd_end, last_update_date),
+                                 fast.parse_filers_submission_datetime)
 
         # Get and return results
-        results = (self.service
-                   .RetrieveFilersSubmissionDateTime(ds_name,
-                                                     reporting_pd_end,
-                                                     last_update_date))
+        with self._call('RetrieveFilersSubmissionDateTime', ds_name):
+            results = (self.service
+                       .RetrieveFilersSubmissionDateTime(ds_name,
+                                                         reporting_pd_end,
+                                                         last_update_date))
         return results
 
     def retrieve_panel_of_reporters(self, ds_name='Call',
-                                    reporting_pd_end='3/31/2017'):
+                                    reporting_pd_end='3/31/2017',
+                                    raw=False):
         """Retrieves Fin Insts in Panel of Reporters for given reporting pd.
 
         Args:
             ds_name (str): DataSeriesName (default is 'Call')
             reporting_pd_end (str): Date for end of the reporting period
                 (default is 3/31/17)
+            raw (bool): If True, parse the response with the lxml fast path
+                in `ffipy.fast`, returning lightweight `ffipy.fast.Reporter`
+                tuples (default is False)
 
         Returns:
             results (list of dicts): dict for each Institution with keys
@@ -267,11 +573,51 @@ class FFIEC_Client(zeep.Client):
         data_series = self.get_type('ns0:ReportingDataSeriesName')
         ds_name = data_series(ds_name)
 
-        # Get and return results
-        results = self.service.RetrievePanelOfReporters(ds_name,
-                                                        reporting_pd_end)
+        def retrieve():
+            with self._call('RetrievePanelOfReporters', ds_name):
+                if raw:
+                    return fast.call(self, 'RetrievePanelOfReporters',
+                                     (ds_name, reporting_pd_end),
+                                     fast.parse_panel_of_reporters)
+                return self.service.RetrievePanelOfReporters(
+                    ds_name, reporting_pd_end)
+
+        # Get and return results, memoized
+        results = self.__memoized('retrieve_panel_of_reporters',
+                                  (ds_name, reporting_pd_end, raw), retrieve)
         return results
 
+    def retrieve_reporter_panel(self, ds_name='Call',
+                                reporting_pd_end='3/31/2017', refresh=False):
+        """Retrieves the Panel of Reporters as an indexed ReporterPanel.
+
+        The panel is cached in `reporter_panels`, so later calls for the same
+        ds_name and reporting period make no request.
+
+        Args:
+            ds_name (str): DataSeriesName (default is 'Call')
+            reporting_pd_end (str): Date for end of the reporting period
+                (default is 3/31/17)
+            refresh (bool): If True, retrieve the panel even if it is cached
+                (default is False)
+
+        Returns:
+            panel (ffipy.panel.ReporterPanel): the institutions in the panel
+
+        """
+        key = (ds_name, reporting_pd_end)
+        if refresh or key not in self.reporter_panels:
+            if refresh:
+                self.invalidate('retrieve_panel_of_reporters', ds_name,
+                                reporting_pd_end, True)
+            reporters = self.retrieve_panel_of_reporters(ds_name,
+                                                         reporting_pd_end,
+                                                         raw=True)
+            self.reporter_panels[key] = ReporterPanel(reporters or (),
+                                                      ds_name,
+                                                      reporting_pd_end)
+        return self.reporter_panels[key]
+
     def retrieve_reporting_periods(self, ds_name='Call'):
         """Retrieves end dates of financial reporting periods.
 
@@ -286,8 +632,13 @@ class FFIEC_Client(zeep.Client):
         data_series = self.get_type('ns0:ReportingDataSeriesName')
         ds_name = data_series(ds_name)
 
-        # Get and return dates
-        dates = self.service.RetrieveReportingPeriods(ds_name)
+        def retrieve():
+            with self._call('RetrieveReportingPeriods', ds_name):
+                return self.service.RetrieveReportingPeriods(ds_name)
+
+        # Get and return dates, memoized
+        dates = self.__memoized('retrieve_reporting_periods', (ds_name,),
+                                retrieve)
         return dates
 
     def retrieve_ubpr_reporting_periods(self):
@@ -300,13 +651,19 @@ class FFIEC_Client(zeep.Client):
             dates (list of strs): End dates of UBPR reporting periods
 
         """
-        # Get and return dates
-        dates = self.service.RetrieveUBPRReportingPeriods()
+        def retrieve():
+            with self._call('RetrieveUBPRReportingPeriods'):
+                return self.service.RetrieveUBPRReportingPeriods()
+
+        # Get and return dates, memoized
+        dates = self.__memoized('retrieve_ubpr_reporting_periods', (),
+                                retrieve)
         return dates
 
     def retrieve_ubpr_xbrl_facsimile(self, reporting_pd_end='3/31/2017',
                                      fiID_type='ID_RSSD', fiID=64150,
-                                     outfile=None, return_result=True):
+                                     outfile=None, return_result=True,
+                                     stream=False):
         """Retrieves a UBPR facsimile in XBRL format from FFIEC site.
 
         Args:
@@ -314,33 +671,76 @@ class FFIEC_Client(zeep.Client):
                 (default is 3/31/17)
             fiID_type (str): Type of Financial Inst ID (default is 'ID_RSSD')
             fiID (int): Financial Inst ID (default is 64150, for testing)
-            outfile (str): path to write facsimile to; no ouput, if None
-                (default is None)
+            outfile (str or file-like): path or file object to write
+                facsimile to; no ouput, if None (default is None)
             return_result (bool): If True, return the retrieved facsimile
                 (default is True)
+            stream (bool): If True, decode the response straight into
+                `outfile`; see `retrieve_facsimile` (default is False)
 
         Returns:
             facsimile (bytes): the revtrieved facsimile (only if
-                return_result==True)
+                return_result==True); if stream==True, the number of bytes
+                written to outfile instead
 
     """
-        # Set up kw args
-        fiID_type_type = self.get_type('ns0:FinancialInstitutionIDType')
-        fiID_type = fiID_type_type(fiID_type)
-
-        # Get results
-        facsimile = self.service.RetrieveUBPRXBRLFacsimile(reporting_pd_end,
-                                                           fiID_type, fiID)
+        fiID = self._fi_id(fiID)
+        if stream:
+            return self.__stream('RetrieveUBPRXBRLFacsimile',
+                                 (reporting_pd_end, fiID_type, fiID), outfile)
+
+        # Get results, from the cache if possible
+        facsimile = None
+        if self.facsimile_cache is not None:
+            key = self.facsimile_cache.key('RetrieveUBPRXBRLFacsimile',
+                                           reporting_pd_end, fiID_type, fiID)
+            facsimile = self.facsimile_cache.get(key)
+        if facsimile is None:
+            with self._call('RetrieveUBPRXBRLFacsimile'):
+                facsimile = fast.call(self, 'RetrieveUBPRXBRLFacsimile',
+                                      (reporting_pd_end, fiID_type, fiID),
+                                      fast.parse_ubpr_xbrl_facsimile_result)
+            if self.facsimile_cache is not None and facsimile is not None:
+                self.facsimile_cache.add(key, facsimile, reporting_pd_end)
 
         # Write file
         if outfile:
-            with open(outfile, 'w') as f:
-                f.write(facsimile)
+            self.__write(facsimile, outfile, 'RetrieveUBPRXBRLFacsimile')
 
         # Return results
         if return_result:
             return facsimile
 
+    def retrieve_ubpr_xbrl_facsimiles(self, requests, outfile=None,
+                                      return_result=True, max_workers=4,
+                                      retries=2, stream=False):
+        """Retrieves many UBPR facsimiles concurrently from FFIEC site.
+
+        Args:
+            requests (iterable of tuples): (reporting_pd_end, fiID_type,
+                fiID) for each facsimile; see `retrieve_ubpr_xbrl_facsimile`
+            outfile (callable): takes a request tuple and returns the path to
+                write its facsimile to; no output, if None (default is None)
+            return_result (bool): If True, include the retrieved facsimiles
+                in the results (default is True)
+            max_workers (int): number of concurrent requests (default is 4)
+            retries (int): number of times a request is retried after a
+                fault or network error (default is 2)
+            stream (bool): If True, stream each facsimile to its outfile; see
+                `retrieve_facsimile` (default is False)
+
+        Returns:
+            results (generator of ffipy.bulk.BulkResults): one per request in
+                completion order, with the facsimile in `result` or the
+                failure in `error`
+
+        """
+        func = partial(self.retrieve_ubpr_xbrl_facsimile, stream=stream)
+        return bulk.run(func, requests, outfile=outfile,
+                        return_result=return_result, max_workers=max_workers,
+                        retries=retries,
+                        retried=self._retried('RetrieveUBPRXBRLFacsimile'))
+
     def test_user_access(self):
         """Tests whether or not user has access to FFIEC SOAP service
 
@@ -351,5 +751,6 @@ class FFIEC_Client(zeep.Client):
             result (bool): True if user has access, otherwise False
 
         """
-        result = self.service.TestUserAccess()
+        with self._call('TestUserAccess'):
+            result = self.service.TestUserAccess()
         return result
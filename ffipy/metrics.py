@@ -0,0 +1,268 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: per-operation latency, payload and error metrics for FFIEC_Client
+# Usage: FFIEC_Client(metrics=Metrics()) records its calls; read them with
+#   `Metrics.to_prometheus()` or pass `callback` to receive each observation
+# ------------------------------------------------------------------------------
+
+# PSL
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# 3rd party libs
+import zeep
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                   10, 30, 60, 120, 300)
+
+HELP = {
+    'ffipy_calls_total': 'Calls to the FFIEC site',
+    'ffipy_call_seconds': 'Seconds per call, from request to result',
+    'ffipy_faults_total': 'Calls that raised a SOAP fault',
+    'ffipy_errors_total': 'Calls that raised another error',
+    'ffipy_retries_total': 'Retries made by bulk retrievals',
+    'ffipy_soap_seconds': 'Seconds from the request envelope being built to '
+                          'the response envelope being parsed',
+    'ffipy_http_seconds': 'Seconds from sending a request to its response '
+                          'headers',
+    'ffipy_request_bytes_total': 'Bytes of request bodies sent',
+    'ffipy_response_bytes_total': 'Bytes of response bodies read, after '
+                                  'decompression',
+    'ffipy_wsdl_load_seconds': 'Seconds to load and parse the WSDL',
+    'ffipy_get_type_seconds': 'Seconds to look up a WSDL type',
+    'ffipy_write_seconds': 'Seconds to write a facsimile to its outfile',
+    'ffipy_write_bytes_total': 'Bytes of facsimiles written to outfiles',
+}
+
+
+def _labels(labels):
+    """Returns the hashable key of a dict of labels, without None values."""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()
+                        if v is not None))
+
+
+def _format_labels(key, extra=()):
+    pairs = key + tuple(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (k, v.replace('\\', r'\\').replace('"', r'\"')
+                     .replace('\n', r'\n'))
+        for k, v in pairs)
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics(object):
+    """ A thread-safe registry of counters and latency histograms.
+
+    Each metric is a name plus labels (e.g. operation and ds_name); labels
+    that are None are left out. Recording is a dict update under a lock, and
+    an FFIEC_Client without metrics records nothing at all.
+
+    Args:
+        buckets (tuple of floats): upper bounds of the histogram buckets
+            (default is DEFAULT_BUCKETS)
+        callback (callable): called as callback(name, value, labels) for
+            every counter increment and histogram observation, e.g. to
+            forward them to statsd (default is None)
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, callback=None):
+        self.buckets = tuple(sorted(buckets))
+        self.callback = callback
+        self.__lock = threading.Lock()
+        self.__counters = {}
+        self.__histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Adds `value` to a counter."""
+        key = (name, _labels(labels))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+        if self.callback is not None:
+            self.callback(name, value, labels)
+
+    def observe(self, name, value, **labels):
+        """Adds an observation (e.g. seconds) to a histogram."""
+        key = (name, _labels(labels))
+        i = bisect_left(self.buckets, value)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+        if self.callback is not None:
+            self.callback(name, value, labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observes the seconds taken by the block in histogram `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def track(self, operation, ds_name=None):
+        """Records a call to the FFIEC site made within the block.
+
+        Counts the call and its fault or error, and observes its latency.
+
+        Args:
+            operation (str): name of the SOAP operation
+            ds_name (str): DataSeriesName of the call, if it has one
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except zeep.exceptions.Fault:
+            self.inc('ffipy_faults_total', operation=operation,
+                     ds_name=ds_name)
+            raise
+        except Exception:
+            self.inc('ffipy_errors_total', operation=operation,
+                     ds_name=ds_name)
+            raise
+        finally:
+            self.inc('ffipy_calls_total', operation=operation,
+                     ds_name=ds_name)
+            self.observe('ffipy_call_seconds', time.perf_counter() - start,
+                         operation=operation, ds_name=ds_name)
+
+    def response_hook(self, response, *args, **kwargs):
+        """A requests response hook recording HTTP latency and payload bytes.
+
+        FFIEC_Client adds it to its transport's session, so it sees every
+        request, including the WSDL download and streamed facsimiles.
+        Response bytes are counted as the body is read, after gzip/deflate
+        decoding, as Content-Length is the compressed size and is missing
+        from chunked responses.
+        """
+        request = response.request
+        action = request.headers.get('SOAPAction')
+        operation = action.strip('"').rsplit('/', 1)[-1] if action else None
+        body = request.body
+        if body:
+            self.inc('ffipy_request_bytes_total', len(body),
+                     operation=operation)
+        iter_content = response.iter_content
+
+        # Both `content` and streamed reads go through iter_content
+        def counted(*args, **kwargs):
+            for chunk in iter_content(*args, **kwargs):
+                self.inc('ffipy_response_bytes_total', len(chunk),
+                         operation=operation)
+                yield chunk
+        response.iter_content = counted
+        self.observe('ffipy_http_seconds', response.elapsed.total_seconds(),
+                     operation=operation)
+
+    def counter(self, name, **labels):
+        """Returns the value of a counter (0 if it was never incremented)."""
+        with self.__lock:
+            return self.__counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name, **labels):
+        """Returns tuple (count, sum) of a histogram's observations."""
+        with self.__lock:
+            histogram = self.__histograms.get((name, _labels(labels)))
+            if histogram is None:
+                return 0, 0.0
+            return histogram[2], histogram[1]
+
+    def clear(self):
+        """Resets all metrics."""
+        with self.__lock:
+            self.__counters.clear()
+            self.__histograms.clear()
+
+    def to_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self.__lock:
+            counters = sorted(self.__counters.items())
+            histograms = sorted((key, (list(counts), total, count))
+                                for key, (counts, total, count)
+                                in self.__histograms.items())
+        lines = []
+        last = None
+        for (name, key), value in counters:
+            if name != last:
+                lines.append('# HELP %s %s' % (name, HELP.get(name, name)))
+                lines.append('# TYPE %s counter' % name)
+                last = name
+            lines.append('%s%s %s' % (name, _format_labels(key),
+                                      _format_value(value)))
+        for (name, key), (counts, total, count) in histograms:
+            if name != last:
+                lines.append('# HELP %s %s' % (name, HELP.get(name, name)))
+                lines.append('# TYPE %s histogram' % name)
+                last = name
+            cumulative = 0
+            bounds = [repr(float(b)) for b in self.buckets] + ['+Inf']
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                lines.append('%s_bucket%s %d' % (
+                    name, _format_labels(key, [('le', bound)]), cumulative))
+            lines.append('%s_sum%s %s' % (name, _format_labels(key),
+                                          repr(total)))
+            lines.append('%s_count%s %d' % (name, _format_labels(key), count))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsPlugin(zeep.Plugin):
+    """ A zeep plugin observing the SOAP round trip of each operation.
+
+    The time from the request envelope being built (egress) to the response
+    envelope being parsed (ingress) covers serializing the request, the HTTP
+    round trip and parsing the response, but not deserializing the result.
+    Requests from the templates in `ffipy.template` skip egress, and
+    responses parsed by `ffipy.fast` or `ffipy.stream` skip ingress, so those
+    call `start` and `finish` instead; a fast-path round trip includes
+    parsing the result.
+
+    Args:
+        metrics (Metrics): registry to record in
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.__local = threading.local()
+
+    def start(self, operation):
+        """Starts timing the round trip of an operation on this thread."""
+        self.__local.started = (operation, time.perf_counter())
+
+    def finish(self, operation):
+        """Observes the round trip of an operation, if it was started."""
+        name, started = getattr(self.__local, 'started', (None, None))
+        if name == operation:
+            self.metrics.observe('ffipy_soap_seconds',
+                                 time.perf_counter() - started,
+                                 operation=name)
+            self.__local.started = (None, None)
+
+    def egress(self, envelope, http_headers, operation, binding_options):
+        self.start(operation.name)
+        return envelope, http_headers
+
+    def ingress(self, envelope, http_headers, operation):
+        self.finish(operation.name)
+        return envelope, http_headers
+
+
+def metrics_plugins(client):
+    """Returns the MetricsPlugins of a zeep client."""
+    return [plugin for plugin in getattr(client, 'plugins', None) or ()
+            if isinstance(plugin, MetricsPlugin)]
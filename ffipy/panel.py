@@ -0,0 +1,253 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: a compact, indexed table of the Panel of Reporters
+# Usage: FFIEC_Client.retrieve_reporter_panel returns a ReporterPanel, which
+#   stores the panel in columns and looks up institutions by identifier,
+#   State or FilingType with hash indexes
+# ------------------------------------------------------------------------------
+
+# PSL
+import sys
+from array import array
+
+# Integer identifier fields, stored in array columns and indexed
+ID_FIELDS = ('ID_RSSD', 'FDICCertNumber', 'OCCChartNumber', 'OTSDockNumber',
+             'PrimaryABARoutNumber')
+
+# Identifier fields that belong to one institution of a panel, indexed to a
+# single row; the others, e.g. the PrimaryABARoutNumber of affiliated banks,
+# may be shared and are indexed to lists of rows
+UNIQUE_FIELDS = ('ID_RSSD', 'FDICCertNumber')
+
+# String fields, stored as lists of interned strs
+STR_FIELDS = ('Name', 'State', 'City', 'Address', 'ZIP', 'FilingType')
+
+# Fields with few distinct values, indexed to lists of rows
+GROUP_FIELDS = ('State', 'FilingType')
+
+FIELDS = ID_FIELDS + STR_FIELDS + ('HasFiledForReportingPeriod',)
+
+
+class ReporterPanel(object):
+    """ The Panel of Reporters for one data series and reporting period.
+
+    Fields are stored column-wise: identifiers in `array('q')` columns,
+    strings in lists of interned strs and HasFiledForReportingPeriod in an
+    `array('b')`. Identifier lookups and State/FilingType filters use hash
+    indexes, so they take O(1) time instead of a scan of the panel. Only the
+    UNIQUE_FIELDS identify one institution; a value of another identifier
+    may be shared by several (see `lookup_all`).
+
+    Args:
+        reporters (iterable): institutions as returned by
+            `FFIEC_Client.retrieve_panel_of_reporters` (zeep objects or dicts)
+        ds_name (str): DataSeriesName of the panel (default is 'Call')
+        reporting_pd_end (str): Date for end of the reporting period of the
+            panel (default is None)
+
+    Attributes:
+        columns (dict): maps field name to its column
+        ds_name (str): DataSeriesName of the panel
+        reporting_pd_end (str): Date for end of the reporting period
+    """
+
+    def __init__(self, reporters=(), ds_name='Call', reporting_pd_end=None):
+        self.ds_name = ds_name
+        self.reporting_pd_end = reporting_pd_end
+        self.columns = {field: array('q') for field in ID_FIELDS}
+        self.columns.update((field, []) for field in STR_FIELDS)
+        self.columns['HasFiledForReportingPeriod'] = array('b')
+        for reporter in reporters:
+            self.__append(reporter)
+        self.__indexes = {}
+
+    def __append(self, reporter):
+        for field in ID_FIELDS:
+            self.columns[field].append(reporter[field] or 0)
+        for field in STR_FIELDS:
+            value = reporter[field]
+            value = sys.intern(value.strip()) if value else None
+            self.columns[field].append(value)
+        self.columns['HasFiledForReportingPeriod'].append(
+            bool(reporter['HasFiledForReportingPeriod']))
+
+    def __len__(self):
+        return len(self.columns['ID_RSSD'])
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def __getstate__(self):
+        # Indexes are rebuilt on demand rather than pickled
+        state = self.__dict__.copy()
+        state['_ReporterPanel__indexes'] = {}
+        return state
+
+    def row(self, i):
+        """Returns row `i` as a dict with the fields of an institution."""
+        return {field: self.columns[field][i] for field in FIELDS}
+
+    def index(self, field):
+        """Returns the hash index of a field, building it on first use.
+
+        Args:
+            field (str): one of UNIQUE_FIELDS, mapping each nonzero value to
+                its row, of the other ID_FIELDS, mapping each nonzero value
+                to an array of rows, or of GROUP_FIELDS, mapping each value
+                to an array of rows
+
+        Raises:
+            ValueError: if the field cannot be indexed, or a value of one of
+                the UNIQUE_FIELDS is in more than one row
+
+        """
+        if field not in self.__indexes:
+            column = self.columns[field]
+            index = {}
+            if field in UNIQUE_FIELDS:
+                for i, value in enumerate(column):
+                    if value and index.setdefault(value, i) != i:
+                        raise ValueError('Duplicate %s %d in the panel'
+                                         % (field, value))
+            elif field in ID_FIELDS or field in GROUP_FIELDS:
+                for i, value in enumerate(column):
+                    if value or field in GROUP_FIELDS:
+                        index.setdefault(value, array('l')).append(i)
+            else:
+                raise ValueError('Cannot index field %r' % field)
+            self.__indexes[field] = index
+        return self.__indexes[field]
+
+    def __find(self, field, value):
+        """Returns the row whose identifier `field` equals `value`, or None.
+
+        Raises:
+            ValueError: if several institutions share the identifier
+        """
+        rows = self.index(field).get(value)
+        if rows is None or field in UNIQUE_FIELDS:
+            return rows
+        if len(rows) > 1:
+            raise ValueError('%d institutions have %s %d; use lookup_all'
+                             % (len(rows), field, value))
+        return rows[0]
+
+    def lookup(self, field, value):
+        """Returns the institution whose identifier `field` equals `value`.
+
+        Args:
+            field (str): one of ID_FIELDS, e.g. 'FDICCertNumber'
+            value (int): the identifier
+
+        Returns:
+            row (dict): the institution, or None if it is not in the panel
+
+        Raises:
+            ValueError: if several institutions share the identifier
+
+        """
+        i = self.__find(field, value)
+        return self.row(i) if i is not None else None
+
+    def lookup_all(self, field, value):
+        """Returns all institutions whose identifier `field` equals `value`.
+
+        Args:
+            field (str): one of ID_FIELDS, e.g. 'PrimaryABARoutNumber'
+            value (int): the identifier
+
+        Returns:
+            rows (list of dicts): the institutions, in panel order
+
+        """
+        rows = self.index(field).get(value)
+        if rows is None:
+            return []
+        if field in UNIQUE_FIELDS:
+            rows = (rows,)
+        return [self.row(i) for i in rows]
+
+    def __contains__(self, id_rssd):
+        return id_rssd in self.index('ID_RSSD')
+
+    def __getitem__(self, id_rssd):
+        i = self.index('ID_RSSD').get(id_rssd)
+        if i is None:
+            raise KeyError(id_rssd)
+        return self.row(i)
+
+    def id_rssd(self, fiID_type, fiID):
+        """Resolves an identifier of any type to the ID RSSD.
+
+        Args:
+            fiID_type (str): one of ID_FIELDS
+            fiID (int): the identifier
+
+        Returns:
+            id_rssd (int): the ID RSSD, or None if it is not in the panel
+
+        Raises:
+            ValueError: if several institutions share the identifier
+
+        """
+        i = self.__find(fiID_type, fiID)
+        return self.columns['ID_RSSD'][i] if i is not None else None
+
+    def take(self, rows):
+        """Returns a new ReporterPanel of the given rows."""
+        panel = ReporterPanel(ds_name=self.ds_name,
+                              reporting_pd_end=self.reporting_pd_end)
+        for field, column in self.columns.items():
+            if isinstance(column, array):
+                panel.columns[field] = array(column.typecode,
+                                             (column[i] for i in rows))
+            else:
+                panel.columns[field] = [column[i] for i in rows]
+        return panel
+
+    def filter(self, state=None, filing_type=None, has_filed=None):
+        """Returns the institutions matching all of the given criteria.
+
+        Args:
+            state (str or iterable of strs): State(s) to keep
+            filing_type (str or iterable of strs): FilingType(s) to keep
+            has_filed (bool): keep institutions that have (True) or have not
+                (False) filed for the reporting period
+
+        Returns:
+            panel (ReporterPanel): the matching institutions, in panel order
+
+        """
+        rows = None
+        for field, wanted in (('State', state), ('FilingType', filing_type)):
+            if wanted is None:
+                continue
+            if isinstance(wanted, str):
+                wanted = (wanted,)
+            index = self.index(field)
+            matched = set()
+            for value in wanted:
+                matched.update(index.get(value, ()))
+            rows = matched if rows is None else rows & matched
+        if rows is None:
+            rows = range(len(self))
+        if has_filed is not None:
+            filed = self.columns['HasFiledForReportingPeriod']
+            rows = (i for i in rows if bool(filed[i]) == has_filed)
+        return self.take(sorted(rows))
+
+    def facsimile_requests(self, facsimile_fmt='PDF'):
+        """Yields request tuples for `FFIEC_Client.retrieve_facsimiles`.
+
+        Args:
+            facsimile_fmt (str): Format of facsimiles to retrieve (default is
+                'PDF')
+
+        Returns:
+            requests (generator of tuples): (ds_name, reporting_pd_end,
+                'ID_RSSD', ID RSSD, facsimile_fmt) for each institution
+
+        """
+        for id_rssd in self.columns['ID_RSSD']:
+            yield (self.ds_name, self.reporting_pd_end, 'ID_RSSD', id_rssd,
+                   facsimile_fmt)
@@ -0,0 +1,347 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: parse SDF and XBRL facsimiles into a columnar panel
+# Usage: parse_facsimiles(facsimiles, items=['RCON2170']) returns a
+#   FacsimilePanel with one row per (ID RSSD, reporting period) and one column
+#   per MDRM item / XBRL concept
+# Docs: python -c "import ffipy.parse; help('ffipy.parse')"
+# ------------------------------------------------------------------------------
+
+# PSL
+import io
+import sys
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+# 3rd party libs
+from lxml import etree
+
+XBRLI_NS = 'http://www.xbrl.org/2003/instance'
+XSI_NIL = '{http://www.w3.org/2001/XMLSchema-instance}nil'
+
+NAN = float('nan')
+
+Filing = namedtuple('Filing', ['id_rssd', 'period', 'values'])
+Filing.__doc__ = """Items parsed from one facsimile.
+
+    Attributes:
+        id_rssd (int): ID RSSD of the filer
+        period (str): end of the reporting period, e.g. '3/31/2017'
+        values (dict): maps interned item/concept name to its value, a float
+            if numeric, otherwise a str
+"""
+
+
+def format_period(value):
+    """Returns a date as the 'm/d/YYYY' string used by the FFIEC methods.
+
+    Accepts 'YYYYMMDD', 'YYYY-MM-DD' and 'm/d/YYYY' strings.
+    """
+    value = value.strip().strip('"')
+    for fmt in ('%Y%m%d', '%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            date = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return '%d/%d/%d' % (date.month, date.day, date.year)
+    raise ValueError('Unrecognized reporting period: %r' % value)
+
+
+def _value(text):
+    """Returns text as a float if numeric, None if empty, else stripped str."""
+    text = text.strip().strip('"')
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _lines(facsimile):
+    """Yields the decoded lines of an SDF facsimile (bytes, str or file)."""
+    if isinstance(facsimile, bytes):
+        facsimile = io.BytesIO(facsimile)
+    elif isinstance(facsimile, str):
+        facsimile = io.StringIO(facsimile)
+    for line in facsimile:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        yield line.rstrip('\r\n')
+
+
+def parse_sdf(facsimile, items=None):
+    """Parses a facsimile in SDF (semicolon delimited) format.
+
+    Args:
+        facsimile (bytes, str or file-like): the facsimile, with a header line
+            naming the 'Call Date', 'Bank RSSD Identifier', 'MDRM #' and
+            'Value' columns
+        items (set of strs): MDRM items to keep; all items, if None (default
+            is None)
+
+    Returns:
+        filing (Filing): the items of the facsimile
+
+    """
+    lines = _lines(facsimile)
+    header = [h.strip().strip('"').lower() for h in next(lines).split(';')]
+
+    def column(name, default):
+        return header.index(name) if name in header else default
+    i_date = column('call date', 0)
+    i_rssd = column('bank rssd identifier', 1)
+    i_item = column('mdrm #', 2)
+    i_value = column('value', 3)
+    width = max(i_date, i_rssd, i_item, i_value) + 1
+
+    id_rssd = period = None
+    values = {}
+    for line in lines:
+        fields = line.split(';', width)
+        if len(fields) < width:
+            continue
+        # The identifiers are read whatever the items, so a filing with none
+        # of them is still told apart
+        if id_rssd is None:
+            id_rssd = int(fields[i_rssd].strip().strip('"'))
+            period = format_period(fields[i_date])
+        item = fields[i_item].strip().strip('"')
+        if items is not None and item not in items:
+            continue
+        values[sys.intern(item)] = _value(fields[i_value])
+    return Filing(id_rssd, period, values)
+
+
+def parse_xbrl(facsimile, items=None):
+    """Parses a facsimile in XBRL format.
+
+    The document is parsed incrementally and elements are discarded once
+    read, so only the selected facts are kept in memory.
+
+    Args:
+        facsimile (bytes or file-like): the XBRL instance document
+        items (set of strs): local names of the concepts to keep (e.g.
+            'RCON2170'); all concepts, if None (default is None)
+
+    Returns:
+        filing (Filing): the facts of the facsimile; the ID RSSD and period
+            are taken from the context of the first fact, whether or not it
+            is in `items` (or from the first context, if there are no facts),
+            and only facts of contexts with the same entity and period are
+            kept
+
+    """
+    if isinstance(facsimile, bytes):
+        facsimile = io.BytesIO(facsimile)
+    contexts = {}
+    facts = []
+    first_ref = None
+    context_tag = '{%s}context' % XBRLI_NS
+    for event, elem in etree.iterparse(facsimile, events=('end',),
+                                       resolve_entities=False,
+                                       huge_tree=True):
+        tag = elem.tag
+        if not isinstance(tag, str):
+            continue
+        if tag == context_tag:
+            identifier = elem.findtext('.//{%s}identifier' % XBRLI_NS)
+            instant = (elem.findtext('.//{%s}instant' % XBRLI_NS)
+                       or elem.findtext('.//{%s}endDate' % XBRLI_NS))
+            contexts[elem.get('id')] = (identifier, instant)
+        elif elem.get('contextRef') is not None:
+            if first_ref is None:
+                first_ref = elem.get('contextRef')
+            name = tag.rpartition('}')[2]
+            if items is None or name in items:
+                if elem.get(XSI_NIL) == 'true':
+                    value = None
+                else:
+                    value = _value(elem.text or '')
+                facts.append((elem.get('contextRef'), sys.intern(name),
+                              value))
+        else:
+            continue
+        # Discard what has been read
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+    id_rssd = period = None
+    if first_ref not in contexts and contexts:
+        first_ref = next(iter(contexts))
+    if first_ref not in contexts:
+        return Filing(id_rssd, period, {name: value
+                                        for _, name, value in facts})
+    identifier, instant = own = contexts[first_ref]
+    id_rssd = int(identifier.strip()) if identifier else None
+    period = format_period(instant) if instant else None
+    # Facts of other entities or periods (e.g. the prior periods of a UBPR)
+    # would overwrite the filing's own values
+    return Filing(id_rssd, period, {name: value
+                                    for ref, name, value in facts
+                                    if contexts.get(ref) == own})
+
+
+def parse_facsimile(facsimile, items=None):
+    """Parses an SDF or XBRL facsimile, detecting its format.
+
+    See `parse_sdf` and `parse_xbrl`.
+    """
+    if isinstance(facsimile, bytes):
+        is_xbrl = facsimile.lstrip(b'\xef\xbb\xbf \t\r\n')[:1] == b'<'
+    elif isinstance(facsimile, str):
+        is_xbrl = facsimile.lstrip('\ufeff \t\r\n')[:1] == '<'
+        if is_xbrl:
+            facsimile = facsimile.encode('utf-8')
+    else:
+        raise TypeError('facsimile must be bytes or str, not %s'
+                        % type(facsimile).__name__)
+    if is_xbrl:
+        return parse_xbrl(facsimile, items)
+    return parse_sdf(facsimile, items)
+
+
+class FacsimilePanel(object):
+    """ A columnar panel of items parsed from many facsimiles.
+
+    Rows are (ID RSSD, period) pairs; columns are item/concept names. Numeric
+    columns are `array('d')` with NaN for missing values, so they can be
+    wrapped without copying by numpy (`numpy.frombuffer`); columns holding any
+    non-numeric value are lists with None for missing values.
+
+    Attributes:
+        id_rssd (array of ints): ID RSSD of each row
+        period (list of strs): reporting period of each row
+        columns (dict): maps interned item name to its column
+    """
+
+    def __init__(self, id_rssd, period, columns):
+        self.id_rssd = id_rssd
+        self.period = period
+        self.columns = columns
+        self.__rows = None
+
+    def __len__(self):
+        return len(self.id_rssd)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def items(self):
+        """Returns the sorted item names of the panel"""
+        return sorted(self.columns)
+
+    def row_index(self, id_rssd, period):
+        """Returns the row number of (id_rssd, period).
+
+        Raises:
+            KeyError: if the panel has no such row
+        """
+        if self.__rows is None:
+            self.__rows = {key: i for i, key in
+                           enumerate(zip(self.id_rssd, self.period))}
+        return self.__rows[(id_rssd, period)]
+
+    def row(self, id_rssd, period):
+        """Returns dict of item name to value for one row, without missing."""
+        i = self.row_index(id_rssd, period)
+        row = {}
+        for name, column in self.columns.items():
+            value = column[i]
+            if value is not None and value == value:  # Not NaN
+                row[name] = value
+        return row
+
+    def to_numpy(self, names=None):
+        """Returns a 2D numpy float array of the numeric columns `names`.
+
+        Args:
+            names (list of strs): numeric columns to include; all numeric
+                columns in sorted order, if None (default is None)
+        """
+        import numpy
+        if names is None:
+            names = [name for name in self.items
+                     if isinstance(self.columns[name], array)]
+        if not names:
+            return numpy.empty((len(self), 0))
+        return numpy.column_stack([numpy.frombuffer(self.columns[name])
+                                   for name in names])
+
+    def to_pandas(self):
+        """Returns the panel as a pandas DataFrame indexed by (ID_RSSD, period)
+        """
+        import pandas
+        index = pandas.MultiIndex.from_arrays(
+            [list(self.id_rssd), self.period], names=['ID_RSSD', 'period'])
+        return pandas.DataFrame({name: self.columns[name]
+                                 for name in self.items}, index=index)
+
+
+def build_panel(filings):
+    """Builds a FacsimilePanel from parsed filings.
+
+    Args:
+        filings (iterable of Filings): e.g. from `parse_facsimile`; a later
+            filing for the same (ID RSSD, period) replaces an earlier one
+
+    Returns:
+        panel (FacsimilePanel)
+
+    """
+    rows = {}
+    for filing in filings:
+        rows[(filing.id_rssd, filing.period)] = filing.values
+    n = len(rows)
+
+    # Collect the row numbers and values of each item
+    cells = {}
+    for i, values in enumerate(rows.values()):
+        for name, value in values.items():
+            if value is not None:
+                cells.setdefault(name, ([], []))
+                cells[name][0].append(i)
+                cells[name][1].append(value)
+
+    columns = {}
+    for name, (index, values) in cells.items():
+        if all(isinstance(value, float) for value in values):
+            column = array('d', [NAN]) * n
+        else:
+            column = [None] * n
+        for i, value in zip(index, values):
+            column[i] = value
+        columns[name] = column
+
+    id_rssd = array('q', [key[0] if key[0] is not None else -1
+                          for key in rows])
+    period = [key[1] for key in rows]
+    return FacsimilePanel(id_rssd, period, columns)
+
+
+def parse_facsimiles(facsimiles, items=None):
+    """Parses many SDF/XBRL facsimiles into a FacsimilePanel.
+
+    Args:
+        facsimiles (iterable of bytes): facsimiles for any institutions and
+            periods, e.g. the results of `FFIEC_Client.retrieve_facsimiles`
+        items (iterable of strs): items/concepts to keep; all, if None
+            (default is None)
+
+    Returns:
+        panel (FacsimilePanel): one row per (ID RSSD, period), one column per
+            item
+
+    """
+    if items is not None:
+        items = frozenset(items)
+    return build_panel(parse_facsimile(facsimile, items)
+                       for facsimile in facsimiles)
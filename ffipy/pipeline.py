@@ -0,0 +1,260 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: download and parse facsimiles at the same time
+# Usage: Pipeline(client).run(requests) fetches facsimiles on threads into
+#   temporary files and parses them on a process pool, yielding each parsed
+#   filing as it is ready; `Pipeline.stats` has the throughput of each stage
+# ------------------------------------------------------------------------------
+
+# PSL
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# ffipy
+from . import bulk
+from .parse import build_panel, parse_facsimile
+
+PipelineResult = namedtuple('PipelineResult', ['request', 'filing', 'error'])
+PipelineResult.__doc__ = """Outcome of one request in a Pipeline.
+
+    Attributes:
+        request (tuple): the request as it was given
+        filing (ffipy.parse.Filing): the parsed facsimile (None on error)
+        error (Exception): the error raised fetching or parsing the
+            facsimile; None if it succeeded
+"""
+
+
+class StageStats(object):
+    """ Throughput counters of one pipeline stage.
+
+    Attributes:
+        items (int): items the stage finished
+        failures (int): items (or fetch attempts) the stage failed
+        bytes (int): bytes of facsimiles handled
+        busy (float): seconds spent on items, summed over workers
+        started (float): `time.perf_counter()` when the stage started
+        finished (float): `time.perf_counter()` when the stage finished, or
+            None while running
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.failures = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+        self.__lock = threading.Lock()
+
+    def add(self, seconds, nbytes=0, failed=False):
+        """Records one item that took `seconds` to handle."""
+        with self.__lock:
+            if failed:
+                self.failures += 1
+            else:
+                self.items += 1
+            self.bytes += nbytes
+            self.busy += seconds
+
+    @property
+    def elapsed(self):
+        """Returns seconds from the start of the stage to its end (or now)."""
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else \
+            time.perf_counter()
+        return end - self.started
+
+    @property
+    def throughput(self):
+        """Returns items finished per second of elapsed time."""
+        elapsed = self.elapsed
+        return self.items / elapsed if elapsed else 0.0
+
+    def __repr__(self):
+        return ('StageStats(items=%d, failures=%d, bytes=%d, busy=%.3f, '
+                'elapsed=%.3f, throughput=%.1f/s)'
+                % (self.items, self.failures, self.bytes, self.busy,
+                   self.elapsed, self.throughput))
+
+
+def parse_file(path, items=None):
+    """Parses and removes a facsimile file; runs in the parse workers.
+
+    Returns:
+        result (tuple): (filing, seconds taken, bytes of the facsimile)
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            facsimile = f.read()
+    finally:
+        os.remove(path)
+    if facsimile.startswith(b'%PDF'):
+        raise ValueError('Cannot parse a PDF facsimile')
+    filing = parse_facsimile(facsimile, items)
+    return filing, time.perf_counter() - start, len(facsimile)
+
+
+class Pipeline(object):
+    """ Fetches facsimiles on threads while parsing them on processes.
+
+    Requests are fetched by `fetch_workers` threads with
+    `FFIEC_Client.retrieve_facsimiles` (or retrieve_ubpr_xbrl_facsimiles),
+    which stream each facsimile into a temporary file. The file's path, not
+    its content, is passed to one of `parse_workers` spawned processes,
+    which parses and deletes it. At most `queue_size` facsimiles wait for or are being
+    parsed; while the parsers are behind, fetching pauses, so neither memory
+    nor disk grows without bound.
+
+    Args:
+        client (FFIEC_Client): client to fetch with
+        fetch_workers (int): threads fetching facsimiles (default is 4)
+        parse_workers (int): processes parsing facsimiles (default is the
+            number of CPUs)
+        queue_size (int): facsimiles fetched but not yet parsed (default is
+            2 * parse_workers)
+        items (iterable of strs): items/concepts to keep; all, if None
+            (default is None)
+        retries (int): number of times a fetch is retried (default is 2)
+        tmpdir (str): directory for the temporary files (default is a new
+            directory in the system's temporary directory)
+        ubpr (bool): If True, requests are for
+            `retrieve_ubpr_xbrl_facsimile` (reporting_pd_end, fiID_type,
+            fiID) instead of `retrieve_facsimile` (default is False)
+
+    Attributes:
+        stats (dict): maps stage name ('fetch', 'parse') to its StageStats
+            for the last run
+    """
+
+    def __init__(self, client, fetch_workers=4, parse_workers=None,
+                 queue_size=None, items=None, retries=2, tmpdir=None,
+                 ubpr=False):
+        self.client = client
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.queue_size = queue_size or 2 * self.parse_workers
+        self.items = frozenset(items) if items is not None else None
+        self.retries = retries
+        self.tmpdir = tmpdir
+        self.ubpr = ubpr
+        self.stats = {}
+
+    def __fetch(self, stats):
+        """Returns the fetch function for bulk.run, timing each fetch."""
+        retrieve = (self.client.retrieve_ubpr_xbrl_facsimile if self.ubpr
+                    else self.client.retrieve_facsimile)
+
+        def fetch(*request, outfile=None, return_result=False):
+            start = time.perf_counter()
+            try:
+                size = retrieve(*request, outfile=outfile, stream=True)
+            except Exception:
+                stats.add(time.perf_counter() - start, failed=True)
+                raise
+            stats.add(time.perf_counter() - start, size)
+            return outfile
+        return fetch
+
+    def run(self, requests):
+        """Fetches and parses facsimiles, yielding them as they are parsed.
+
+        Args:
+            requests (iterable of tuples): (ds_name, reporting_pd_end,
+                fiID_type, fiID, facsimile_fmt) for each facsimile, with SDF
+                or XBRL formats; (reporting_pd_end, fiID_type, fiID) if
+                `ubpr` is True
+
+        Returns:
+            results (generator of PipelineResults): one per request, in
+                completion order
+
+        """
+        fetch_stats = StageStats()
+        parse_stats = StageStats()
+        self.stats = {'fetch': fetch_stats, 'parse': parse_stats}
+        tmpdir = tempfile.mkdtemp(prefix='ffipy-', dir=self.tmpdir)
+        # Each request gets its own file, even if it is repeated
+        counter = itertools.count()
+
+        def outfile(request):
+            return os.path.join(tmpdir, '%d.facsimile' % next(counter))
+
+        def parsed(future, request):
+            try:
+                filing, seconds, size = future.result()
+            except Exception as err:
+                parse_stats.add(0.0, failed=True)
+                return PipelineResult(request, None, err)
+            parse_stats.add(seconds, size)
+            return PipelineResult(request, filing, None)
+
+        try:
+            # Workers are spawned, as forking copies the locks of the fetch
+            # threads (and the client's sessions) in whatever state they are
+            with ProcessPoolExecutor(
+                    self.parse_workers,
+                    mp_context=multiprocessing.get_context('spawn')) as pool:
+                fetch_stats.started = parse_stats.started = \
+                    time.perf_counter()
+                fetched = bulk.run(self.__fetch(fetch_stats), requests,
+                                   outfile=outfile, return_result=False,
+                                   max_workers=self.fetch_workers,
+                                   retries=self.retries)
+                pending = {}
+                try:
+                    for result in fetched:
+                        if result.error is not None:
+                            yield PipelineResult(result.request, None,
+                                                 result.error)
+                            continue
+                        # Backpressure: wait for the parsers before fetching
+                        # more
+                        while len(pending) >= self.queue_size:
+                            done, _ = wait(pending,
+                                           return_when=FIRST_COMPLETED)
+                            for future in done:
+                                yield parsed(future, pending.pop(future))
+                        future = pool.submit(parse_file, result.result,
+                                             self.items)
+                        pending[future] = result.request
+                finally:
+                    fetched.close()
+                fetch_stats.finished = time.perf_counter()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield parsed(future, pending.pop(future))
+                parse_stats.finished = time.perf_counter()
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def panel(self, requests):
+        """Fetches and parses facsimiles into a FacsimilePanel.
+
+        Args:
+            requests (iterable of tuples): see `run`
+
+        Returns:
+            panel (ffipy.parse.FacsimilePanel): the parsed facsimiles
+            errors (list of PipelineResults): the requests that failed
+
+        """
+        errors = []
+
+        def filings():
+            for result in self.run(requests):
+                if result.error is not None:
+                    errors.append(result)
+                else:
+                    yield result.filing
+        return build_panel(filings()), errors
@@ -0,0 +1,141 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: ship FFIEC_Client to worker processes without downloading the WSDL
+#   or prompting for a login
+# Usage: pickle.dumps(client) stores a ClientSnapshot, which is restored as a
+#   non-interactive client; for process pools, pass `init_worker` and the
+#   client as initializer and initargs, and call `worker_client()` in tasks
+# ------------------------------------------------------------------------------
+
+# PSL
+from collections import namedtuple
+from contextlib import contextmanager
+
+# 3rd party libs
+from zeep.cache import Base
+
+# ffipy
+from .metrics import MetricsPlugin
+
+ClientSnapshot = namedtuple('ClientSnapshot', ['cls', 'documents', 'wsse',
+                                               'transport', 'binding',
+                                               'address', 'options'])
+ClientSnapshot.__doc__ = """The picklable state of an FFIEC_Client.
+
+    zeep builds the parsed WSDL from dynamically created classes, which
+    cannot be pickled, so the snapshot holds the WSDL/XSD documents instead,
+    and `restore` parses them from memory.
+
+    Attributes:
+        cls (type): FFIEC_Client or a subclass
+        documents (dict): maps URL to the content of each WSDL/XSD document
+        wsse (UsernameToken): the login
+        transport (zeep.Transport): the transport (see
+            `PooledTransport.__getstate__`)
+        binding (str): qualified name of the bound service's binding
+        address (str): address of the bound service
+        options (dict): other keyword args of FFIEC_Client
+"""
+
+_client = None
+
+
+class DocumentCache(Base):
+    """ A zeep cache of documents in a dict, in front of another cache.
+
+    Documents found in the other cache or downloaded are added to the dict.
+
+    Args:
+        documents (dict): maps URL to content
+        cache (zeep.cache.Base): cache for other URLs (default is None)
+    """
+
+    def __init__(self, documents, cache=None):
+        self.documents = documents
+        self.cache = cache
+
+    def add(self, url, content):
+        self.documents[url] = content
+        if self.cache is not None:
+            self.cache.add(url, content)
+
+    def get(self, url):
+        content = self.documents.get(url)
+        if content is None and self.cache is not None:
+            content = self.cache.get(url)
+            if content is not None:
+                self.documents[url] = content
+        return content
+
+
+@contextmanager
+def documents(transport, documents):
+    """Loads a transport's WSDL/XSD documents through a dict within the block.
+
+    Documents in the dict are not downloaded, and documents loaded are added
+    to it.
+    """
+    cache = transport.cache
+    transport.cache = DocumentCache(documents, cache)
+    try:
+        yield documents
+    finally:
+        transport.cache = cache
+
+
+def snapshot(client):
+    """Returns the ClientSnapshot of a client.
+
+    The client's scheduler and metrics are process-local and are left out.
+    """
+    service = client.service
+    options = dict(client.zeep_options, plugins=[
+        plugin for plugin in client.plugins
+        if not isinstance(plugin, MetricsPlugin)],
+        facsimile_cache=client.facsimile_cache, memo_ttls=client.memo_ttls)
+    return ClientSnapshot(type(client), client.wsdl_documents, client.wsse,
+                          client.transport, str(service._binding.name),
+                          service._binding_options['address'], options)
+
+
+def restore(snapshot):
+    """Returns a non-interactive client from a ClientSnapshot.
+
+    Nothing is downloaded and the login is not checked.
+    """
+    with documents(snapshot.transport, dict(snapshot.documents)):
+        client = snapshot.cls(wsse=snapshot.wsse,
+                              transport=snapshot.transport,
+                              store_login=False, check_login=False,
+                              interactive=False, **snapshot.options)
+    if client.service._binding_options['address'] != snapshot.address:
+        client._default_service = client.create_service(snapshot.binding,
+                                                         snapshot.address)
+    return client
+
+
+def init_worker(client):
+    """Process pool initializer making `client` the worker's client.
+
+    Pools that fork inherit the client as it is; pools that spawn unpickle
+    it from its snapshot once per worker.
+
+    Args:
+        client (FFIEC_Client or ClientSnapshot): the client to use
+    """
+    global _client
+    if isinstance(client, ClientSnapshot):
+        client = restore(client)
+    _client = client
+
+
+def worker_client():
+    """Returns the client set by `init_worker` in this process.
+
+    Raises:
+        RuntimeError: if `init_worker` has not run in this process
+    """
+    if _client is None:
+        raise RuntimeError('No client; start the pool with '
+                           'initializer=ffipy.snapshot.init_worker')
+    return _client
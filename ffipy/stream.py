@@ -0,0 +1,153 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: streaming of base64 facsimile responses straight to a file
+# Usage: FFIEC_Client.retrieve_facsimile(..., stream=True) posts the request
+#   with `post_streaming`, which feeds the HTTP response to an incremental
+#   parser and decodes the facsimile in chunks into the outfile, so memory use
+#   does not grow with the size of the facsimile
+# ------------------------------------------------------------------------------
+
+# PSL
+import base64
+import binascii
+
+# 3rd party libs
+from lxml import etree
+from zeep.exceptions import Fault, TransportError
+
+# ffipy
+from . import template
+from .metrics import metrics_plugins
+
+SOAP_ENV_NS = ('http://schemas.xmlsoap.org/soap/envelope/',
+               'http://www.w3.org/2003/05/soap-envelope')
+
+# Bytes read from the HTTP response per chunk
+CHUNK_SIZE = 64 * 1024
+
+
+class Base64Target(object):
+    """ An lxml parser target decoding the `<operation>Result` text to a sink.
+
+    Base64 text is decoded in multiples of four characters as it arrives, so
+    only a chunk of the payload is held in memory at a time. SOAP faults are
+    collected and raised as zeep.exceptions.Fault when parsing is done.
+
+    Args:
+        result_tag (str): local name of the element holding the payload
+        sink: file-like object with a `write` method
+    """
+
+    def __init__(self, result_tag, sink):
+        self.result_tag = result_tag
+        self.sink = sink
+        self.size = 0
+        self.found = False
+        self.__in_result = False
+        self.__in_fault = False
+        self.__faulted = False
+        self.__remainder = b''
+        self.__fault = {}
+        self.__text = []
+
+    def start(self, tag, attrib):
+        ns, _, name = tag.rpartition('}')
+        if name == self.result_tag:
+            self.__in_result = True
+            self.found = True
+        elif name == 'Fault' and ns.lstrip('{') in SOAP_ENV_NS:
+            self.__in_fault = self.__faulted = True
+        self.__text = []
+
+    def data(self, data):
+        if self.__in_result:
+            self.__write(data)
+        elif self.__in_fault:
+            self.__text.append(data)
+
+    def end(self, tag):
+        name = tag.rpartition('}')[2]
+        if self.__in_result and name == self.result_tag:
+            self.__in_result = False
+            self.__flush()
+        elif self.__in_fault:
+            if name == 'Fault':
+                self.__in_fault = False
+            else:
+                self.__fault[name] = ''.join(self.__text).strip()
+        self.__text = []
+
+    def close(self):
+        if self.__faulted:
+            raise Fault(self.__fault.get('faultstring', 'Unknown fault'),
+                        code=self.__fault.get('faultcode'))
+        return self.size
+
+    def __write(self, data):
+        chunk = self.__remainder + ''.join(data.split()).encode('ascii')
+        cut = len(chunk) - len(chunk) % 4
+        self.__remainder = chunk[cut:]
+        if cut:
+            try:
+                decoded = base64.b64decode(chunk[:cut], validate=True)
+            except binascii.Error as err:
+                raise TransportError('Invalid base64 in %s: %s'
+                                     % (self.result_tag, err))
+            self.sink.write(decoded)
+            self.size += len(decoded)
+
+    def __flush(self):
+        if self.__remainder:
+            raise TransportError('Truncated base64 in %s' % self.result_tag)
+
+
+def post_streaming(client, operation, args, sink, chunk_size=CHUNK_SIZE):
+    """Calls an operation returning base64Binary, decoding its result to sink.
+
+    The request comes from the operation's template in `ffipy.template`, or
+    from zeep if it has none, but the response is never held in memory as a
+    whole.
+
+    Args:
+        client (zeep.Client): client whose service, wsse and transport to use;
+            the transport must have a requests `session`
+        operation (str): name of the operation, e.g. 'RetrieveFacsimile'
+        args (tuple): positional args for the operation
+        sink: file-like object to write the decoded result to
+        chunk_size (int): bytes read from the response at a time (default is
+            CHUNK_SIZE)
+
+    Returns:
+        size (int): number of bytes written to sink
+
+    Raises:
+        zeep.exceptions.Fault: if the server returned a SOAP fault
+        zeep.exceptions.TransportError: if the response was not a SOAP
+            envelope holding the result
+
+    """
+    address, body, http_headers = template.request(client, operation, args)
+    transport = client.transport
+    response = transport.session.post(
+        address, data=body, headers=http_headers,
+        timeout=transport.operation_timeout, stream=True)
+
+    target = Base64Target(operation + 'Result', sink)
+    parser = etree.XMLParser(target=target, resolve_entities=False,
+                             no_network=True, huge_tree=True)
+    try:
+        with response:
+            for chunk in response.iter_content(chunk_size):
+                parser.feed(chunk)
+        size = parser.close()
+    except etree.XMLSyntaxError:
+        raise TransportError('Server returned HTTP status %d (invalid XML)'
+                             % response.status_code,
+                             status_code=response.status_code)
+    if not target.found:
+        raise TransportError('Server returned HTTP status %d (no %sResult)'
+                             % (response.status_code, operation),
+                             status_code=response.status_code)
+    for plugin in metrics_plugins(client):
+        plugin.finish(operation)
+    return size
@@ -0,0 +1,258 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: incremental download of facsimiles filed or amended since the last
+#   run
+# Usage: FilingSync(client, 'sync.db', outfile).sync('3/31/2017') downloads
+#   only the facsimiles with a submission datetime newer than the one recorded
+#   in the sqlite state store
+# ------------------------------------------------------------------------------
+
+# PSL
+import logging
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Formats of the DateTime field returned by RetrieveFilersSubmissionDateTime
+DATETIME_FORMATS = ('%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y %H:%M:%S',
+                    '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%m/%d/%Y')
+
+SyncReport = namedtuple('SyncReport', ['ds_name', 'reporting_pd_end', 'new',
+                                       'amended', 'failed'])
+SyncReport.__doc__ = """What changed in one run of FilingSync.sync.
+
+    Attributes:
+        ds_name (str): DataSeriesName that was synced
+        reporting_pd_end (str): Date for end of the reporting period
+        new (list of ints): ID RSSDs downloaded for the first time
+        amended (list of ints): ID RSSDs downloaded again after refiling
+        failed (dict): maps ID RSSD to the error of a failed download; these
+            are retried on the next run
+"""
+
+
+def parse_submission_datetime(value):
+    """Parses a submission DateTime from FFIEC into a datetime.
+
+    Raises:
+        ValueError: if `value` is None (the DateTime is nil) or not in one of
+            DATETIME_FORMATS
+    """
+    if isinstance(value, datetime):
+        return value
+    if value is None:
+        raise ValueError('Missing submission DateTime')
+    value = value.strip()
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError('Unrecognized submission DateTime: %r' % value)
+
+
+class SyncState(object):
+    """ The sqlite store of what has been downloaded by FilingSync.
+
+    Tables:
+        filings: last downloaded submission datetime per (ds_name, period,
+            ID_RSSD)
+        pending: filings found to be new or amended but not yet downloaded
+        periods: high-water mark of submission datetimes per (ds_name,
+            period)
+
+    Args:
+        path (str): path of the sqlite database
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        with self.connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS filings
+                (ds_name text, period text, id_rssd integer,
+                 submitted timestamp,
+                 PRIMARY KEY (ds_name, period, id_rssd));
+                CREATE TABLE IF NOT EXISTS pending
+                (ds_name text, period text, id_rssd integer,
+                 submitted timestamp,
+                 PRIMARY KEY (ds_name, period, id_rssd));
+                CREATE TABLE IF NOT EXISTS periods
+                (ds_name text, period text, high_water timestamp,
+                 PRIMARY KEY (ds_name, period));
+            """)
+
+    @contextmanager
+    def connection(self):
+        """Yields a connection, committing on success."""
+        with self._lock:
+            conn = sqlite3.connect(self.path,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def high_water(self, ds_name, period):
+        """Returns the latest submission datetime seen for a period, or None."""
+        with self.connection() as conn:
+            row = conn.execute(
+                'SELECT high_water FROM periods WHERE ds_name=? AND period=?',
+                (ds_name, period)).fetchone()
+        return row[0] if row else None
+
+    def submitted(self, ds_name, period):
+        """Returns dict of ID RSSD to last downloaded submission datetime."""
+        with self.connection() as conn:
+            rows = conn.execute(
+                'SELECT id_rssd, submitted FROM filings '
+                'WHERE ds_name=? AND period=?', (ds_name, period))
+            return dict(rows.fetchall())
+
+    def pending(self, ds_name, period):
+        """Returns dict of ID RSSD to submission datetime awaiting download."""
+        with self.connection() as conn:
+            rows = conn.execute(
+                'SELECT id_rssd, submitted FROM pending '
+                'WHERE ds_name=? AND period=?', (ds_name, period))
+            return dict(rows.fetchall())
+
+    def add_pending(self, ds_name, period, filers, high_water):
+        """Queues filers for download and raises the period's high-water mark.
+
+        Both happen in one transaction, so a crash never loses a filer that is
+        below the high-water mark.
+
+        Args:
+            filers (dict): maps ID RSSD to submission datetime
+            high_water (datetime): new high-water mark for the period
+        """
+        with self.connection() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?)',
+                [(ds_name, period, id_rssd, submitted)
+                 for id_rssd, submitted in filers.items()])
+            if high_water is not None:
+                conn.execute(
+                    'INSERT OR REPLACE INTO periods VALUES (?, ?, ?)',
+                    (ds_name, period, high_water))
+
+    def mark_done(self, ds_name, period, id_rssd, submitted):
+        """Records a downloaded filing and removes it from pending."""
+        with self.connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO filings VALUES (?, ?, ?, ?)',
+                (ds_name, period, id_rssd, submitted))
+            conn.execute(
+                'DELETE FROM pending WHERE ds_name=? AND period=? '
+                'AND id_rssd=?', (ds_name, period, id_rssd))
+
+
+class FilingSync(object):
+    """ Downloads the facsimiles that were filed or amended since the last run.
+
+    Each run asks FFIEC for the filers submitted since the period's high-water
+    mark, compares their submission datetimes against the state store, queues
+    the new and amended ones, and downloads the queue with
+    `FFIEC_Client.retrieve_facsimiles`. The queue is stored durably, so a run
+    that crashes is resumed by the next one.
+
+    Args:
+        client (FFIEC_Client): client to retrieve filers and facsimiles with
+        path (str): path of the sqlite state store
+        outfile (callable): takes a request tuple (ds_name, reporting_pd_end,
+            fiID_type, fiID, facsimile_fmt) and returns the path to write the
+            facsimile to
+        facsimile_fmt (str): Format of facsimiles to retrieve (default is
+            'PDF')
+        max_workers (int): number of concurrent downloads (default is 4)
+        retries (int): number of times a download is retried (default is 2)
+    """
+
+    def __init__(self, client, path, outfile, facsimile_fmt='PDF',
+                 max_workers=4, retries=2):
+        self.client = client
+        self.state = SyncState(path)
+        self.outfile = outfile
+        self.facsimile_fmt = facsimile_fmt
+        self.max_workers = max_workers
+        self.retries = retries
+
+    def changes(self, reporting_pd_end, ds_name='Call'):
+        """Queues and returns the filers that are new or amended since last run.
+
+        Args:
+            reporting_pd_end (str): Date for end of the reporting period
+            ds_name (str): DataSeriesName (default is 'Call')
+
+        Returns:
+            changes (dict): maps ID RSSD to submission datetime for every
+                filer awaiting download, including ones left from earlier runs
+
+        """
+        high_water = self.state.high_water(ds_name, reporting_pd_end)
+        since = (high_water.strftime('%m/%d/%Y') if high_water
+                 else reporting_pd_end)
+        filers = self.client.retrieve_filers_submission_datetime(
+            ds_name, reporting_pd_end, since, raw=True) or []
+
+        submitted = self.state.submitted(ds_name, reporting_pd_end)
+        changed = {}
+        for filer in filers:
+            try:
+                dt = parse_submission_datetime(filer['DateTime'])
+            except ValueError as err:
+                # One bad filer does not abort the sync; it is picked up by a
+                # later run once FFIEC lists its DateTime
+                logger.warning('Skipping filer %s of %s %s: %s',
+                               filer['ID_RSSD'], ds_name, reporting_pd_end,
+                               err)
+                continue
+            last = submitted.get(filer['ID_RSSD'])
+            if last is None or dt > last:
+                changed[filer['ID_RSSD']] = dt
+            if high_water is None or dt > high_water:
+                high_water = dt
+
+        self.state.add_pending(ds_name, reporting_pd_end, changed,
+                               high_water)
+        return self.state.pending(ds_name, reporting_pd_end)
+
+    def sync(self, reporting_pd_end, ds_name='Call'):
+        """Downloads facsimiles filed or amended since the last run.
+
+        Args:
+            reporting_pd_end (str): Date for end of the reporting period
+            ds_name (str): DataSeriesName (default is 'Call')
+
+        Returns:
+            report (SyncReport): the filers that were downloaded or failed
+
+        """
+        pending = self.changes(reporting_pd_end, ds_name)
+        submitted = self.state.submitted(ds_name, reporting_pd_end)
+        report = SyncReport(ds_name, reporting_pd_end, [], [], {})
+
+        requests = ((ds_name, reporting_pd_end, 'ID_RSSD', id_rssd,
+                     self.facsimile_fmt) for id_rssd in sorted(pending))
+        results = self.client.retrieve_facsimiles(
+            requests, outfile=self.outfile, return_result=False,
+            max_workers=self.max_workers, retries=self.retries)
+        for result in results:
+            id_rssd = result.request[3]
+            if result.error is not None:
+                report.failed[id_rssd] = result.error
+                continue
+            self.state.mark_done(ds_name, reporting_pd_end, id_rssd,
+                                 pending[id_rssd])
+            if id_rssd in submitted:
+                report.amended.append(id_rssd)
+            else:
+                report.new.append(id_rssd)
+        return report
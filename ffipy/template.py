@@ -0,0 +1,206 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: precompiled SOAP requests for operations called many times
+# Usage: `request(client, operation, args)` returns the address, body and HTTP
+#   headers of a call; the envelope of each operation is serialized by zeep
+#   once per client and login, and later calls only fill in the escaped text
+#   of the operation's parameters
+# ------------------------------------------------------------------------------
+
+# PSL
+import re
+import uuid
+
+# 3rd party libs
+from zeep.wsdl.utils import etree_to_string
+from zeep.wsse.username import UsernameToken
+from zeep.xsd.types.simple import AnySimpleType
+
+# ffipy
+from .metrics import MetricsPlugin, metrics_plugins
+
+# Marks a missing entry in a client's `request_templates`, as failed compiles
+# are cached as None
+_MISSING = object()
+
+# Characters lxml refuses in element text
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _escape(text):
+    """Escapes text for an XML element as lxml serializes it.
+
+    Raises:
+        ValueError: if text has characters that are not allowed in XML, as
+            zeep (lxml) does
+    """
+    if _INVALID_XML.search(text):
+        raise ValueError('All strings must be XML compatible: Unicode or '
+                         'ASCII, no NULL bytes or control characters')
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '\r' in text:
+        text = text.replace('\r', '&#13;')
+    return text
+
+
+class RequestTemplate(object):
+    """ The serialized request of an operation, split at its parameters.
+
+    Args:
+        segments (list of bytes): the envelope around the parameters; one
+            more than there are parameters
+        xmlvalues (list of callables): the xsd type's `xmlvalue` of each
+            parameter, converting a value to its text as zeep does
+        address (str): URL the request is posted to
+        headers (dict): HTTP headers of the request
+    """
+
+    def __init__(self, segments, xmlvalues, address, headers):
+        self.segments = segments
+        self.xmlvalues = xmlvalues
+        self.address = address
+        self.headers = headers
+
+    def render(self, args):
+        """Returns the request body for args, or None if zeep must build it.
+
+        Zeep leaves out optional parameters that are None, and keyword or
+        missing args change the envelope, so those are not rendered.
+        """
+        if len(args) != len(self.xmlvalues):
+            return None
+        segments = self.segments
+        parts = [segments[0]]
+        for i, value in enumerate(args):
+            if value is None:
+                return None
+            parts.append(_escape(self.xmlvalues[i](value)).encode('utf-8'))
+            parts.append(segments[i + 1])
+        return b''.join(parts)
+
+
+def _security_key(wsse):
+    """Returns the part of the template key for wsse, or _MISSING if the
+    security header changes from call to call (a digest, nonce or timestamp)
+    so it cannot be compiled into the template."""
+    if wsse is None:
+        return None
+    if (type(wsse) is UsernameToken and not wsse.use_digest
+            and wsse.password_digest is None and wsse.nonce is None
+            and wsse.created is None):
+        return (wsse.username, wsse.password)
+    return _MISSING
+
+
+def compile_template(client, operation):
+    """Serializes the request of an operation with a placeholder for each
+    parameter and splits it at the placeholders.
+
+    Args:
+        client (zeep.Client): client whose service and wsse to use
+        operation (str): name of the operation
+
+    Returns:
+        template (RequestTemplate): None if the request of the operation
+            depends on more than its parameters
+
+    """
+    service = client.service
+    binding = service._binding
+    operation_obj = binding.get(operation)
+    if operation_obj is None:
+        raise ValueError('Operation %r not found' % operation)
+    if operation_obj.abstract.input_message.wsa_action:
+        return None
+    elements = operation_obj.input.body.type.elements
+    if not all(isinstance(element.type, AnySimpleType)
+               and element.max_occurs == 1 for _, element in elements):
+        return None
+
+    marker = uuid.uuid4().hex
+    placeholders = ['@%s%d@' % (marker, i) for i in range(len(elements))]
+    serialized = operation_obj.create(*placeholders)
+    binding._set_http_headers(serialized, operation_obj)
+    envelope, headers = serialized.content, serialized.headers
+    if client.wsse is not None:
+        envelope, headers = client.wsse.apply(envelope, headers)
+    body = etree_to_string(envelope)
+
+    segments = []
+    for placeholder in placeholders:
+        before, found, body = body.partition(placeholder.encode('ascii'))
+        if not found or placeholder.encode('ascii') in body:
+            return None
+        segments.append(before)
+    segments.append(body)
+    return RequestTemplate(segments,
+                           [element.type.xmlvalue for _, element in elements],
+                           service._binding_options['address'], headers)
+
+
+def get(client, operation):
+    """Returns the client's RequestTemplate of an operation, compiling it on
+    first use.
+
+    Templates are kept in the client's `request_templates` dict, keyed by the
+    binding, address and login, so a new login compiles a new template.
+
+    Returns:
+        template (RequestTemplate): None if the client keeps no templates,
+            has plugins other than MetricsPlugin (which only observes), or
+            the request cannot be templated
+
+    """
+    templates = getattr(client, 'request_templates', None)
+    if templates is None:
+        return None
+    if any(not isinstance(plugin, MetricsPlugin) for plugin in client.plugins):
+        return None
+    security = _security_key(client.wsse)
+    if security is _MISSING:
+        return None
+    service = client.service
+    key = (operation, service._binding, service._binding_options['address'],
+           security)
+    template = templates.get(key, _MISSING)
+    if template is _MISSING:
+        template = templates[key] = compile_template(client, operation)
+    return template
+
+
+def request(client, operation, args):
+    """Returns the request of a call, from the operation's template if it has
+    one and by zeep otherwise.
+
+    A templated request starts the SOAP round trip timing of the client's
+    MetricsPlugins, as zeep's egress would.
+
+    Args:
+        client (zeep.Client): client whose service, wsse and plugins to use
+        operation (str): name of the operation
+        args (tuple): positional args for the operation
+
+    Returns:
+        address (str): URL to post the request to
+        body (bytes): the serialized envelope
+        headers (dict): HTTP headers of the request
+
+    """
+    template = get(client, operation)
+    if template is not None:
+        body = template.render(args)
+        if body is not None:
+            for plugin in metrics_plugins(client):
+                plugin.start(operation)
+            return template.address, body, dict(template.headers)
+    service = client.service
+    envelope, headers = service._binding._create(
+        operation, args, {}, client=client,
+        options=service._binding_options)
+    return (service._binding_options['address'], etree_to_string(envelope),
+            headers)
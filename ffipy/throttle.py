@@ -0,0 +1,272 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: adaptive rate limiting of the calls made to the FFIEC SOAP servers
+# Usage: pass one Scheduler to every FFIEC_Client (`scheduler=`); each call
+#   then waits for a token from its account's bucket and a slot under its
+#   account's concurrency limit, which is raised while calls succeed and cut
+#   when FFIEC faults or slows down (AIMD)
+# ------------------------------------------------------------------------------
+
+# PSL
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# 3rd party libs
+import zeep
+from requests import RequestException
+
+# Priorities of calls; lower values are scheduled first
+INTERACTIVE = 0
+BULK = 10
+
+# Messages of the faults FFIEC returns when it is overloaded or throttling;
+# other faults (e.g. a bad argument or missing data) are not congestion
+BUSY_FAULT = re.compile(r'busy|throttl|too many|rate limit|limit exceeded|'
+                        r'try again|unavailable|overload|timed? ?out',
+                        re.IGNORECASE)
+
+_local = threading.local()
+
+
+def is_congestion(error):
+    """Returns True if `error` means FFIEC is overloaded or throttling.
+
+    Network errors, HTTP 429 (Too Many Requests) and 5xx responses are
+    congestion, and so are faults whose message matches BUSY_FAULT. Transport
+    errors raised for a malformed 200 response (e.g. truncated base64 or
+    invalid XML) are not.
+    """
+    if isinstance(error, zeep.exceptions.Fault):
+        return bool(BUSY_FAULT.search(error.message or ''))
+    if isinstance(error, zeep.exceptions.TransportError):
+        status = error.status_code or 0
+        return status == 429 or status >= 500
+    return isinstance(error, RequestException)
+
+
+@contextmanager
+def priority(value):
+    """Sets the priority of the calls made by this thread within the block.
+
+    Args:
+        value (int): e.g. INTERACTIVE or BULK; lower values go first
+    """
+    previous = getattr(_local, 'priority', INTERACTIVE)
+    _local.priority = value
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority():
+    """Returns the priority of calls made by this thread."""
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Returns seconds to wait before retry number `attempt` (from 0).
+
+    The delay is drawn uniformly from [0, min(cap, base * 2 ** attempt)]
+    ("full jitter"), so clients that failed together do not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket(object):
+    """ A token bucket allowing `rate` calls per second in bursts of `burst`.
+
+    Not thread-safe on its own; the Scheduler calls it under its lock.
+
+    Args:
+        rate (float): tokens added per second
+        burst (int): maximum tokens held (default is max(1, rate))
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Takes a token if there is one.
+
+        Returns:
+            wait (float): 0 if a token was taken, otherwise seconds until the
+                next token is available
+
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _Account(object):
+    """Scheduling state of one FFIEC account."""
+
+    def __init__(self, bucket, limit):
+        self.bucket = bucket
+        self.limit = limit
+        self.active = 0
+        self.waiters = []
+        self.decreased = 0.0
+
+
+class Scheduler(object):
+    """ Schedules FFIEC calls per account with rate and concurrency limits.
+
+    Each account (FFIEC username) has a token bucket of `rate` calls per
+    second and a concurrency limit between `min_concurrency` and
+    `max_concurrency`. The limit grows by about one for each limit's worth of
+    calls that succeed within `target_latency`, and is multiplied by
+    `decrease` when a call fails with congestion (see `is_congestion`) or
+    takes longer than `target_latency` (at most once per round trip).
+    Waiting calls are started in order of priority, then arrival, so
+    INTERACTIVE calls jump ahead of BULK ones. A Scheduler is thread-safe and meant to be shared by
+    all clients of a process.
+
+    Args:
+        rate (float): calls per second per account; unlimited, if None
+            (default is None)
+        burst (int): calls that may be made at once after an idle period
+            (default is max(1, rate))
+        min_concurrency (int): lowest concurrency limit (default is 1)
+        max_concurrency (int): highest concurrency limit (default is 16)
+        initial_concurrency (int): starting concurrency limit (default is 4)
+        target_latency (float): seconds a call may take before it counts as
+            congestion (default is 60)
+        decrease (float): factor the limit is cut by on congestion (default
+            is 0.5)
+    """
+
+    def __init__(self, rate=None, burst=None, min_concurrency=1,
+                 max_concurrency=16, initial_concurrency=4,
+                 target_latency=60.0, decrease=0.5):
+        self.rate = rate
+        self.burst = burst
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = min(max(initial_concurrency,
+                                           min_concurrency), max_concurrency)
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.__accounts = {}
+        self.__cond = threading.Condition()
+        self.__seq = itertools.count()
+
+    def __account(self, account):
+        state = self.__accounts.get(account)
+        if state is None:
+            bucket = (TokenBucket(self.rate, self.burst)
+                      if self.rate is not None else None)
+            state = _Account(bucket, float(self.initial_concurrency))
+            self.__accounts[account] = state
+        return state
+
+    def concurrency(self, account):
+        """Returns the current concurrency limit of an account."""
+        with self.__cond:
+            return int(self.__account(account).limit)
+
+    def acquire(self, account, priority=None, timeout=None):
+        """Waits for a token and a free slot for a call by `account`.
+
+        Args:
+            account (str): the FFIEC username making the call
+            priority (int): e.g. INTERACTIVE or BULK (default is the
+                thread's `current_priority()`)
+            timeout (float): seconds to wait at most; forever, if None
+                (default is None)
+
+        Returns:
+            started (float): `time.monotonic()` when the call was let through;
+                pass it to `release`
+
+        Raises:
+            TimeoutError: if no slot was free within `timeout`
+        """
+        if priority is None:
+            priority = current_priority()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__cond:
+            state = self.__account(account)
+            entry = (priority, next(self.__seq))
+            heapq.heappush(state.waiters, entry)
+            try:
+                while True:
+                    wait = None
+                    if (state.waiters[0] == entry
+                            and state.active < int(state.limit)):
+                        wait = state.bucket.take() if state.bucket else 0
+                        if not wait:
+                            heapq.heappop(state.waiters)
+                            state.active += 1
+                            # Let the next waiter check for a slot, too
+                            self.__cond.notify_all()
+                            return time.monotonic()
+                    if deadline is not None:
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            raise TimeoutError('No FFIEC call slot free for '
+                                               '%s' % account)
+                        wait = left if wait is None else min(wait, left)
+                    self.__cond.wait(wait)
+            except BaseException:
+                if entry in state.waiters:
+                    state.waiters.remove(entry)
+                    heapq.heapify(state.waiters)
+                    self.__cond.notify_all()
+                raise
+
+    def release(self, account, started, error=None):
+        """Frees the slot of a finished call and adjusts the account's limit.
+
+        Args:
+            account (str): the FFIEC username that made the call
+            started (float): the value returned by `acquire`
+            error (Exception): the error the call raised, if any (default is
+                None)
+        """
+        now = time.monotonic()
+        with self.__cond:
+            state = self.__account(account)
+            state.active -= 1
+            congested = (is_congestion(error)
+                         or now - started > self.target_latency)
+            if congested:
+                # Calls started before the last cut saw the old limit
+                if started >= state.decreased:
+                    state.limit = max(self.min_concurrency,
+                                      state.limit * self.decrease)
+                    state.decreased = now
+            elif error is None:
+                state.limit = min(self.max_concurrency,
+                                  state.limit + 1.0 / state.limit)
+            self.__cond.notify_all()
+
+    @contextmanager
+    def slot(self, account, priority=None):
+        """Holds a slot for a call by `account` within the block.
+
+        Args:
+            account (str): the FFIEC username making the call
+            priority (int): see `acquire`
+        """
+        started = self.acquire(account, priority)
+        try:
+            yield
+        except BaseException as err:
+            self.release(account, started, err)
+            raise
+        self.release(account, started)
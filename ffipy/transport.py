@@ -0,0 +1,130 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: a preconfigured HTTP transport for the FFIEC SOAP servers
+# Usage: PooledTransport is the default transport of FFIEC_Client; pass
+#   `transport.shared()` to other clients so they use the same connection pool
+# ------------------------------------------------------------------------------
+
+# PSL
+import os
+import weakref
+
+# 3rd party libs
+import requests
+import zeep
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default number of pooled connections; at least the number of workers that
+# make requests at the same time
+POOL_SIZE = 10
+
+# Seconds to wait to connect to, and between bytes read from, the server
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 300
+
+# Adapters of all PooledTransports, whose pools are emptied in forked children
+_adapters = weakref.WeakSet()
+
+
+def _reset_pools():
+    """Drops the pooled connections inherited by a forked child process.
+
+    The child's copies of the parent's sockets are closed, so the child opens
+    its own connections rather than interleaving requests with the parent.
+    """
+    for adapter in list(_adapters):
+        adapter.poolmanager.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools)
+
+
+def make_adapter(pool_size=POOL_SIZE, connect_retries=2):
+    """Returns a requests HTTPAdapter with a bounded keep-alive pool.
+
+    The pool blocks when all `pool_size` connections are in use, rather than
+    opening throwaway connections, so workers beyond the pool size wait for a
+    kept-alive connection. Only connection errors are retried, since then the
+    request was never sent.
+
+    Args:
+        pool_size (int): maximum connections kept per host (default is
+            POOL_SIZE)
+        connect_retries (int): times to retry failed connections (default is
+            2)
+    """
+    retry = Retry(total=None, connect=connect_retries, read=0, redirect=0,
+                  status=0, backoff_factor=0.5)
+    return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                       pool_block=True, max_retries=retry)
+
+
+class PooledTransport(zeep.Transport):
+    """ A zeep.Transport tuned for many concurrent calls to FFIEC.
+
+    Connections are kept alive in a bounded pool that is safe to use from many
+    threads and may be shared between transports (see `shared`), responses
+    are requested gzip/deflate compressed, and operations have connect and
+    read timeouts.
+
+    Args:
+        pool_size (int): maximum connections kept alive (default is
+            POOL_SIZE); ignored if `adapter` is given
+        connect_timeout (float): seconds to wait to connect (default is
+            CONNECT_TIMEOUT)
+        read_timeout (float): seconds to wait between bytes read from the
+            server (default is READ_TIMEOUT); also the timeout for loading
+            WSDL/XSD documents
+        cache (zeep.cache.Base): cache for WSDL/XSD documents (default is
+            None)
+        adapter (requests.adapters.HTTPAdapter): adapter holding the
+            connection pool; a new one from `make_adapter`, if None
+
+    Attributes:
+        adapter (requests.adapters.HTTPAdapter): the connection pool
+
+    Pickling keeps the settings and cache, but not the connections, session
+    headers or hooks; the unpickled transport has a new pool of its own.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, cache=None, adapter=None):
+        self.adapter = adapter if adapter is not None else make_adapter(
+            pool_size)
+        _adapters.add(self.adapter)
+        session = requests.Session()
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        session.headers['Connection'] = 'keep-alive'
+        zeep.Transport.__init__(self, cache=cache, timeout=read_timeout,
+                                operation_timeout=(connect_timeout,
+                                                   read_timeout),
+                                session=session)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    def __getstate__(self):
+        return {'pool_size': self.pool_size,
+                'connect_timeout': self.connect_timeout,
+                'read_timeout': self.read_timeout, 'cache': self.cache}
+
+    def __setstate__(self, state):
+        PooledTransport.__init__(self, **state)
+
+    @property
+    def pool_size(self):
+        """Returns the maximum number of pooled connections"""
+        return self.adapter._pool_maxsize
+
+    def shared(self):
+        """Returns a new transport using this transport's connection pool.
+
+        The new transport has its own session (headers and cookies), but
+        shares the pool, timeouts and cache.
+        """
+        return PooledTransport(connect_timeout=self.connect_timeout,
+                               read_timeout=self.read_timeout,
+                               cache=self.cache, adapter=self.adapter)
@@ -0,0 +1,270 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: a long-running watcher publishing new and amended filings
+# Usage: watcher = FilingWatcher(client, callbacks=[print]); watcher.start()
+#   polls FFIEC for filers submitted since the last poll of each of the
+#   latest reporting periods, and calls the callbacks with a FilingEvent per
+#   new or amended filing; `await watcher.watch(queue)` puts the events on an
+#   asyncio.Queue instead
+# ------------------------------------------------------------------------------
+
+# PSL
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# ffipy
+from . import throttle
+from .bulk import RETRY_ERRORS
+from .parse import format_period
+from .sync import parse_submission_datetime
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls while filings are due (within FILING_WINDOW days of
+# the end of a watched period), or after a poll found filings
+BUSY_INTERVAL = 5 * 60
+
+# Seconds between polls otherwise
+IDLE_INTERVAL = 60 * 60
+
+# Days after the end of a reporting period during which most filings arrive
+# (Call Reports are due within 30 days, or 35 for multi-office filers)
+FILING_WINDOW = 45
+
+FilingEvent = namedtuple('FilingEvent', ['kind', 'ds_name', 'period',
+                                         'id_rssd', 'submitted'])
+FilingEvent.__doc__ = """A filing seen by a FilingWatcher.
+
+    Attributes:
+        kind (str): 'new' for a first filing, 'amended' for a refiling
+        ds_name (str): DataSeriesName of the filing
+        period (str): reporting period, e.g. '3/31/2017'
+        id_rssd (int): ID RSSD of the filer
+        submitted (datetime): submission datetime of the filing
+"""
+
+
+class FilingWatcher(object):
+    """ Polls FFIEC for new and amended filings and publishes them as events.
+
+    Each poll asks, for each of the `periods` latest reporting periods, for
+    the filers submitted since that period's high-water mark (the latest
+    submission datetime seen), so it only transfers the filers of the last
+    day or so. A filer's submission datetime is compared with the last one
+    seen for it: a filer not seen before is 'new', a later submission is
+    'amended'. Polls are every `busy_interval` seconds within
+    `filing_window` days after the end of a watched period or after a poll
+    that found filings, and every `idle_interval` seconds otherwise; failed
+    polls are retried with jittered backoff.
+
+    The state is in memory. By default the first poll of the periods watched
+    at startup only records their filers (`baseline`), so events are for
+    filings made while the watcher runs; pass `high_water` to start from a
+    known point instead. Periods that appear later, e.g. a new quarter, are
+    not baselined: all their filings are published. The high-water mark only
+    sets the date polls ask for filers since; filers submitted before it but
+    not seen yet (e.g. made visible late) are still published. Filers with
+    a missing or unrecognized submission DateTime are logged and skipped, as
+    are errors raised by callbacks.
+
+    Args:
+        client (FFIEC_Client): client to poll with
+        ds_name (str): DataSeriesName to watch (default is 'Call')
+        callbacks (iterable of callables): called with each FilingEvent
+            (default is ())
+        periods (int): number of latest reporting periods to watch (default
+            is 2)
+        busy_interval (float): seconds between busy polls (default is
+            BUSY_INTERVAL)
+        idle_interval (float): seconds between idle polls (default is
+            IDLE_INTERVAL)
+        filing_window (int): days after a period's end that polls are busy
+            (default is FILING_WINDOW)
+        baseline (bool): If True, the first poll of a period publishes no
+            events (default is True)
+        high_water (dict): maps period to the datetime to start watching it
+            from; the first poll of the period publishes every filing after
+            it (default is None)
+
+    Attributes:
+        high_water (dict): maps (ds_name, period) to the latest submission
+            datetime seen
+        submitted (dict): maps (ds_name, period) to a dict of ID RSSD to its
+            latest submission datetime seen
+        failures (int): consecutive polls that failed
+        last_error (Exception): the error of the last failed poll
+    """
+
+    def __init__(self, client, ds_name='Call', callbacks=(), periods=2,
+                 busy_interval=BUSY_INTERVAL, idle_interval=IDLE_INTERVAL,
+                 filing_window=FILING_WINDOW, baseline=True, high_water=None):
+        self.client = client
+        self.ds_name = ds_name
+        self.callbacks = list(callbacks)
+        self.periods = periods
+        self.busy_interval = busy_interval
+        self.idle_interval = idle_interval
+        self.filing_window = filing_window
+        self.baseline = baseline
+        self.high_water = {(ds_name, format_period(period)): dt
+                           for period, dt in (high_water or {}).items()}
+        self.submitted = {}
+        self.watched = []
+        self.failures = 0
+        self.last_error = None
+        self.__found = False
+        self.__baseline_periods = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def subscribe(self, callback):
+        """Adds a callback called with each FilingEvent."""
+        self.callbacks.append(callback)
+
+    def __latest_periods(self):
+        """Returns the `periods` latest reporting periods, latest first.
+
+        The client's memoized periods are forgotten first, so a new period is
+        seen on the next poll rather than once the memo expires.
+        """
+        invalidate = getattr(self.client, 'invalidate', None)
+        if invalidate is not None:
+            invalidate('retrieve_reporting_periods', self.ds_name)
+        periods = self.client.retrieve_reporting_periods(self.ds_name) or []
+        periods = sorted({format_period(str(p)) for p in periods},
+                         key=lambda p: datetime.strptime(p, '%m/%d/%Y'),
+                         reverse=True)
+        return periods[:self.periods]
+
+    def __poll_period(self, period):
+        """Returns the FilingEvents of one period since its high-water mark."""
+        key = (self.ds_name, period)
+        high_water = self.high_water.get(key)
+        first = key not in self.submitted
+        baseline = (first and high_water is None and self.baseline
+                    and period in self.__baseline_periods)
+        # Only the first poll of a period started from a given high-water
+        # mark skips the filings before it; later polls rely on `submitted`
+        start = high_water if first else None
+        since = high_water.strftime('%m/%d/%Y') if high_water else period
+        filers = self.client.retrieve_filers_submission_datetime(
+            self.ds_name, period, since, raw=True) or []
+
+        submitted = self.submitted.setdefault(key, {})
+        latest = high_water
+        events = []
+        for filer in filers:
+            try:
+                dt = parse_submission_datetime(filer['DateTime'])
+            except ValueError as err:
+                logger.warning('Skipping filer %s of %s %s: %s',
+                               filer['ID_RSSD'], self.ds_name, period, err)
+                continue
+            if start is not None and dt <= start:
+                continue
+            id_rssd = filer['ID_RSSD']
+            last = submitted.get(id_rssd)
+            if last is not None and dt <= last:
+                continue
+            submitted[id_rssd] = dt
+            if latest is None or dt > latest:
+                latest = dt
+            if not baseline:
+                events.append(FilingEvent(
+                    'new' if last is None else 'amended', self.ds_name,
+                    period, id_rssd, dt))
+        if latest is not None:
+            self.high_water[key] = latest
+        return events
+
+    def poll(self):
+        """Polls each watched period once and publishes the events found.
+
+        Returns:
+            events (list of FilingEvents): in order of submission
+
+        """
+        self.watched = self.__latest_periods()
+        if self.__baseline_periods is None:
+            self.__baseline_periods = set(self.watched)
+        events = []
+        for period in self.watched:
+            events.extend(self.__poll_period(period))
+        events.sort(key=lambda event: event.submitted)
+        self.__found = bool(events)
+        for event in events:
+            for callback in self.callbacks:
+                # The event is already recorded as seen, so a failing
+                # callback must not keep the others from getting it
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception('Callback %r failed on %s', callback,
+                                     event)
+        return events
+
+    def interval(self, now=None):
+        """Returns the seconds to wait before the next poll."""
+        if self.failures:
+            return min(self.idle_interval, throttle.backoff_delay(
+                self.failures - 1, self.busy_interval / 10))
+        if self.__found:
+            return self.busy_interval
+        now = now or datetime.now()
+        window = timedelta(days=self.filing_window)
+        for period in self.watched:
+            end = datetime.strptime(period, '%m/%d/%Y')
+            if end <= now <= end + window:
+                return self.busy_interval
+        return self.idle_interval
+
+    def __poll_safely(self):
+        """Polls, recording rather than raising faults and network errors."""
+        try:
+            events = self.poll()
+        except RETRY_ERRORS as err:
+            self.failures += 1
+            self.last_error = err
+            return []
+        self.failures = 0
+        return events
+
+    def run(self):
+        """Polls until `stop` is called; blocks the calling thread."""
+        self.__stop.clear()
+        while not self.__stop.is_set():
+            self.__poll_safely()
+            self.__stop.wait(self.interval())
+
+    def start(self):
+        """Runs the watcher on a daemon thread; returns the thread."""
+        self.__thread = threading.Thread(target=self.run, daemon=True,
+                                         name='ffipy-watcher')
+        self.__thread.start()
+        return self.__thread
+
+    def stop(self, timeout=None):
+        """Stops the watcher after its current poll."""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    async def watch(self, queue):
+        """Polls until cancelled, putting each FilingEvent on `queue`.
+
+        Polls run in the event loop's default executor, so the loop is not
+        blocked while waiting on FFIEC.
+
+        Args:
+            queue (asyncio.Queue): queue to put the events on
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            events = await loop.run_in_executor(None, self.__poll_safely)
+            for event in events:
+                await queue.put(event)
+            await asyncio.sleep(self.interval())
@@ -0,0 +1,289 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: a local stand-in for the FFIEC SOAP server, for tests and benchmarks
+# Usage: with StubServer(latency=0.05, fault_rate=0.01) as stub:
+#            client = stub.client()
+#   serves the local copy of the RetrievalService WSDL and replies to every
+#   operation with synthetic data of realistic size
+# ------------------------------------------------------------------------------
+
+import base64
+import gzip
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ffipy import FFIEC_Client
+from ffipy.transport import PooledTransport
+
+from tests.utils import (panel_result, reporter, seed_cache, soap_fault,
+                         soap_response, wsdl_content)
+
+BINDING = '{http://cdr.ffiec.gov/public/services}RetrievalServiceSoap'
+
+STATES = ('AL', 'CA', 'IL', 'NY', 'TX', 'WY')
+FILING_TYPES = ('031', '041', '051')
+
+# Format of the DateTime of the synthetic submissions, filled in with the day,
+# hour and minute of each filer's submission
+SUBMITTED = '4/%d/2017 %d:%02d:00 PM'
+
+
+def _field(message, name):
+    """Returns the text of the first element `name` in a request envelope."""
+    match = re.search(rb'<(?:\w+:)?' + name.encode() + rb'>([^<]*)<', message)
+    return match.group(1).decode() if match else None
+
+
+@lru_cache(maxsize=8)
+def pdf(size):
+    """Returns a synthetic PDF of about `size` bytes."""
+    rng = random.Random(size)
+    body = rng.getrandbits(8 * size).to_bytes(size, 'little')
+    return b'%PDF-1.4\n' + body + b'\n%%EOF\n'
+
+
+@lru_cache(maxsize=64)
+def sdf(id_rssd, items, date='20170331'):
+    """Returns a synthetic SDF facsimile with `items` values."""
+    lines = ['Call Date;Bank RSSD Identifier;MDRM #;Value;Last Update;'
+             'Short Definition;Call Schedule;Line Number']
+    for n in range(items):
+        lines.append('%s;%d;RCON%04d;%d;20170420;Item %d;RC;%d'
+                     % (date, id_rssd, n, id_rssd + n, n, n))
+    return '\r\n'.join(lines).encode('utf-8')
+
+
+@lru_cache(maxsize=64)
+def xbrl(id_rssd, items, date='2017-03-31'):
+    """Returns a synthetic XBRL facsimile with `items` facts."""
+    facts = ''.join('<cc:RCON{0:04d} contextRef="CI_{1}" unitRef="USD" '
+                    'decimals="0">{2}</cc:RCON{0:04d}>'
+                    .format(n, id_rssd, id_rssd + n) for n in range(items))
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<xbrl xmlns="http://www.xbrl.org/2003/instance" '
+            'xmlns:cc="http://www.ffiec.gov/xbrl/call/concepts">'
+            '<context id="CI_{0}"><entity><identifier '
+            'scheme="http://www.ffiec.gov/cdr">{0}</identifier></entity>'
+            '<period><instant>{1}</instant></period></context>'
+            '<unit id="USD"><measure>iso4217:USD</measure></unit>'
+            '{2}</xbrl>'.format(id_rssd, date, facts)).encode('utf-8')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are sent separately; don't wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.__send(200, self.server.stub.wsdl)
+
+    def do_POST(self):
+        message = self.rfile.read(int(self.headers['Content-Length']))
+        action = self.headers.get('SOAPAction', '')
+        operation = action.strip('"').rsplit('/', 1)[-1]
+        status, body = self.server.stub.reply(operation, message)
+        self.__send(status, body)
+
+    def __send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        if (self.server.stub.gzip and len(body) > 1024
+                and 'gzip' in self.headers.get('Accept-Encoding', '')):
+            body = gzip.compress(body, 1)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(object):
+    """ A local HTTP server standing in for the FFIEC SOAP server.
+
+    Args:
+        panel_size (int): institutions in the Panel of Reporters (default is
+            5000)
+        pdf_size (int): bytes of each PDF facsimile (default is 300 KiB)
+        items (int): values in each SDF and XBRL facsimile (default is 2000)
+        latency (float): seconds each reply is delayed by (default is 0)
+        fault_rate (float): probability that a call faults (default is 0)
+        fault_operations (iterable of strs): operations that may fault; all,
+            if None (default is None)
+        gzip (bool): If True, compress replies for clients accepting gzip
+            (default is True)
+        seed (int): seed of the fault injection (default is 0)
+        rejected_users (iterable of strs): usernames whose calls fault with
+            a login error (default is ())
+
+    Attributes:
+        calls (dict): maps operation name to number of calls replied to
+        url (str): address of the service, once started
+    """
+
+    def __init__(self, panel_size=5000, pdf_size=300 * 1024, items=2000,
+                 latency=0.0, fault_rate=0.0, fault_operations=None,
+                 gzip=True, seed=0, rejected_users=()):
+        self.panel_size = panel_size
+        self.pdf_size = pdf_size
+        self.items = items
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.fault_operations = (set(fault_operations)
+                                 if fault_operations is not None else None)
+        self.gzip = gzip
+        self.rejected_users = set(rejected_users)
+        self.calls = {}
+        self.url = None
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__replies = {}
+
+    def start(self):
+        """Starts serving on a free local port."""
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.stub = self
+        self.url = ('http://127.0.0.1:%d/Public/PWS/WebServices/'
+                    'RetrievalService.asmx' % self.__server.server_port)
+        threading.Thread(target=self.__server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stops the server."""
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def wsdl(self):
+        """Returns the WSDL, with the service address pointing here."""
+        return wsdl_content.replace(
+            b'https://cdr.ffiec.gov/Public/PWS/WebServices/'
+            b'RetrievalService.asmx', self.url.encode())
+
+    def bind(self, client):
+        """Points a client's default service at this server.
+
+        zeep forces the address of a WSDL loaded from https (as
+        FFIEC_Client.wsdl is) to https, so the address is set here instead.
+        """
+        client._default_service = client.create_service(BINDING, self.url)
+        return client
+
+    def client(self, **kwargs):
+        """Returns an FFIEC_Client calling this server.
+
+        Keyword args are passed to FFIEC_Client; by default the client has a
+        PooledTransport with the WSDL cached and skips the login check.
+        """
+        kwargs.setdefault('wsse', ('user', 'token'))
+        kwargs.setdefault('check_login', False)
+        if 'transport' not in kwargs:
+            kwargs['transport'] = PooledTransport(cache=seed_cache())
+        return self.bind(FFIEC_Client(**kwargs))
+
+    def reply(self, operation, message):
+        """Returns tuple (status, body) of the reply to an operation."""
+        with self.__lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            fault = (self.fault_rate
+                     and (self.fault_operations is None
+                          or operation in self.fault_operations)
+                     and self.__random.random() < self.fault_rate)
+        if self.latency:
+            time.sleep(self.latency)
+        if _field(message, 'Username') in self.rejected_users:
+            return 500, soap_fault('The username or password token is '
+                                   'invalid.')
+        if fault:
+            return 500, soap_fault('Server is busy. Please try again later.')
+        result = getattr(self, '_' + operation, None)
+        if result is None:
+            return 500, soap_fault('Unknown operation %s' % operation)
+        return 200, result(message)
+
+    def __cached(self, key, build):
+        body = self.__replies.get(key)
+        if body is None:
+            body = self.__replies[key] = build()
+        return body
+
+    def __reporters(self):
+        return [reporter(n, state=STATES[n % len(STATES)],
+                         filing_type=FILING_TYPES[n % len(FILING_TYPES)],
+                         has_filed=n % 10 != 0)
+                for n in range(1, self.panel_size + 1)]
+
+    def _TestUserAccess(self, message):
+        return soap_response('TestUserAccess', 'true')
+
+    def _RetrieveReportingPeriods(self, message):
+        return self.__cached('periods', lambda: soap_response(
+            'RetrieveReportingPeriods', ''.join(
+                '<string>%d/%d/%d</string>' % (m, d, y)
+                for y in range(2017, 2000, -1)
+                for m, d in ((12, 31), (9, 30), (6, 30), (3, 31)))))
+
+    def _RetrieveUBPRReportingPeriods(self, message):
+        return self.__cached('ubpr_periods', lambda: soap_response(
+            'RetrieveUBPRReportingPeriods', ''.join(
+                '<string>%d-%02d-%d</string>' % (y, m, d)
+                for y in range(2017, 2000, -1)
+                for m, d in ((12, 31), (9, 30), (6, 30), (3, 31)))))
+
+    def _RetrievePanelOfReporters(self, message):
+        return self.__cached('panel', lambda: soap_response(
+            'RetrievePanelOfReporters', panel_result(self.__reporters())))
+
+    def _RetrieveFilersSinceDate(self, message):
+        return self.__cached('since', lambda: soap_response(
+            'RetrieveFilersSinceDate', ''.join(
+                '<int>%d</int>' % n
+                for n in range(1, self.panel_size + 1) if n % 10)))
+
+    def _RetrieveFilersSubmissionDateTime(self, message):
+        return self.__cached('submissions', lambda: soap_response(
+            'RetrieveFilersSubmissionDateTime', ''.join(
+                '<RetrieveFilersDateTime><ID_RSSD>%d</ID_RSSD>'
+                '<DateTime>%s</DateTime></RetrieveFilersDateTime>'
+                % (n, SUBMITTED % (n % 28 + 1, n % 12 + 1, n % 60))
+                for n in range(1, self.panel_size + 1) if n % 10)))
+
+    def __facsimile(self, operation, facsimile):
+        return soap_response(operation,
+                             base64.b64encode(facsimile).decode('ascii'))
+
+    def _RetrieveFacsimile(self, message):
+        fiID = int(_field(message, 'fiID'))
+        fmt = _field(message, 'facsimileFormat')
+        period = datetime.strptime(
+            _field(message, 'reportingPeriodEndDate') or '3/31/2017',
+            '%m/%d/%Y')
+        if fmt == 'PDF':
+            return self.__cached(('pdf', self.pdf_size), lambda:
+                                 self.__facsimile('RetrieveFacsimile',
+                                                  pdf(self.pdf_size)))
+        if fmt == 'SDF':
+            facsimile = sdf(fiID, self.items, period.strftime('%Y%m%d'))
+        else:
+            facsimile = xbrl(fiID, self.items, period.strftime('%Y-%m-%d'))
+        return self.__facsimile('RetrieveFacsimile', facsimile)
+
+    def _RetrieveUBPRXBRLFacsimile(self, message):
+        fiID = int(_field(message, 'fiID'))
+        return self.__facsimile('RetrieveUBPRXBRLFacsimile',
+                                xbrl(fiID, self.items))
@@ -0,0 +1,132 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the multi-account client pool in ffipy.accounts
+# ------------------------------------------------------------------------------
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import zeep
+
+from ffipy.accounts import ClientPool, is_login_fault, load_accounts
+from ffipy.transport import PooledTransport
+
+from tests.stub_server import StubServer
+from tests.utils import seed_cache
+
+ACCOUNTS = {'a': ('user_a', 'token'), 'b': ('user_b', 'token'),
+            'c': ('user_c', 'token')}
+
+
+def requests(fiIDs):
+    return [('Call', '3/31/2017', 'ID_RSSD', fiID, 'PDF') for fiID in fiIDs]
+
+
+class ClientPool_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubServer(panel_size=10, pdf_size=1024,
+                              rejected_users={'user_c'}).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def pool(self, accounts=ACCOUNTS, **kwargs):
+        pool = ClientPool(accounts, check_login=False,
+                          transport=PooledTransport(cache=seed_cache()),
+                          **kwargs)
+        for account in pool.accounts:
+            self.stub.bind(account.client)
+        return pool
+
+    def test_load_accounts(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'ffiec')
+            with open(path, 'w') as f:
+                f.write('[wsse]\nusername = first\npassword = p1\n\n'
+                        '[wsse:second]\nusername = other\npassword = p2\n'
+                        'quota = 5\n\n[settings]\nfoo = bar\n')
+            accounts = load_accounts(path)
+            self.assertEqual([a.name for a in accounts], ['first', 'second'])
+            self.assertEqual(accounts[1].wsse.username, 'other')
+            self.assertEqual([a.quota for a in accounts], [None, 5])
+            with self.assertRaises(ValueError):
+                load_accounts(os.path.join(tmpdir, 'missing'))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_shards_requests(self):
+        pool = self.pool({name: ACCOUNTS[name] for name in ('a', 'b')})
+        # The clients share the first client's connection pool
+        self.assertIs(pool.accounts[1].client.transport.adapter,
+                      pool.accounts[0].client.transport.adapter)
+        results = list(pool.retrieve_facsimiles(requests(range(1, 13)),
+                                                return_result=False))
+        self.assertEqual([r.error for r in results], [None] * 12)
+        stats = pool.stats()
+        self.assertEqual(sum(s['calls'] for s in stats.values()), 12)
+        self.assertTrue(all(s['calls'] for s in stats.values()))
+
+    def test_login_fault_disables_account(self):
+        pool = self.pool()
+        pool.check_logins()
+        self.assertEqual(pool.stats()['c']['state'], 'disabled')
+        self.assertEqual(pool.stats()['a']['state'], 'ok')
+        pool.enable('c')
+        results = list(pool.retrieve_facsimiles(requests(range(1, 10)),
+                                                return_result=False))
+        self.assertEqual([r.error for r in results], [None] * 9)
+        self.assertEqual(pool.stats()['c']['state'], 'disabled')
+
+        pool.disable('a')
+        pool.disable('b')
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+    def test_busy_fault_at_check_keeps_account(self):
+        pool = self.pool()
+        self.stub.fault_rate = 1.0
+        self.stub.fault_operations = {'TestUserAccess'}
+        try:
+            pool.check_logins()
+        finally:
+            self.stub.fault_rate = 0.0
+            self.stub.fault_operations = None
+        self.assertEqual({name: s['state'] for name, s in pool.stats().items()
+                          if s['state'] == 'disabled'}, {'c': 'disabled'})
+
+    def test_cooldown(self):
+        pool = self.pool({'a': ACCOUNTS['a'], 'b': ACCOUNTS['b']},
+                         max_failures=2, cooldown=60)
+        busy = zeep.exceptions.Fault('Server is busy.')
+        self.assertFalse(is_login_fault(busy))
+        for _ in range(2):
+            pool.release(pool.accounts[0], busy)
+        self.assertEqual(pool.stats()['a']['state'], 'cooling')
+        for _ in range(3):
+            account = pool.acquire()
+            self.assertEqual(account.name, 'b')
+            pool.release(account)
+
+        pool.disable('b')
+        with self.assertRaises(TimeoutError):
+            pool.acquire(timeout=0.05)
+
+    def test_quota(self):
+        pool = self.pool({'a': ACCOUNTS['a']}, quota=2, quota_period=0.2)
+        for _ in range(2):
+            pool.release(pool.acquire())
+        self.assertEqual(pool.stats()['a']['state'], 'exhausted')
+        with self.assertRaises(TimeoutError):
+            pool.acquire(timeout=0.05)
+        # The next period has a new quota
+        account = pool.acquire(timeout=1)
+        self.assertEqual(account.used, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
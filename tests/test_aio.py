@@ -0,0 +1,191 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the AsyncFFIEC_Client class in ffipy.aio
+# ------------------------------------------------------------------------------
+
+import unittest
+import asyncio
+import base64
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from ffipy.aio import AsyncFFIEC_Client, AsyncTransport
+from ffipy.cache import FacsimileCache
+from ffipy.metrics import Metrics
+
+from tests.utils import FakeTransport, seed_cache, soap_response, soap_fault
+
+
+class FakeAsyncTransport(AsyncTransport):
+    """An AsyncTransport replying with the canned responses of FakeTransport."""
+
+    def __init__(self, replies):
+        AsyncTransport.__init__(self, cache=seed_cache())
+        self.fake = FakeTransport(replies)
+
+    async def post_xml(self, address, envelope, headers):
+        await asyncio.sleep(0)
+        return self.fake.post_xml(address, envelope, headers)
+
+
+def reply(operation, result):
+    return lambda message: (200, soap_response(operation, result))
+
+
+class AsyncFFIEC_Client_TestCase(unittest.TestCase):
+    def setUp(self):
+        pdf = base64.b64encode(b'%PDF').decode()
+        self.transport = FakeAsyncTransport({
+            'TestUserAccess': reply('TestUserAccess', 'true'),
+            'RetrieveFacsimile': reply('RetrieveFacsimile', pdf),
+            'RetrieveUBPRXBRLFacsimile':
+                lambda message: (500, soap_fault('No such filer')),
+            'RetrieveReportingPeriods':
+                reply('RetrieveReportingPeriods',
+                      '<string>3/31/2017</string><string>6/30/2017</string>'),
+            'RetrieveFilersSinceDate':
+                reply('RetrieveFilersSinceDate', '<int>1</int><int>2</int>'),
+        })
+        self.client = AsyncFFIEC_Client(wsse=('user', 'token'),
+                                        transport=self.transport)
+
+    def test_coroutines(self):
+        async def main():
+            async with self.client as client:
+                return await asyncio.gather(
+                    client.test_user_access(),
+                    client.retrieve_facsimile(),
+                    client.retrieve_reporting_periods(),
+                    client.retrieve_filers_since_date())
+
+        access, facsimile, periods, filers = asyncio.run(main())
+        self.assertTrue(access)
+        self.assertEqual(facsimile, b'%PDF')
+        self.assertEqual(periods, ['3/31/2017', '6/30/2017'])
+        self.assertEqual(filers, [1, 2])
+
+    def test_bulk(self):
+        async def main():
+            requests = [('Call', '3/31/2017', 'ID_RSSD', fiID, 'PDF')
+                        for fiID in range(10)]
+            return [r async for r in self.client.retrieve_facsimiles(
+                requests, max_workers=3)]
+
+        results = asyncio.run(main())
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(r.result == b'%PDF' for r in results))
+
+    def test_bulk_errors(self):
+        async def main():
+            requests = [('3/31/2017', 'ID_RSSD', 1)]
+            return [r async for r in self.client.retrieve_ubpr_xbrl_facsimiles(
+                requests, retries=0)]
+
+        result, = asyncio.run(main())
+        self.assertIsNotNone(result.error)
+
+    def test_bulk_retries_counted(self):
+        metrics = Metrics()
+        client = AsyncFFIEC_Client(wsse=('user', 'token'),
+                                   transport=self.transport, metrics=metrics)
+
+        async def main():
+            requests = [('3/31/2017', 'ID_RSSD', 1)]
+            return [r async for r in client.retrieve_ubpr_xbrl_facsimiles(
+                requests, retries=1)]
+
+        with patch('ffipy.aio.backoff_delay', return_value=0):
+            result, = asyncio.run(main())
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(metrics.counter(
+            'ffipy_retries_total', operation='RetrieveUBPRXBRLFacsimile'), 1)
+
+    def test_invalid_fiID(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(self.client.retrieve_facsimile(fiID='37; DROP'))
+        with self.assertRaises(ValueError):
+            asyncio.run(self.client.retrieve_ubpr_xbrl_facsimile(fiID=''))
+        self.assertEqual(self.transport.fake.posted, [])
+
+    def test_bulk_window(self):
+        started = []
+        client = self.client
+
+        async def retrieve_facsimile(*request, outfile=None,
+                                     return_result=True):
+            started.append(request[3])
+            await asyncio.sleep(0)
+            return request[3]
+
+        def requests():
+            for fiID in range(100):
+                # Requests are taken only as the window has room
+                self.assertLessEqual(len(started), fiID)
+                self.assertGreaterEqual(len(started), fiID - 2 * 3)
+                yield ('Call', '3/31/2017', 'ID_RSSD', fiID, 'PDF')
+
+        async def main():
+            with patch.object(client, 'retrieve_facsimile',
+                              retrieve_facsimile):
+                return [r async for r in client.retrieve_facsimiles(
+                    requests(), max_workers=3)]
+
+        results = asyncio.run(main())
+        self.assertEqual(sorted(r.result for r in results), list(range(100)))
+
+    def test_shared_state(self):
+        metrics = Metrics()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        cache = FacsimileCache(os.path.join(tmpdir, 'facsimiles.db'))
+        client = AsyncFFIEC_Client(wsse=('user', 'token'),
+                                   transport=self.transport, metrics=metrics,
+                                   facsimile_cache=cache)
+        self.assertTrue(client.wsdl_documents)
+        client.invalidate()
+        with self.assertRaises(TypeError):
+            pickle.dumps(client)
+        with self.assertRaises(TypeError):
+            client.snapshot()
+
+        # The cache's sqlite I/O runs off the event loop's thread
+        threads = []
+        get, add = cache.get, cache.add
+
+        def cache_get(key):
+            threads.append(threading.get_ident())
+            return get(key)
+
+        def cache_add(*args):
+            threads.append(threading.get_ident())
+            return add(*args)
+
+        async def main():
+            for _ in range(2):
+                await client.retrieve_facsimile(fiID=' 1')
+
+        with patch.object(cache, 'get', cache_get), \
+                patch.object(cache, 'add', cache_add):
+            asyncio.run(main())
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual(self.transport.fake.posted, ['RetrieveFacsimile'])
+        self.assertEqual(metrics.counter(
+            'ffipy_calls_total', operation='RetrieveFacsimile',
+            ds_name='Call'), 1)
+
+    def test_no_login_prompt(self):
+        missing = os.path.join(os.curdir, 'no-such-ffiec-conf')
+        with patch.dict(os.environ, {'FFIEC_USER_CONF': missing}), \
+                patch('builtins.input') as mock_input:
+            with self.assertRaises(ValueError):
+                AsyncFFIEC_Client(transport=self.transport)
+            mock_input.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
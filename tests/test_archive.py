@@ -0,0 +1,102 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the partitioned columnar archive in ffipy.archive
+# ------------------------------------------------------------------------------
+
+import unittest
+import os
+import shutil
+import tempfile
+from array import array
+
+from ffipy.archive import Archive
+from ffipy.parse import Filing, build_panel, parse_facsimiles
+
+from tests.stub_server import sdf
+
+
+def filings(period, fiIDs, **extra):
+    return [Filing(fiID, period, dict({'RCON0001': float(fiID),
+                                       'RCON0002': fiID * 2.0}, **extra))
+            for fiID in fiIDs]
+
+
+class Archive_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.archive = Archive(os.path.join(self.tmpdir, 'archive'))
+
+    def test_round_trip(self):
+        panel = parse_facsimiles([sdf(fiID, 5) for fiID in (30, 10, 20)] +
+                                 [sdf(10, 5, date='20161231')])
+        self.assertEqual(sorted(self.archive.write(panel)),
+                         ['12/31/2016', '3/31/2017'])
+        self.assertEqual(self.archive.ds_names(), ['Call'])
+        self.assertEqual(self.archive.periods(), ['12/31/2016', '3/31/2017'])
+
+        scanned = self.archive.scan()
+        self.assertEqual(len(scanned), 4)
+        self.assertEqual(list(scanned.id_rssd), [10, 10, 20, 30])
+        self.assertEqual(scanned.period, ['12/31/2016'] + ['3/31/2017'] * 3)
+        self.assertEqual(scanned.items, panel.items)
+        for id_rssd, period in zip(scanned.id_rssd, scanned.period):
+            self.assertEqual(scanned.row(id_rssd, period),
+                             panel.row(id_rssd, period))
+
+    def test_projection_and_pushdown(self):
+        self.archive.append(filings('3/31/2017', range(1, 101),
+                                    RCON9999='text'))
+        self.archive.append(filings('6/30/2017', range(50, 60)))
+        scanned = self.archive.scan(columns=['RCON0002', 'RCON9999'],
+                                    id_rssd=[55, 5, 1000])
+        self.assertEqual(scanned.items, ['RCON0002', 'RCON9999'])
+        self.assertEqual(list(scanned.id_rssd), [5, 55, 55])
+        self.assertEqual(scanned.period,
+                         ['3/31/2017', '3/31/2017', '6/30/2017'])
+        self.assertEqual(list(scanned['RCON0002']), [10.0, 110.0, 110.0])
+        self.assertEqual(scanned['RCON9999'], ['text', 'text', None])
+
+        scanned = self.archive.scan(id_rssd=5, periods=['2017-06-30'])
+        self.assertEqual(len(scanned), 0)
+
+        with self.archive.partition('Call', '3/31/2017') as partition:
+            self.assertEqual(partition.find([1000]), [])
+            self.assertEqual(partition.find([1, 100]), [0, 99])
+            self.assertIsInstance(partition.column('RCON0001'), memoryview)
+            self.assertFalse(partition.is_numeric('RCON9999'))
+
+    def test_append_leaves_other_periods(self):
+        self.archive.append(filings('3/31/2017', [1, 2]))
+        partition = self.archive.partition('Call', '3/31/2017')
+        meta = os.path.join(partition.path, 'meta.json')
+        written = os.stat(meta).st_mtime_ns
+        self.archive.append(filings('6/30/2017', [1, 2]), ds_name='Call')
+        self.archive.append(filings('6/30/2017', [3]), ds_name='UBPR')
+        self.assertEqual(os.stat(meta).st_mtime_ns, written)
+        self.assertEqual(self.archive.periods(), ['3/31/2017', '6/30/2017'])
+        self.assertEqual(self.archive.ds_names(), ['Call', 'UBPR'])
+
+    def test_merge_and_replace(self):
+        self.archive.append(filings('3/31/2017', [1, 2, 3]))
+        self.archive.append([Filing(2, '3/31/2017', {'RCON0001': -1.0})])
+        scanned = self.archive.scan()
+        self.assertEqual(list(scanned.id_rssd), [1, 2, 3])
+        self.assertEqual(scanned.row(2, '3/31/2017'), {'RCON0001': -1.0})
+        self.assertEqual(scanned.row(3, '3/31/2017'),
+                         {'RCON0001': 3.0, 'RCON0002': 6.0})
+
+        self.archive.append(filings('3/31/2017', [4]), replace=True)
+        self.assertEqual(list(self.archive.scan().id_rssd), [4])
+
+    def test_numeric_columns_stay_arrays(self):
+        self.archive.write(build_panel(filings('3/31/2017', [1, 2])))
+        scanned = self.archive.scan()
+        self.assertIsInstance(scanned['RCON0001'], array)
+        self.assertEqual(list(scanned['RCON0002']), [2.0, 4.0])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the checkpointed backfill planner in ffipy.backfill
+# ------------------------------------------------------------------------------
+
+import unittest
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+
+from ffipy.archive import Archive
+from ffipy.backfill import (Backfill, BackfillProgress, format_progress,
+                            main, outdir_outfile)
+
+from tests.stub_server import StubServer
+
+PERIODS = ['12/31/2016', '3/31/2017']
+
+
+class Backfill_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubServer(panel_size=10, pdf_size=1024, items=5).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = os.path.join(self.tmpdir, 'backfill.db')
+        self.outfile = outdir_outfile(os.path.join(self.tmpdir, 'out'))
+        self.client = self.stub.client()
+        self.stub.calls.clear()
+
+    def backfill(self, **kwargs):
+        kwargs.setdefault('outfile', self.outfile)
+        return Backfill(self.client, self.db, periods=PERIODS, retries=0,
+                        checkpoint=4, **kwargs)
+
+    def test_plan_order_and_skip_present(self):
+        path = self.outfile(('Call', '3/31/2017', 'ID_RSSD', 1, 'PDF'))
+        with open(path, 'wb') as f:
+            f.write(b'%PDF')
+        backfill = self.backfill()
+        # Filer 10 has not filed and is left out
+        self.assertEqual(backfill.plan(), 18)
+        self.assertEqual(backfill.plan(), 0)
+        pending = list(backfill.state.pending(page_size=5))
+        self.assertEqual(len(pending), 17)
+        self.assertEqual([key[1] for key in pending[:8]], ['3/31/2017'] * 8)
+        self.assertEqual(pending[0], ('Call', '3/31/2017', 2))
+        self.assertEqual(self.stub.calls['RetrievePanelOfReporters'], 2)
+
+    def test_run_and_resume(self):
+        progress = self.backfill().run(limit=5)
+        self.assertEqual((progress.done, progress.pending), (5, 13))
+        # A new run, e.g. after a crash, picks up the rest
+        seen = []
+        progress = self.backfill().run(callback=seen.append)
+        self.assertEqual(progress[:4], (18, 0, 0, 18))
+        self.assertEqual(seen[-1], progress)
+        self.assertEqual(self.stub.calls['RetrieveFacsimile'], 18)
+        self.assertEqual(self.stub.calls['RetrievePanelOfReporters'], 2)
+        self.assertTrue(os.path.exists(self.outfile(
+            ('Call', '12/31/2016', 'ID_RSSD', 9, 'PDF'))))
+
+    def test_failed_items_are_retried(self):
+        self.stub.fault_rate = 1.0
+        self.stub.fault_operations = {'RetrieveFacsimile'}
+        try:
+            progress = self.backfill().run()
+        finally:
+            self.stub.fault_rate = 0.0
+            self.stub.fault_operations = None
+        self.assertEqual((progress.done, progress.failed), (0, 18))
+        self.assertEqual(len(self.backfill().state.failures()), 18)
+        progress = self.backfill().run()
+        self.assertEqual((progress.done, progress.failed), (18, 0))
+
+    def test_archive(self):
+        archive = Archive(os.path.join(self.tmpdir, 'archive'))
+        writes = []
+        write = archive.write
+
+        def counted(panel, ds_name='Call', replace=False):
+            writes.append(len(panel))
+            return write(panel, ds_name, replace)
+
+        archive.write = counted
+        progress = self.backfill(outfile=None, archive=archive,
+                                 facsimile_fmt='SDF').run()
+        self.assertEqual(progress.done, 18)
+        # Each period's partition is written once, not at every checkpoint
+        self.assertEqual(writes, [9, 9])
+        self.assertEqual(archive.periods(), PERIODS)
+        self.assertEqual(len(archive.scan()), 18)
+
+    def test_main(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            status = main(['--db', self.db, '--outdir',
+                           os.path.join(self.tmpdir, 'out'), '--periods']
+                          + PERIODS, client=self.client)
+        self.assertEqual(status, 0)
+        self.assertIn('18/18 done, 0 failed, 0 pending', out.getvalue())
+
+    def test_main_archive_format(self):
+        archive = os.path.join(self.tmpdir, 'archive')
+        with redirect_stdout(io.StringIO()):
+            status = main(['--db', self.db, '--archive', archive,
+                           '--periods', PERIODS[0]], client=self.client)
+        self.assertEqual(status, 0)
+        self.assertEqual(len(Archive(archive).scan()), 9)
+
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            main(['--db', self.db, '--archive', archive, '--format', 'PDF'],
+                 client=self.client)
+        with self.assertRaises(ValueError):
+            self.backfill(outfile=None, archive=Archive(archive))
+
+    def test_format_progress(self):
+        self.assertEqual(
+            format_progress(BackfillProgress(5, 1, 3600, 3606, 1.0, 3600.0)),
+            '5/3606 done, 1 failed, 3600 pending, 1.0/s, ETA 1:00:00')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the bulk retrieval methods of FFIEC_Client
+# ------------------------------------------------------------------------------
+
+import unittest
+import base64
+import os
+import re
+import shutil
+import tempfile
+
+from tests.utils import offline_client, soap_response, soap_fault
+
+
+def facsimile_reply(operation):
+    """Replies with the fiID as the facsimile; fiID 0 always faults."""
+    def reply(message):
+        fiID = int(re.search(rb'<ns0:fiID>(\d+)<', message).group(1))
+        if fiID == 0:
+            return 500, soap_fault('Invalid fiID')
+        content = base64.b64encode(b'facsimile %d' % fiID).decode()
+        return 200, soap_response(operation, content)
+    return reply
+
+
+class Bulk_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = offline_client({
+            'RetrieveFacsimile': facsimile_reply('RetrieveFacsimile'),
+            'RetrieveUBPRXBRLFacsimile':
+                facsimile_reply('RetrieveUBPRXBRLFacsimile'),
+        })
+        self.tmpdir = tempfile.mkdtemp()
+
+    def test_retrieve_facsimiles(self):
+        requests = [('Call', '3/31/2017', 'ID_RSSD', fiID, 'PDF')
+                    for fiID in range(1, 21)]
+        results = list(self.client.retrieve_facsimiles(requests,
+                                                       max_workers=3))
+        self.assertEqual(len(results), 20)
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(result.result,
+                             b'facsimile %d' % result.request[3])
+
+    def test_bad_request_does_not_abort(self):
+        requests = [('Call', '3/31/2017', 'ID_RSSD', fiID, 'PDF')
+                    for fiID in (1, 0, 2)]
+        results = {r.request[3]: r for r in self.client.retrieve_facsimiles(
+            requests, retries=1, max_workers=1)}
+        self.assertEqual(results[1].result, b'facsimile 1')
+        self.assertEqual(results[2].result, b'facsimile 2')
+        self.assertIsNotNone(results[0].error)
+        self.assertEqual(results[0].attempts, 2)
+
+    def test_invalid_argument_not_retried(self):
+        requests = [('Call', '3/31/2017', 'ID_RSSD', 'abc', 'PDF')]
+        result, = self.client.retrieve_facsimiles(requests, retries=3)
+        self.assertIsInstance(result.error, ValueError)
+        self.assertIn('Invalid fiID', str(result.error))
+        self.assertEqual(result.attempts, 1)
+        # Rejected before anything is sent
+        self.assertEqual(self.client.transport.posted, [])
+
+    def test_outfile_error(self):
+        def outfile(request):
+            if request[3] == 2:
+                raise OSError('No space left on device')
+            return os.path.join(self.tmpdir, '%d.pdf' % request[3])
+
+        requests = [('Call', '3/31/2017', 'ID_RSSD', fiID, 'PDF')
+                    for fiID in (1, 2, 3)]
+        results = {r.request[3]: r for r in self.client.retrieve_facsimiles(
+            requests, outfile=outfile, return_result=False)}
+        self.assertIsInstance(results[2].error, OSError)
+        self.assertEqual(results[2].attempts, 0)
+        self.assertIsNone(results[1].error)
+        self.assertIsNone(results[3].error)
+        self.assertEqual(self.client.transport.posted,
+                         ['RetrieveFacsimile'] * 2)
+
+    def test_fault_retried(self):
+        requests = [('Call', '3/31/2017', 'ID_RSSD', 0, 'PDF')]
+        result, = self.client.retrieve_facsimiles(requests, retries=1)
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(self.client.transport.posted,
+                         ['RetrieveFacsimile'] * 2)
+
+    def test_ubpr_outfiles(self):
+        def outfile(request):
+            return os.path.join(self.tmpdir, '%d.xbrl' % request[2])
+
+        requests = [('3/31/2017', 'ID_RSSD', fiID) for fiID in (5, 6)]
+        results = list(self.client.retrieve_ubpr_xbrl_facsimiles(
+            requests, outfile=outfile, return_result=False))
+        self.assertTrue(all(r.result is None and r.error is None
+                            for r in results))
+        with open(outfile(requests[0]), 'rb') as f:
+            self.assertEqual(f.read(), b'facsimile 5')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
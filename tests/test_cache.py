@@ -0,0 +1,203 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the WSDL and facsimile caches of FFIEC_Client
+# ------------------------------------------------------------------------------
+
+import unittest
+import base64
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from ffipy import FFIEC_Client
+from ffipy.cache import FacsimileCache, MemoCache, PeriodTTL, WSDLCache
+
+from tests.utils import (OfflineTransport, offline_client, seed_cache,
+                         soap_response)
+
+
+class WSDLCache_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmpdir, 'wsdl.db')
+
+    def test_client_starts_offline(self):
+        cache = seed_cache(self.cache_path)
+        transport = OfflineTransport(cache=cache)
+        client = FFIEC_Client(wsse=('user', 'token'), transport=transport,
+                              check_login=False)
+        self.assertEqual(client.wsse.username, 'user')
+        self.assertEqual(client.get_type('ns0:FacsimileFormat')('PDF'), 'PDF')
+
+    def test_default_cache_dir(self):
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        with patch.dict(os.environ, {'FFIEC_CACHE_DIR': cache_dir}):
+            cache = WSDLCache()
+        self.assertEqual(os.path.dirname(cache.path), cache_dir)
+
+    def test_other_version_is_miss(self):
+        cache = seed_cache(self.cache_path)
+        with patch.object(WSDLCache, '_version', 'ffipy-0.0.0'):
+            other = WSDLCache(path=self.cache_path, timeout=None)
+            self.assertIsNone(other.get(FFIEC_Client.wsdl))
+        self.assertIsNotNone(cache.get(FFIEC_Client.wsdl))
+
+    def test_stale_is_miss(self):
+        seed_cache(self.cache_path)
+        stale = WSDLCache(path=self.cache_path, timeout=-1)
+        self.assertIsNone(stale.get(FFIEC_Client.wsdl))
+
+    def test_clear(self):
+        cache = seed_cache(self.cache_path)
+        cache.clear()
+        self.assertIsNone(cache.get(FFIEC_Client.wsdl))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class FacsimileCache_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmpdir, 'facsimiles.db')
+
+    def test_client_uses_cache(self):
+        cache = FacsimileCache(path=self.cache_path)
+        pdf = base64.b64encode(b'%PDF-1.4').decode()
+        client = offline_client(
+            {'RetrieveFacsimile':
+             lambda message: (200, soap_response('RetrieveFacsimile', pdf))},
+            facsimile_cache=cache)
+        self.assertEqual(client.retrieve_facsimile(), b'%PDF-1.4')
+        self.assertEqual(client.retrieve_facsimile(), b'%PDF-1.4')
+        self.assertEqual(client.transport.posted, ['RetrieveFacsimile'])
+
+        # A different request tuple is a miss
+        client.retrieve_facsimile(fiID=1)
+        self.assertEqual(len(client.transport.posted), 2)
+
+    def test_lru_eviction(self):
+        content = os.urandom(1000)  # incompressible
+        cache = FacsimileCache(path=self.cache_path, max_size=2500)
+        cache.add('a', content)
+        cache.add('b', content)
+        cache.get('a')
+        cache.add('c', content)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.size, 2500)
+
+    def test_period_ttl(self):
+        ttl = PeriodTTL(open_days=400, ttl=60)
+        self.assertIsNone(ttl('3/31/2001'))
+        recent = datetime.now().strftime('%m/%d/%Y')
+        self.assertEqual(ttl(recent), 60)
+
+        cache = FacsimileCache(path=self.cache_path,
+                               ttl=PeriodTTL(ttl=-1))
+        cache.add('open', b'x', recent)
+        cache.add('closed', b'x', '3/31/2001')
+        self.assertIsNone(cache.get('open'))
+        self.assertEqual(cache.get('closed'), b'x')
+
+    def test_shared_between_processes(self):
+        FacsimileCache(path=self.cache_path).add('key', b'content')
+        with multiprocessing.get_context('spawn').Pool(2) as pool:
+            results = pool.map(_cache_get, [(self.cache_path, 'key')] * 2)
+        self.assertEqual(results, [b'content'] * 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class MemoCache_TestCase(unittest.TestCase):
+    def periods_client(self, delay=0.0, **kwargs):
+        def reply(message):
+            time.sleep(delay)
+            return 200, soap_response('RetrieveReportingPeriods',
+                                      '<string>3/31/2017</string>')
+        return offline_client({'RetrieveReportingPeriods': reply}, **kwargs)
+
+    def test_client_memoizes(self):
+        client = self.periods_client()
+        dates = client.retrieve_reporting_periods()
+        self.assertEqual(dates, ['3/31/2017'])
+        dates.append('12/31/2016')
+        self.assertEqual(client.retrieve_reporting_periods(), ['3/31/2017'])
+        self.assertEqual(client.transport.posted,
+                         ['RetrieveReportingPeriods'])
+
+        # Other args are a miss
+        client.retrieve_reporting_periods('UBPR')
+        self.assertEqual(len(client.transport.posted), 2)
+
+    def test_invalidate(self):
+        client = self.periods_client()
+        client.retrieve_reporting_periods()
+        client.invalidate('retrieve_reporting_periods', 'Call')
+        client.retrieve_reporting_periods()
+        client.invalidate()
+        client.retrieve_reporting_periods()
+        self.assertEqual(len(client.transport.posted), 3)
+
+    def test_ttl(self):
+        client = self.periods_client(
+            memo_ttls={'retrieve_reporting_periods': 0.05})
+        client.retrieve_reporting_periods()
+        client.retrieve_reporting_periods()
+        time.sleep(0.1)
+        client.retrieve_reporting_periods()
+        self.assertEqual(len(client.transport.posted), 2)
+
+        # Not memoized
+        client = self.periods_client(memo_ttls={})
+        client.retrieve_reporting_periods()
+        client.retrieve_reporting_periods()
+        self.assertEqual(len(client.transport.posted), 2)
+
+    def test_single_flight(self):
+        client = self.periods_client(delay=0.1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            client.retrieve_reporting_periods())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [['3/31/2017']] * 8)
+        self.assertEqual(client.transport.posted,
+                         ['RetrieveReportingPeriods'])
+
+    def test_errors_not_cached(self):
+        memo = MemoCache()
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise ValueError('failed')
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                memo.get(('method',), 60, fail)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(memo), 0)
+
+    def test_get_type_cached(self):
+        client = offline_client()
+        self.assertIs(client.get_type('ns0:FacsimileFormat'),
+                      client.get_type('ns0:FacsimileFormat'))
+        self.assertIn('ns0:FacsimileFormat', client.xsd_types)
+
+
+def _cache_get(args):
+    path, key = args
+    return FacsimileCache(path=path).get(key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the amendment fingerprints and deltas in ffipy.diff
+# ------------------------------------------------------------------------------
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from ffipy.diff import FingerprintStore, apply_delta, diff, fingerprint
+from ffipy.parse import Filing, parse_facsimile
+
+from tests.stub_server import sdf
+
+
+class Diff_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = FingerprintStore(os.path.join(self.tmpdir, 'fp.db'))
+
+    def test_fingerprint(self):
+        values = {'RCON0001': 1.0, 'RCON0002': 2.0, 'RIAD0001': 'x'}
+        fp = fingerprint(values)
+        self.assertEqual(sorted(fp.sections), ['RCON', 'RIAD'])
+        self.assertEqual(fingerprint(dict(reversed(list(values.items())))),
+                         fp)
+        other = fingerprint(dict(values, RIAD0001='y'))
+        self.assertEqual(other.sections['RCON'], fp.sections['RCON'])
+        self.assertNotEqual(other.digest, fp.digest)
+        self.assertEqual(diff(fp, other, dict(values, RIAD0001='y')),
+                         ({'RIAD0001': 'y'}, ()))
+
+    def test_amendment_delta(self):
+        facsimile = sdf(37, 50)
+        filing = parse_facsimile(facsimile)
+        first = self.store.update(filing, facsimile=facsimile)
+        self.assertFalse(first.previous)
+        self.assertEqual(first.changed, filing.values)
+        self.assertTrue(self.store.unchanged('Call', '3/31/2017', 37,
+                                             facsimile))
+
+        values = dict(filing.values, RCON0003=-1.0, RIAD9999=5.0)
+        del values['RCON0010']
+        amended = Filing(37, '20170331', values)
+        delta = self.store.update(amended)
+        self.assertTrue(delta.previous)
+        self.assertEqual(delta.period, '3/31/2017')
+        self.assertEqual(delta.changed, {'RCON0003': -1.0, 'RIAD9999': 5.0})
+        self.assertEqual(delta.removed, ('RCON0010',))
+        self.assertEqual(apply_delta(filing.values, delta), values)
+        self.assertFalse(self.store.unchanged('Call', '3/31/2017', 37,
+                                              facsimile))
+
+        # Refiling the same values is an empty delta
+        delta = self.store.update(amended)
+        self.assertEqual((delta.changed, delta.removed), ({}, ()))
+
+        # Other data series are stored separately
+        self.assertFalse(self.store.update(amended, ds_name='UBPR').previous)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
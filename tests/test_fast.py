@@ -0,0 +1,79 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the lxml fast path of ffipy.fast
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from zeep.exceptions import Fault
+
+from ffipy.fast import FilerSubmission, Reporter
+from ffipy.panel import FIELDS
+
+from tests.utils import (offline_client, panel_result, reporter, soap_fault,
+                         soap_response)
+
+
+def reply(operation, result):
+    return lambda message: (200, soap_response(operation, result))
+
+
+class Fast_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.reporters = [reporter(i, has_filed=i % 2 == 0)
+                          for i in range(1, 50)]
+        self.client = offline_client({
+            'RetrievePanelOfReporters':
+                reply('RetrievePanelOfReporters',
+                      panel_result(self.reporters)),
+            'RetrieveFilersSubmissionDateTime':
+                reply('RetrieveFilersSubmissionDateTime',
+                      '<RetrieveFilersDateTime><ID_RSSD>7</ID_RSSD>'
+                      '<DateTime>4/20/2017 10:00:00 AM</DateTime>'
+                      '</RetrieveFilersDateTime>'),
+            'RetrieveFilersSinceDate':
+                reply('RetrieveFilersSinceDate',
+                      '<int>7</int><int>8</int>'),
+        })
+
+    def test_panel_of_reporters(self):
+        raw = self.client.retrieve_panel_of_reporters(raw=True)
+        zeep = self.client.retrieve_panel_of_reporters()
+        self.assertEqual(len(raw), len(zeep))
+        self.assertIsInstance(raw[0], Reporter)
+        for r, z in zip(raw, zeep):
+            for field in FIELDS:
+                self.assertEqual(r[field], z[field])
+        self.assertEqual(raw[0].Name, 'BANK 1')
+        self.assertEqual(raw[0][0], 1)
+
+    def test_filers_submission_datetime(self):
+        filers = self.client.retrieve_filers_submission_datetime(raw=True)
+        self.assertEqual(filers, [FilerSubmission(7, '4/20/2017 10:00:00 AM')])
+        self.assertEqual(filers[0]['DateTime'], '4/20/2017 10:00:00 AM')
+        with self.assertRaises(KeyError):
+            filers[0]['Name']
+
+    def test_filers_since_date(self):
+        self.assertEqual(self.client.retrieve_filers_since_date(raw=True),
+                         self.client.retrieve_filers_since_date())
+
+    def test_fallback_on_schema_mismatch(self):
+        result = panel_result([reporter(1)]).replace(
+            '<ZIP>', '<County>X</County><ZIP>')
+        client = offline_client({'RetrievePanelOfReporters':
+                                 reply('RetrievePanelOfReporters', result)},
+                                strict=False)
+        reporters = client.retrieve_panel_of_reporters(raw=True)
+        self.assertNotIsInstance(reporters[0], Reporter)
+        self.assertEqual(reporters[0]['ID_RSSD'], 1)
+
+    def test_fault(self):
+        self.client.transport.replies['RetrieveFilersSinceDate'] = \
+            lambda message: (500, soap_fault('Throttled'))
+        with self.assertRaises(Fault):
+            self.client.retrieve_filers_since_date(raw=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
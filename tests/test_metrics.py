@@ -0,0 +1,158 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the metrics of FFIEC_Client in ffipy.metrics
+# ------------------------------------------------------------------------------
+
+import unittest
+import base64
+import io
+from datetime import timedelta
+
+import requests
+
+from ffipy import FFIEC_Client
+from ffipy.metrics import Metrics
+
+from tests.utils import (FakeTransport, offline_client, seed_cache,
+                         soap_response, soap_fault)
+
+
+class Metrics_TestCase(unittest.TestCase):
+    def test_counters_and_histograms(self):
+        seen = []
+        metrics = Metrics(buckets=(0.1, 1),
+                          callback=lambda *args: seen.append(args))
+        metrics.inc('ffipy_calls_total', operation='Op', ds_name=None)
+        metrics.inc('ffipy_calls_total', 2, operation='Op')
+        metrics.observe('ffipy_call_seconds', 0.5, operation='Op')
+        metrics.observe('ffipy_call_seconds', 2, operation='Op')
+        self.assertEqual(metrics.counter('ffipy_calls_total', operation='Op'),
+                         3)
+        self.assertEqual(metrics.histogram('ffipy_call_seconds',
+                                           operation='Op'), (2, 2.5))
+        self.assertEqual(len(seen), 4)
+
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE ffipy_calls_total counter\n'
+                      'ffipy_calls_total{operation="Op"} 3\n', text)
+        self.assertIn('ffipy_call_seconds_bucket{operation="Op",le="0.1"} 0\n'
+                      'ffipy_call_seconds_bucket{operation="Op",le="1.0"} 1\n'
+                      'ffipy_call_seconds_bucket{operation="Op",le="+Inf"} 2\n'
+                      'ffipy_call_seconds_sum{operation="Op"} 2.5\n'
+                      'ffipy_call_seconds_count{operation="Op"} 2\n', text)
+
+        metrics.clear()
+        self.assertEqual(metrics.counter('ffipy_calls_total', operation='Op'),
+                         0)
+
+    def test_response_hook(self):
+        metrics = Metrics()
+        request = requests.Request(
+            'POST', 'https://example.com/', data=b'x' * 10,
+            headers={'SOAPAction': '"http://cdr.ffiec.gov/public/services/'
+                                   'RetrieveFacsimile"'}).prepare()
+        response = requests.Response()
+        response.request = request
+        # The compressed size, which is not what is counted
+        response.headers['Content-Length'] = '7'
+        response.raw = io.BytesIO(b'y' * 25)
+        response.elapsed = timedelta(seconds=0.2)
+        metrics.response_hook(response)
+        self.assertEqual(metrics.counter('ffipy_request_bytes_total',
+                                         operation='RetrieveFacsimile'), 10)
+        # Bytes are counted as the body is read
+        self.assertEqual(metrics.counter('ffipy_response_bytes_total',
+                                         operation='RetrieveFacsimile'), 0)
+        self.assertEqual(response.content, b'y' * 25)
+        self.assertEqual(metrics.counter('ffipy_response_bytes_total',
+                                         operation='RetrieveFacsimile'), 25)
+        self.assertEqual(metrics.histogram('ffipy_http_seconds',
+                                           operation='RetrieveFacsimile'),
+                         (1, 0.2))
+
+        # A chunked response has no Content-Length; streamed reads count too
+        response = requests.Response()
+        response.request = request
+        response.raw = io.BytesIO(b'z' * 15)
+        response.elapsed = timedelta(seconds=0.1)
+        metrics.response_hook(response)
+        self.assertEqual(len(list(response.iter_content(4))), 4)
+        self.assertEqual(metrics.counter('ffipy_response_bytes_total',
+                                         operation='RetrieveFacsimile'), 40)
+
+
+class Client_TestCase(unittest.TestCase):
+    def setUp(self):
+        def facsimile(message):
+            if b'<ns0:fiID>0<' in message:
+                return 500, soap_fault('Invalid fiID')
+            return 200, soap_response('RetrieveFacsimile',
+                                      base64.b64encode(b'PDF').decode())
+
+        def periods(message):
+            return 200, soap_response('RetrieveReportingPeriods',
+                                      '<string>3/31/2017</string>')
+
+        self.metrics = Metrics()
+        self.client = offline_client({'RetrieveFacsimile': facsimile,
+                                      'RetrieveReportingPeriods': periods},
+                                     metrics=self.metrics)
+
+    def test_client_metrics(self):
+        metrics = self.metrics
+        self.assertEqual(metrics.histogram('ffipy_wsdl_load_seconds')[0], 1)
+
+        outfile = io.BytesIO()
+        self.client.retrieve_facsimile(fiID=1, outfile=outfile)
+        labels = {'operation': 'RetrieveFacsimile', 'ds_name': 'Call'}
+        self.assertEqual(metrics.counter('ffipy_calls_total', **labels), 1)
+        self.assertEqual(metrics.histogram('ffipy_call_seconds',
+                                           **labels)[0], 1)
+        self.assertEqual(metrics.histogram(
+            'ffipy_soap_seconds', operation='RetrieveFacsimile')[0], 1)
+        self.client.retrieve_reporting_periods()
+        self.assertEqual(metrics.histogram(
+            'ffipy_soap_seconds', operation='RetrieveReportingPeriods')[0], 1)
+        self.assertEqual(metrics.histogram(
+            'ffipy_get_type_seconds', type='ns0:ReportingDataSeriesName')[0],
+            1)
+        self.assertEqual(metrics.counter('ffipy_write_bytes_total',
+                                         operation='RetrieveFacsimile'), 3)
+
+        requests = [('Call', '3/31/2017', 'ID_RSSD', 0, 'PDF')]
+        result, = self.client.retrieve_facsimiles(requests, retries=1)
+        self.assertIsNotNone(result.error)
+        self.assertEqual(metrics.counter('ffipy_calls_total', **labels), 3)
+        self.assertEqual(metrics.counter('ffipy_faults_total', **labels), 2)
+        self.assertEqual(metrics.counter('ffipy_retries_total', **labels), 1)
+        self.assertIn('ffipy_faults_total{ds_name="Call",'
+                      'operation="RetrieveFacsimile"} 2',
+                      metrics.to_prometheus())
+
+    def test_transport_without_session(self):
+        def periods(message):
+            return 200, soap_response('RetrieveReportingPeriods',
+                                      '<string>3/31/2017</string>')
+
+        transport = FakeTransport({'RetrieveReportingPeriods': periods},
+                                  cache=seed_cache())
+        del transport.session
+        metrics = Metrics()
+        client = FFIEC_Client(wsse=('user', 'token'), transport=transport,
+                              check_login=False, metrics=metrics)
+        self.assertEqual(client.retrieve_reporting_periods(), ['3/31/2017'])
+        self.assertEqual(metrics.counter(
+            'ffipy_calls_total', operation='RetrieveReportingPeriods',
+            ds_name='Call'), 1)
+
+        # A session with no response hooks yet gets one
+        transport = FakeTransport({}, cache=seed_cache())
+        del transport.session.hooks['response']
+        FFIEC_Client(wsse=('user', 'token'), transport=transport,
+                     check_login=False, metrics=metrics)
+        self.assertEqual(transport.session.hooks['response'],
+                         [metrics.response_hook])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the ReporterPanel table in ffipy.panel
+# ------------------------------------------------------------------------------
+
+import unittest
+import pickle
+
+from ffipy.panel import ReporterPanel
+
+from tests.utils import offline_client, panel_result, reporter, soap_response
+
+
+class ReporterPanel_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.reporters = ([reporter(i, state='WY') for i in range(1, 4)]
+                          + [reporter(i, state='TX', filing_type='031')
+                             for i in range(4, 6)]
+                          + [reporter(6, state='TX', has_filed=False)])
+        self.panel = ReporterPanel(self.reporters, 'Call', '3/31/2017')
+
+    def test_rows(self):
+        self.assertEqual(len(self.panel), 6)
+        self.assertEqual(list(self.panel), self.reporters)
+        self.assertEqual(self.panel[2], self.reporters[1])
+        self.assertIn(6, self.panel)
+        self.assertNotIn(7, self.panel)
+
+    def test_lookup(self):
+        self.assertEqual(self.panel.lookup('FDICCertNumber', 1004)['ID_RSSD'],
+                         4)
+        self.assertEqual(self.panel.id_rssd('PrimaryABARoutNumber', 2005), 5)
+        self.assertIsNone(self.panel.id_rssd('FDICCertNumber', 1))
+        # Zero means the institution has no such identifier
+        self.assertIsNone(self.panel.lookup('OCCChartNumber', 0))
+        self.assertEqual(self.panel.lookup_all('OCCChartNumber', 0), [])
+        self.assertEqual(self.panel.lookup_all('ID_RSSD', 3),
+                         [self.reporters[2]])
+
+    def test_shared_identifiers(self):
+        # Affiliated banks may share a routing number
+        reporters = self.reporters + [dict(reporter(7),
+                                           PrimaryABARoutNumber=2005)]
+        panel = ReporterPanel(reporters, 'Call', '3/31/2017')
+        self.assertEqual(
+            [r['ID_RSSD'] for r in panel.lookup_all('PrimaryABARoutNumber',
+                                                    2005)], [5, 7])
+        with self.assertRaises(ValueError):
+            panel.id_rssd('PrimaryABARoutNumber', 2005)
+        with self.assertRaises(ValueError):
+            panel.lookup('PrimaryABARoutNumber', 2005)
+        self.assertEqual(panel.id_rssd('PrimaryABARoutNumber', 2004), 4)
+
+        # Identifiers that must be unique are checked
+        panel = ReporterPanel(reporters + [dict(reporter(8),
+                                                FDICCertNumber=1004)])
+        self.assertEqual(panel.lookup('ID_RSSD', 8)['FDICCertNumber'], 1004)
+        with self.assertRaises(ValueError):
+            panel.lookup('FDICCertNumber', 1004)
+
+    def test_filter(self):
+        tx = self.panel.filter(state='TX')
+        self.assertEqual(list(tx.columns['ID_RSSD']), [4, 5, 6])
+        self.assertEqual(
+            list(self.panel.filter(state='TX', filing_type='031')
+                 .columns['ID_RSSD']), [4, 5])
+        self.assertEqual(
+            list(self.panel.filter(state=['WY', 'TX'], has_filed=False)
+                 .columns['ID_RSSD']), [6])
+        self.assertEqual(len(self.panel.filter(state='CA')), 0)
+
+    def test_facsimile_requests(self):
+        requests = list(self.panel.filter(state='WY').facsimile_requests())
+        self.assertEqual(requests[0], ('Call', '3/31/2017', 'ID_RSSD', 1,
+                                       'PDF'))
+        self.assertEqual(len(requests), 3)
+
+    def test_pickle(self):
+        self.panel.index('State')
+        panel = pickle.loads(pickle.dumps(self.panel))
+        self.assertEqual(list(panel), self.reporters)
+        self.assertEqual(panel.id_rssd('FDICCertNumber', 1002), 2)
+
+    def test_client_caches_panel(self):
+        result = panel_result(self.reporters)
+        client = offline_client({
+            'RetrievePanelOfReporters': lambda message: (
+                200, soap_response('RetrievePanelOfReporters', result))})
+        panel = client.retrieve_reporter_panel()
+        self.assertEqual(list(panel), self.reporters)
+        self.assertIs(client.retrieve_reporter_panel(), panel)
+        self.assertEqual(client.transport.posted,
+                         ['RetrievePanelOfReporters'])
+        client.retrieve_reporter_panel(refresh=True)
+        self.assertEqual(len(client.transport.posted), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test parsing facsimiles into a panel with ffipy.parse
+# ------------------------------------------------------------------------------
+
+import unittest
+import math
+from array import array
+
+from ffipy.parse import (format_period, parse_facsimile, parse_facsimiles,
+                         parse_sdf, parse_xbrl)
+
+
+def sdf(id_rssd, values, date='20170331'):
+    lines = ['Call Date;Bank RSSD Identifier;MDRM #;Value;Last Update;'
+             'Short Definition;Call Schedule;Line Number']
+    for n, (item, value) in enumerate(values.items()):
+        lines.append('%s;%d;%s;%s;20170420;Item %d;RC;%d'
+                     % (date, id_rssd, item, value, n, n))
+    return '\r\n'.join(lines).encode('utf-8')
+
+
+def xbrl(id_rssd, values, date='2017-03-31'):
+    facts = ''.join('<cc:{0} contextRef="CI_{1}" unitRef="USD" '
+                    'decimals="0">{2}</cc:{0}>'.format(item, id_rssd, value)
+                    for item, value in values.items())
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<xbrl xmlns="http://www.xbrl.org/2003/instance" '
+            'xmlns:cc="http://www.ffiec.gov/xbrl/call/concepts" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            '<context id="CI_{0}"><entity><identifier '
+            'scheme="http://www.ffiec.gov/cdr">{0}</identifier></entity>'
+            '<period><instant>{1}</instant></period></context>'
+            '<unit id="USD"><measure>iso4217:USD</measure></unit>'
+            '{2}<cc:RCON9999 contextRef="CI_{0}" xsi:nil="true"/>'
+            '</xbrl>'.format(id_rssd, date, facts)).encode('utf-8')
+
+
+class Parse_TestCase(unittest.TestCase):
+    def test_parse_sdf(self):
+        filing = parse_sdf(sdf(64150, {'RCON2170': 1000, 'RCON9224': 'ABC'}))
+        self.assertEqual(filing.id_rssd, 64150)
+        self.assertEqual(filing.period, '3/31/2017')
+        self.assertEqual(filing.values, {'RCON2170': 1000.0,
+                                         'RCON9224': 'ABC'})
+
+    def test_parse_sdf_subset(self):
+        filing = parse_sdf(sdf(1, {'RCON2170': 1, 'RCON2948': 2}),
+                           items={'RCON2948'})
+        self.assertEqual(filing.values, {'RCON2948': 2.0})
+
+    def test_parse_xbrl(self):
+        filing = parse_xbrl(xbrl(64150, {'RCON2170': 1000, 'RCON2948': 5}))
+        self.assertEqual(filing.id_rssd, 64150)
+        self.assertEqual(filing.period, '3/31/2017')
+        self.assertEqual(filing.values, {'RCON2170': 1000.0,
+                                         'RCON2948': 5.0,
+                                         'RCON9999': None})
+
+    def test_parse_xbrl_other_contexts(self):
+        facsimile = xbrl(64150, {'RCON2170': 1000}).replace(
+            b'</xbrl>',
+            b'<context id="CI_PRIOR"><entity><identifier '
+            b'scheme="http://www.ffiec.gov/cdr">64150</identifier></entity>'
+            b'<period><instant>2016-12-31</instant></period></context>'
+            b'<context id="CI_SAME"><entity><identifier '
+            b'scheme="http://www.ffiec.gov/cdr">64150</identifier></entity>'
+            b'<period><instant>2017-03-31</instant></period></context>'
+            b'<cc:RCON2170 contextRef="CI_PRIOR" unitRef="USD" decimals="0">'
+            b'900</cc:RCON2170>'
+            b'<cc:RCON2948 contextRef="CI_SAME" unitRef="USD" decimals="0">'
+            b'7</cc:RCON2948></xbrl>')
+        filing = parse_xbrl(facsimile)
+        self.assertEqual((filing.id_rssd, filing.period),
+                         (64150, '3/31/2017'))
+        self.assertEqual(filing.values, {'RCON2170': 1000.0,
+                                         'RCON2948': 7.0,
+                                         'RCON9999': None})
+
+    def test_parse_facsimile_detects_format(self):
+        self.assertEqual(parse_facsimile(xbrl(1, {'A': 1})).values['A'], 1.0)
+        self.assertEqual(parse_facsimile(sdf(1, {'A': 2})).values['A'], 2.0)
+
+    def test_format_period(self):
+        self.assertEqual(format_period('20170331'), '3/31/2017')
+        self.assertEqual(format_period('2017-06-30'), '6/30/2017')
+        self.assertEqual(format_period('12/31/2016'), '12/31/2016')
+
+    def test_panel(self):
+        panel = parse_facsimiles([
+            sdf(1, {'RCON2170': 10, 'RCON2948': 4}),
+            xbrl(2, {'RCON2170': 20}),
+            sdf(1, {'RCON2170': 11}, date='20170630'),
+        ], items=['RCON2170', 'RCON2948'])
+        self.assertEqual(len(panel), 3)
+        self.assertEqual(panel.items, ['RCON2170', 'RCON2948'])
+        self.assertIsInstance(panel['RCON2170'], array)
+        self.assertEqual(list(panel['RCON2170']), [10.0, 20.0, 11.0])
+        self.assertTrue(math.isnan(panel['RCON2948'][1]))
+        self.assertEqual(panel.row(1, '6/30/2017'), {'RCON2170': 11.0})
+        self.assertEqual(panel.row(2, '3/31/2017'), {'RCON2170': 20.0})
+        with self.assertRaises(KeyError):
+            panel.row(3, '3/31/2017')
+
+    def test_identifiers_without_items(self):
+        for parse, facsimile in ((parse_sdf, sdf(7, {'RCON2170': 1})),
+                                 (parse_xbrl, xbrl(7, {'RCON2170': 1}))):
+            filing = parse(facsimile, items={'RIAD4340'})
+            self.assertEqual((filing.id_rssd, filing.period),
+                             (7, '3/31/2017'))
+            self.assertEqual(filing.values, {})
+        panel = parse_facsimiles([sdf(1, {'RCON2170': 1}),
+                                  xbrl(2, {'RCON2170': 2})],
+                                 items=['RIAD4340'])
+        self.assertEqual(len(panel), 2)
+
+    def test_interned_names(self):
+        a = parse_sdf(sdf(1, {'RCON' + '2170': 1}))
+        b = parse_sdf(sdf(2, {'RCON2' + '170': 2}))
+        self.assertIs(next(iter(a.values)), next(iter(b.values)))
+
+
+if __name__ == '__main__':
+    unittest.main()
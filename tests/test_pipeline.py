@@ -0,0 +1,84 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the download-and-parse pipeline in ffipy.pipeline
+# ------------------------------------------------------------------------------
+
+import unittest
+import os
+import tempfile
+
+from ffipy.pipeline import Pipeline
+
+from tests.stub_server import StubServer
+
+
+def requests(fiIDs, fmt='XBRL'):
+    return [('Call', '3/31/2017', 'ID_RSSD', fiID, fmt) for fiID in fiIDs]
+
+
+class Pipeline_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubServer(panel_size=10, pdf_size=1024, items=20).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def test_run(self):
+        pipeline = Pipeline(self.stub.client(), fetch_workers=3,
+                            parse_workers=2, queue_size=2,
+                            items={'RCON0001'}, tmpdir=self.tmpdir)
+        results = list(pipeline.run(requests(range(1, 9)) +
+                                    requests(range(9, 13), 'SDF')))
+        self.assertEqual(len(results), 12)
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(result.filing.id_rssd, result.request[3])
+            self.assertEqual(result.filing.values,
+                             {'RCON0001': result.request[3] + 1.0})
+        for stage in ('fetch', 'parse'):
+            stats = pipeline.stats[stage]
+            self.assertEqual(stats.items, 12)
+            self.assertGreater(stats.bytes, 0)
+            self.assertGreater(stats.throughput, 0)
+        # Temporary files are removed
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_repeated_requests(self):
+        # Each copy of a request is fetched into and parsed from its own file
+        pipeline = Pipeline(self.stub.client(), fetch_workers=4,
+                            parse_workers=2, tmpdir=self.tmpdir)
+        results = list(pipeline.run(requests([5] * 8, 'SDF')))
+        self.assertEqual(len(results), 8)
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(result.filing.id_rssd, 5)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_errors(self):
+        pipeline = Pipeline(self.stub.client(), parse_workers=1,
+                            tmpdir=self.tmpdir)
+        panel, errors = pipeline.panel(requests([1, 2]) +
+                                       requests([3], 'PDF'))
+        self.assertEqual(sorted(panel.id_rssd), [1, 2])
+        self.assertEqual([error.request[3] for error in errors], [3])
+        self.assertEqual(pipeline.stats['parse'].failures, 1)
+
+        with StubServer(panel_size=10, fault_rate=1.0) as stub:
+            pipeline = Pipeline(stub.client(), parse_workers=1, retries=0,
+                                tmpdir=self.tmpdir)
+            result, = pipeline.run(requests([1]))
+            self.assertIsNotNone(result.error)
+            self.assertEqual(pipeline.stats['fetch'].failures, 1)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def tearDown(self):
+        os.rmdir(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test pickling FFIEC_Client for worker processes (ffipy.snapshot)
+# ------------------------------------------------------------------------------
+
+import unittest
+import multiprocessing
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+from ffipy import FFIEC_Client
+from ffipy.cache import WSDLCache
+from ffipy.snapshot import init_worker, worker_client
+from ffipy.transport import PooledTransport
+
+from tests.stub_server import StubServer
+from tests.utils import (FakeTransport, seed_cache, soap_response,
+                         wsdl_content)
+
+
+def retrieve_filers(_):
+    return list(worker_client().retrieve_filers_since_date(raw=True))
+
+
+class Snapshot_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubServer(panel_size=20).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def client(self):
+        client = self.stub.client()
+        # Unpickled clients must not need the cache (or network) for the WSDL
+        client.transport.cache = None
+        return client
+
+    def test_pickle(self):
+        client = self.client()
+        restored = pickle.loads(pickle.dumps(client))
+        self.assertIsInstance(restored.transport, PooledTransport)
+        self.assertIsNot(restored.transport.adapter, client.transport.adapter)
+        self.assertFalse(restored.interactive)
+        self.assertEqual(restored.wsse.username, 'user')
+        self.assertEqual(restored.retrieve_filers_since_date(raw=True),
+                         client.retrieve_filers_since_date(raw=True))
+
+    def test_process_pool(self):
+        expected = self.client().retrieve_filers_since_date(raw=True)
+        for method in ('fork', 'spawn'):
+            if method not in multiprocessing.get_all_start_methods():
+                continue
+            with ProcessPoolExecutor(
+                    max_workers=2, initializer=init_worker,
+                    initargs=(self.client(),),
+                    mp_context=multiprocessing.get_context(method)) as pool:
+                for filers in pool.map(retrieve_filers, range(4)):
+                    self.assertEqual(filers, expected)
+
+    def test_wsdl_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = WSDLCache(path=os.path.join(tmpdir, 'wsdl.db'))
+            cache.add(FFIEC_Client.wsdl, wsdl_content)
+            restored = pickle.loads(pickle.dumps(cache))
+            self.assertEqual(restored.get(FFIEC_Client.wsdl), wsdl_content)
+
+
+class NonInteractive_TestCase(unittest.TestCase):
+    def test_missing_login(self):
+        with patch.dict(os.environ, {'FFIEC_USER_CONF': os.devnull + 'x'}), \
+                patch('builtins.input', side_effect=AssertionError):
+            with self.assertRaises(ValueError):
+                FFIEC_Client(transport=FakeTransport({}, seed_cache()),
+                             interactive=False)
+
+    def test_refused_login(self):
+        transport = FakeTransport({'TestUserAccess': lambda message: (
+            200, soap_response('TestUserAccess', 'false'))}, seed_cache())
+        with patch('builtins.input', side_effect=AssertionError):
+            with self.assertRaises(ValueError):
+                FFIEC_Client(wsse=('user', 'token'), transport=transport,
+                             store_login=False, interactive=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
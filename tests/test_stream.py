@@ -0,0 +1,105 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test streaming facsimiles to disk with ffipy.stream
+# ------------------------------------------------------------------------------
+
+import unittest
+import base64
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+import requests
+from zeep.exceptions import Fault, TransportError
+
+from tests.utils import offline_client, soap_response, soap_fault
+
+
+class FakeSession(object):
+    """A requests session whose posts reply with `content` as a raw stream."""
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.posted = []
+
+    def post(self, address, data=None, headers=None, timeout=None,
+             stream=False):
+        self.posted.append((headers['SOAPAction'], data))
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.raw = io.BytesIO(self.content)
+        return response
+
+
+class Stream_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.outfile = os.path.join(self.tmpdir, 'facsimile.pdf')
+        self.client = offline_client()
+
+    def stream_reply(self, operation, payload, status_code=200):
+        content = soap_response(operation,
+                                base64.encodebytes(payload).decode())
+        self.client.transport.session = FakeSession(content, status_code)
+
+    def test_retrieve_facsimile(self):
+        payload = os.urandom(300000)
+        self.stream_reply('RetrieveFacsimile', payload)
+        size = self.client.retrieve_facsimile(outfile=self.outfile,
+                                              stream=True)
+        self.assertEqual(size, len(payload))
+        with open(self.outfile, 'rb') as f:
+            self.assertEqual(f.read(), payload)
+
+        # The request is built by zeep, including the wsse header
+        action, message = self.client.transport.session.posted[0]
+        self.assertIn(b'<wsse:Username>user</wsse:Username>', message)
+
+    def test_retrieve_ubpr_xbrl_facsimile_to_file_object(self):
+        payload = b'<xbrl/>' * 1000
+        self.stream_reply('RetrieveUBPRXBRLFacsimile', payload)
+        sink = io.BytesIO()
+        self.client.retrieve_ubpr_xbrl_facsimile(outfile=sink, stream=True)
+        self.assertEqual(sink.getvalue(), payload)
+
+    def test_bounded_memory(self):
+        payload = os.urandom(8 * 1024 * 1024)
+        self.stream_reply('RetrieveFacsimile', payload)
+        del payload
+        tracemalloc.start()
+        try:
+            self.client.retrieve_facsimile(outfile=self.outfile, stream=True)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 2 * 1024 * 1024)
+        self.assertEqual(os.path.getsize(self.outfile), 8 * 1024 * 1024)
+
+    def test_fault(self):
+        self.client.transport.session = FakeSession(soap_fault('No access'),
+                                                    500)
+        with self.assertRaises(Fault) as cm:
+            self.client.retrieve_facsimile(outfile=self.outfile, stream=True)
+        self.assertEqual(cm.exception.message, 'No access')
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_invalid_response(self):
+        self.client.transport.session = FakeSession(b'Service Unavailable',
+                                                    503)
+        with self.assertRaises(TransportError):
+            self.client.retrieve_facsimile(outfile=self.outfile, stream=True)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_outfile_required(self):
+        with self.assertRaises(ValueError):
+            self.client.retrieve_facsimile(stream=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test FFIEC_Client against the local stub FFIEC SOAP server
+# ------------------------------------------------------------------------------
+
+import unittest
+import io
+
+import zeep
+
+from ffipy.parse import parse_facsimile
+
+from tests.stub_server import StubServer
+
+
+class StubServer_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubServer(panel_size=200, pdf_size=4096, items=50).start()
+        cls.client = cls.stub.client()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def test_metadata(self):
+        self.assertTrue(self.client.test_user_access())
+        self.assertIn('3/31/2017', self.client.retrieve_reporting_periods())
+        self.assertIn('2017-03-31',
+                      self.client.retrieve_ubpr_reporting_periods())
+
+    def test_lists(self):
+        panel = self.client.retrieve_panel_of_reporters()
+        self.assertEqual(len(panel), 200)
+        self.assertEqual(len(self.client.retrieve_panel_of_reporters(
+            raw=True)), 200)
+        self.assertEqual(len(self.client.retrieve_filers_since_date()), 180)
+        filers = self.client.retrieve_filers_submission_datetime(raw=True)
+        self.assertEqual(len(filers), 180)
+
+    def test_facsimiles(self):
+        pdf = self.client.retrieve_facsimile(fiID=1)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        filing = parse_facsimile(self.client.retrieve_facsimile(
+            fiID=7, facsimile_fmt='XBRL'))
+        self.assertEqual(filing.id_rssd, 7)
+        self.assertEqual(len(filing.values), 50)
+        filing = parse_facsimile(self.client.retrieve_facsimile(
+            fiID=7, facsimile_fmt='SDF'))
+        self.assertEqual(filing.values['RCON0001'], 8.0)
+
+        outfile = io.BytesIO()
+        self.client.retrieve_ubpr_xbrl_facsimile(fiID=3, outfile=outfile,
+                                                 stream=True)
+        self.assertEqual(parse_facsimile(outfile.getvalue()).id_rssd, 3)
+
+    def test_faults(self):
+        with StubServer(panel_size=10, fault_rate=1.0,
+                        fault_operations=['RetrieveFacsimile']) as stub:
+            client = stub.client()
+            self.assertTrue(client.test_user_access())
+            with self.assertRaises(zeep.exceptions.Fault):
+                client.retrieve_facsimile(fiID=1)
+            self.assertEqual(stub.calls['RetrieveFacsimile'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
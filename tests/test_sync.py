@@ -0,0 +1,111 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the incremental sync engine in ffipy.sync
+# ------------------------------------------------------------------------------
+
+import unittest
+import base64
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+
+from ffipy.sync import FilingSync, parse_submission_datetime
+
+from tests.utils import offline_client, soap_response, soap_fault
+
+
+class FilingSync_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filers = {}
+        self.broken = set()
+        self.client = offline_client({
+            'RetrieveFilersSubmissionDateTime': self.reply_filers,
+            'RetrieveFacsimile': self.reply_facsimile,
+        })
+        self.sync = FilingSync(self.client,
+                               os.path.join(self.tmpdir, 'sync.db'),
+                               self.outfile, retries=0)
+
+    def outfile(self, request):
+        return os.path.join(self.tmpdir, '%d.pdf' % request[3])
+
+    def reply_filers(self, message):
+        result = ''.join('<RetrieveFilersDateTime><ID_RSSD>%d</ID_RSSD>%s'
+                         '</RetrieveFilersDateTime>'
+                         % (id_rssd, '<DateTime>%s</DateTime>' % dt
+                            if dt else '')
+                         for id_rssd, dt in sorted(self.filers.items()))
+        return 200, soap_response('RetrieveFilersSubmissionDateTime', result)
+
+    def reply_facsimile(self, message):
+        fiID = int(re.search(rb'<ns0:fiID>(\d+)<', message).group(1))
+        if fiID in self.broken:
+            return 500, soap_fault('Unavailable')
+        content = base64.b64encode(b'%d' % fiID).decode()
+        return 200, soap_response('RetrieveFacsimile', content)
+
+    def test_incremental(self):
+        self.filers = {1: '4/20/2017 10:00:00 AM', 2: '4/21/2017 9:30:00 PM'}
+        report = self.sync.sync('3/31/2017')
+        self.assertEqual(sorted(report.new), [1, 2])
+        self.assertEqual(report.amended, [])
+        self.assertTrue(os.access(self.outfile((None,) * 3 + (2,)), os.R_OK))
+
+        # Nothing changed
+        posted = len(self.client.transport.posted)
+        report = self.sync.sync('3/31/2017')
+        self.assertEqual(report.new + report.amended, [])
+        self.assertEqual(len(self.client.transport.posted), posted + 1)
+
+        # Filer 2 amended
+        self.filers[2] = '5/2/2017 8:00:00 AM'
+        report = self.sync.sync('3/31/2017')
+        self.assertEqual(report.new, [])
+        self.assertEqual(report.amended, [2])
+        self.assertEqual(self.sync.state.high_water('Call', '3/31/2017'),
+                         datetime(2017, 5, 2, 8))
+
+    def test_resume_after_failure(self):
+        self.filers = {1: '4/20/2017 10:00:00 AM', 3: '4/20/2017 11:00:00 AM'}
+        self.broken.add(3)
+        report = self.sync.sync('3/31/2017')
+        self.assertEqual(report.new, [1])
+        self.assertEqual(list(report.failed), [3])
+
+        # Filer 3 is no longer listed since the high-water mark, but is still
+        # pending from the last run
+        self.filers = {}
+        self.broken.clear()
+        report = self.sync.sync('3/31/2017')
+        self.assertEqual(report.new, [3])
+        self.assertEqual(self.sync.state.pending('Call', '3/31/2017'), {})
+
+    def test_nil_datetime_skipped(self):
+        self.filers = {1: '4/20/2017 10:00:00 AM', 2: None, 3: 'soon'}
+        with self.assertLogs('ffipy.sync', 'WARNING') as logs:
+            report = self.sync.sync('3/31/2017')
+        self.assertEqual(report.new, [1])
+        self.assertEqual(len(logs.output), 2)
+
+        # Listed with a DateTime later, the filer is synced
+        self.filers[2] = '4/22/2017 10:00:00 AM'
+        self.filers[3] = '4/22/2017 11:00:00 AM'
+        self.assertEqual(sorted(self.sync.sync('3/31/2017').new), [2, 3])
+
+    def test_parse_submission_datetime(self):
+        self.assertEqual(parse_submission_datetime('4/21/2017 9:30:00 PM'),
+                         datetime(2017, 4, 21, 21, 30))
+        with self.assertRaises(ValueError):
+            parse_submission_datetime('yesterday')
+        with self.assertRaises(ValueError):
+            parse_submission_datetime(None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the precompiled SOAP requests of ffipy.template
+# ------------------------------------------------------------------------------
+
+import unittest
+import base64
+
+from zeep.exceptions import Fault
+from zeep.wsdl.utils import etree_to_string
+from zeep.wsse.username import UsernameToken
+
+from ffipy import template
+
+from tests.stub_server import StubServer
+from tests.utils import offline_client, soap_fault, soap_response
+
+ARGS = ('Call', '3/31/2017', 'ID_RSSD', 37, 'PDF')
+
+
+def zeep_request(client, operation, args):
+    """Returns the request body zeep builds for a call."""
+    service = client.service
+    envelope, _ = service._binding._create(
+        operation, args, {}, client=client,
+        options=service._binding_options)
+    return etree_to_string(envelope)
+
+
+class Template_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.messages = []
+
+        def facsimile(message):
+            self.messages.append(message)
+            if b'<ns0:fiID>0<' in message:
+                return 500, soap_fault('Invalid fiID')
+            return 200, soap_response('RetrieveFacsimile',
+                                      base64.b64encode(b'PDF').decode())
+
+        self.client = offline_client({'RetrieveFacsimile': facsimile})
+
+    def test_same_request_as_zeep(self):
+        for args in (ARGS, ('UBPR', '12/31/2016', 'FDICCertNumber', 0,
+                            'XBRL'),
+                     ('Call', 'a < b & c > d', 'ID_RSSD', -5, 'SDF')):
+            address, body, headers = template.request(
+                self.client, 'RetrieveFacsimile', args)
+            self.assertEqual(body, zeep_request(self.client,
+                                                'RetrieveFacsimile', args))
+        self.assertEqual(headers['SOAPAction'], '"http://cdr.ffiec.gov/'
+                         'public/services/RetrieveFacsimile"')
+        self.assertEqual(address,
+                         self.client.service._binding_options['address'])
+        self.assertEqual(len(self.client.request_templates), 1)
+
+    def test_invalid_characters(self):
+        for text in ('a\x00', 'a\x0bb', '\ufffe'):
+            args = ('Call', text, 'ID_RSSD', 37, 'PDF')
+            with self.assertRaises(ValueError):
+                zeep_request(self.client, 'RetrieveFacsimile', args)
+            with self.assertRaises(ValueError):
+                template.request(self.client, 'RetrieveFacsimile', args)
+        args = ('Call', 'a\tb\r\nc\x7f', 'ID_RSSD', 37, 'PDF')
+        self.assertEqual(
+            template.request(self.client, 'RetrieveFacsimile', args)[1],
+            zeep_request(self.client, 'RetrieveFacsimile', args))
+
+    def test_fallback_to_zeep(self):
+        # Optional args that are None are left out by zeep
+        args = ('Call', None, 'ID_RSSD', 37, 'PDF')
+        _, body, _ = template.request(self.client, 'RetrieveFacsimile', args)
+        self.assertNotIn(b'reportingPeriodEndDate', body)
+
+        # A digest login changes with every call, so is never templated
+        self.client.wsse = UsernameToken('user', 'token', use_digest=True)
+        self.assertIsNone(template.get(self.client, 'RetrieveFacsimile'))
+        _, body, _ = template.request(self.client, 'RetrieveFacsimile', ARGS)
+        self.assertIn(b'PasswordDigest', body)
+
+    def test_new_login(self):
+        template.request(self.client, 'RetrieveFacsimile', ARGS)
+        self.client.wsse = UsernameToken('other', 'secret')
+        _, body, _ = template.request(self.client, 'RetrieveFacsimile', ARGS)
+        self.assertIn(b'<wsse:Username>other</wsse:Username>', body)
+        self.assertEqual(len(self.client.request_templates), 2)
+
+    def test_retrieve_facsimile(self):
+        self.assertEqual(self.client.retrieve_facsimile(fiID=37), b'PDF')
+        self.assertEqual(self.messages[-1],
+                         zeep_request(self.client, 'RetrieveFacsimile', ARGS))
+        with self.assertRaises(Fault):
+            self.client.retrieve_facsimile(fiID=0)
+
+
+class Stub_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubServer(pdf_size=1024).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def test_round_trip(self):
+        client = self.stub.client()
+        self.assertEqual(client.retrieve_facsimile(*ARGS),
+                         client.service.RetrieveFacsimile(*ARGS))
+        self.assertEqual(client.retrieve_ubpr_xbrl_facsimile(*ARGS[1:4]),
+                         client.service.RetrieveUBPRXBRLFacsimile(*ARGS[1:4]))
+        self.assertEqual(len(client.request_templates), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the adaptive scheduler in ffipy.throttle
+# ------------------------------------------------------------------------------
+
+import unittest
+import threading
+import time
+
+import requests
+import zeep
+
+from ffipy import throttle
+from ffipy.throttle import (Scheduler, TokenBucket, BULK, INTERACTIVE,
+                            is_congestion)
+
+from tests.utils import offline_client, soap_response, soap_fault
+
+
+class TokenBucket_TestCase(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        wait = bucket.take()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.1)
+
+    def test_backoff_delay(self):
+        for attempt in range(8):
+            delay = throttle.backoff_delay(attempt, base=0.5, cap=10)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(10, 0.5 * 2 ** attempt))
+
+
+class Scheduler_TestCase(unittest.TestCase):
+    def test_concurrency_limit(self):
+        scheduler = Scheduler(initial_concurrency=2, max_concurrency=2)
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def call():
+            with scheduler.slot('user'):
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.02)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(peak), 8)
+        self.assertEqual(max(peak), 2)
+
+    def test_aimd(self):
+        scheduler = Scheduler(initial_concurrency=4, max_concurrency=8)
+        for _ in range(5):
+            started = scheduler.acquire('user')
+            scheduler.release('user', started)
+        self.assertEqual(scheduler.concurrency('user'), 5)
+
+        # Calls that started before a cut do not cut again
+        first = scheduler.acquire('user')
+        second = scheduler.acquire('user')
+        scheduler.release('user', first, zeep.exceptions.Fault('Busy'))
+        scheduler.release('user', second, zeep.exceptions.Fault('Busy'))
+        self.assertEqual(scheduler.concurrency('user'), 2)
+
+        # Errors that are not congestion leave the limit alone
+        for error in (ValueError(), zeep.exceptions.Fault('Invalid fiID'),
+                      zeep.exceptions.TransportError(status_code=404)):
+            started = scheduler.acquire('user')
+            scheduler.release('user', started, error)
+            self.assertEqual(scheduler.concurrency('user'), 2)
+
+    def test_is_congestion(self):
+        for error in (zeep.exceptions.Fault('Server is busy.'),
+                      zeep.exceptions.Fault('Too many requests'),
+                      zeep.exceptions.TransportError(status_code=503),
+                      zeep.exceptions.TransportError(status_code=429),
+                      requests.ConnectionError()):
+            self.assertTrue(is_congestion(error), error)
+        for error in (zeep.exceptions.Fault('No data for the period'),
+                      zeep.exceptions.TransportError(status_code=400),
+                      zeep.exceptions.TransportError(status_code=200),
+                      zeep.exceptions.TransportError('Truncated base64'),
+                      ValueError()):
+            self.assertFalse(is_congestion(error), error)
+
+    def test_slow_call_is_congestion(self):
+        scheduler = Scheduler(initial_concurrency=4, target_latency=0.01)
+        with scheduler.slot('user'):
+            time.sleep(0.02)
+        self.assertEqual(scheduler.concurrency('user'), 2)
+
+    def test_accounts_are_independent(self):
+        scheduler = Scheduler(initial_concurrency=1, max_concurrency=1)
+        scheduler.acquire('user')
+        scheduler.acquire('other', timeout=0.1)
+        with self.assertRaises(TimeoutError):
+            scheduler.acquire('user', timeout=0.05)
+
+    def test_interactive_before_bulk(self):
+        scheduler = Scheduler(initial_concurrency=1, max_concurrency=1)
+        order = []
+
+        def call(name, priority):
+            with scheduler.slot('user', priority):
+                order.append(name)
+
+        started = scheduler.acquire('user')
+        bulk = threading.Thread(target=call, args=('bulk', BULK))
+        bulk.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=call,
+                                       args=('interactive', INTERACTIVE))
+        interactive.start()
+        time.sleep(0.05)
+        scheduler.release('user', started)
+        bulk.join()
+        interactive.join()
+        self.assertEqual(order, ['interactive', 'bulk'])
+
+    def test_rate(self):
+        scheduler = Scheduler(rate=50, burst=1, initial_concurrency=8)
+        start = time.monotonic()
+        for _ in range(6):
+            with scheduler.slot('user'):
+                pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class Client_TestCase(unittest.TestCase):
+    def test_client_calls_are_scheduled(self):
+        priorities = []
+
+        def reply(message):
+            priorities.append(throttle.current_priority())
+            return 500, soap_fault('Too many requests')
+
+        scheduler = Scheduler(initial_concurrency=4)
+        client = offline_client({
+            'RetrieveReportingPeriods':
+                lambda message: (200, soap_response(
+                    'RetrieveReportingPeriods',
+                    '<string>3/31/2017</string>')),
+            'RetrieveFacsimile': reply}, scheduler=scheduler)
+        self.assertEqual(client.retrieve_reporting_periods(), ['3/31/2017'])
+        self.assertEqual(scheduler.concurrency('user'), 4)
+
+        requests = [('Call', '3/31/2017', 'ID_RSSD', 1, 'PDF')]
+        result, = client.retrieve_facsimiles(requests, retries=0)
+        self.assertIsInstance(result.error, zeep.exceptions.Fault)
+        self.assertEqual(priorities, [BULK])
+        self.assertEqual(scheduler.concurrency('user'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the pooled HTTP transport in ffipy.transport
+# ------------------------------------------------------------------------------
+
+import unittest
+import gzip
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from ffipy import FFIEC_Client
+from ffipy.transport import PooledTransport
+
+from tests.utils import seed_cache, soap_response
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Replies to every post with a gzipped TestUserAccess response."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.ports.add(self.client_address[1])
+        body = soap_response('TestUserAccess', 'true')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.server.gzipped += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PooledTransport_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.ports = set()
+        self.server.gzipped = 0
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.address = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def client(self, transport):
+        client = FFIEC_Client(wsse=('user', 'token'), transport=transport,
+                              check_login=False)
+        return client.create_service(
+            '{http://cdr.ffiec.gov/public/services}RetrievalServiceSoap',
+            self.address)
+
+    def test_defaults(self):
+        transport = PooledTransport(pool_size=3, connect_timeout=1,
+                                    read_timeout=2)
+        self.assertEqual(transport.operation_timeout, (1, 2))
+        self.assertEqual(transport.pool_size, 3)
+        self.assertIn('gzip', transport.session.headers['Accept-Encoding'])
+
+    def test_client_default_transport(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with patch.dict(os.environ, {'FFIEC_CACHE_DIR': cache_dir}):
+                client = FFIEC_Client(wsse=('user', 'token'),
+                                      wsdl_cache=seed_cache(),
+                                      check_login=False)
+        self.assertIsInstance(client.transport, PooledTransport)
+
+    def test_shared_pool_reuses_connections(self):
+        transport = PooledTransport(pool_size=2, cache=seed_cache())
+        services = [self.client(transport)] + [
+            self.client(transport.shared()) for _ in range(3)]
+
+        def call(i):
+            return services[i % len(services)].TestUserAccess()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(call, range(40)))
+        self.assertTrue(all(results))
+        # Every request was gzipped, over at most pool_size connections
+        self.assertEqual(self.server.gzipped, 40)
+        self.assertLessEqual(len(self.server.ports), 2)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
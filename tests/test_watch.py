@@ -0,0 +1,162 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: To test the filing watcher in ffipy.watch
+# ------------------------------------------------------------------------------
+
+import unittest
+import asyncio
+import re
+import time
+from datetime import datetime
+
+from ffipy.watch import FilingEvent, FilingWatcher
+
+from tests.utils import offline_client, soap_fault, soap_response
+
+
+class FilingWatcher_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.filers = {'3/31/2017': {}, '12/31/2016': {}}
+        self.periods = ['9/30/2016', '12/31/2016', '3/31/2017']
+        self.since = []
+        self.broken = False
+        self.client = offline_client({
+            'RetrieveReportingPeriods': self.reply_periods,
+            'RetrieveFilersSubmissionDateTime': self.reply_filers,
+        })
+
+    def reply_periods(self, message):
+        result = ''.join('<string>%s</string>' % period
+                         for period in self.periods)
+        return 200, soap_response('RetrieveReportingPeriods', result)
+
+    def reply_filers(self, message):
+        if self.broken:
+            return 500, soap_fault('Server is busy.')
+        period = re.search(rb'<ns0:reportingPeriodEndDate>([^<]+)<',
+                           message).group(1).decode()
+        since = re.search(rb'<ns0:lastUpdateDateTime>([^<]+)<',
+                          message).group(1).decode()
+        self.since.append((period, since))
+        filers = sorted(self.filers[period].items())
+        result = ''.join('<RetrieveFilersDateTime><ID_RSSD>%d</ID_RSSD>%s'
+                         '</RetrieveFilersDateTime>'
+                         % (id_rssd, '<DateTime>%s</DateTime>' % dt
+                            if dt else '')
+                         for id_rssd, dt in filers)
+        return 200, soap_response('RetrieveFilersSubmissionDateTime', result)
+
+    def test_events(self):
+        seen = []
+        watcher = FilingWatcher(self.client, callbacks=[seen.append])
+        self.filers['3/31/2017'] = {1: '4/20/2017 10:00:00 AM'}
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.watched, ['3/31/2017', '12/31/2016'])
+        self.assertEqual(watcher.high_water[('Call', '3/31/2017')],
+                         datetime(2017, 4, 20, 10))
+
+        self.filers['3/31/2017'] = {1: '4/22/2017 9:00:00 AM',
+                                    2: '4/21/2017 8:00:00 AM'}
+        self.filers['12/31/2016'] = {3: '4/21/2017 7:00:00 AM'}
+        events = watcher.poll()
+        self.assertEqual(events, [
+            FilingEvent('new', 'Call', '12/31/2016', 3,
+                        datetime(2017, 4, 21, 7)),
+            FilingEvent('new', 'Call', '3/31/2017', 2,
+                        datetime(2017, 4, 21, 8)),
+            FilingEvent('amended', 'Call', '3/31/2017', 1,
+                        datetime(2017, 4, 22, 9))])
+        self.assertEqual(seen, events)
+        # Polls only ask for filers since the high-water mark
+        self.assertEqual(self.since[-1], ('12/31/2016', '12/31/2016'))
+        self.assertEqual(self.since[-2], ('3/31/2017', '04/20/2017'))
+
+        # Nothing new
+        self.assertEqual(watcher.poll(), [])
+
+    def test_high_water(self):
+        watcher = FilingWatcher(self.client, periods=1, high_water={
+            '3/31/2017': datetime(2017, 4, 20)})
+        self.filers['3/31/2017'] = {1: '4/19/2017 10:00:00 AM',
+                                    2: '4/21/2017 10:00:00 AM'}
+        self.assertEqual([e.id_rssd for e in watcher.poll()], [2])
+
+    def test_new_period_not_baselined(self):
+        watcher = FilingWatcher(self.client, periods=1)
+        self.assertEqual(watcher.poll(), [])
+        self.periods.append('6/30/2017')
+        self.filers['6/30/2017'] = {1: '7/20/2017 10:00:00 AM'}
+        self.assertEqual(watcher.poll(), [
+            FilingEvent('new', 'Call', '6/30/2017', 1,
+                        datetime(2017, 7, 20, 10))])
+
+    def test_late_and_nil_filers(self):
+        watcher = FilingWatcher(self.client, periods=1)
+        watcher.poll()
+        self.filers['3/31/2017'] = {1: '4/20/2017 10:15:00 AM',
+                                    2: None, 4: 'soon'}
+        with self.assertLogs('ffipy.watch', 'WARNING') as logs:
+            self.assertEqual([e.id_rssd for e in watcher.poll()], [1])
+        self.assertEqual(len(logs.output), 2)
+        # A filing submitted earlier but visible only now is still new
+        self.filers['3/31/2017'][3] = '4/20/2017 10:00:00 AM'
+        self.assertEqual(watcher.poll(), [
+            FilingEvent('new', 'Call', '3/31/2017', 3,
+                        datetime(2017, 4, 20, 10))])
+        self.assertEqual(watcher.high_water[('Call', '3/31/2017')],
+                         datetime(2017, 4, 20, 10, 15))
+
+    def test_failing_callback(self):
+        seen = []
+
+        def broken(event):
+            raise RuntimeError('broken')
+
+        watcher = FilingWatcher(self.client, periods=1, baseline=False,
+                                callbacks=[broken, seen.append])
+        self.filers['3/31/2017'] = {1: '4/20/2017 10:00:00 AM'}
+        with self.assertLogs('ffipy.watch', 'ERROR'):
+            events = watcher.poll()
+        self.assertEqual(seen, events)
+        self.assertEqual(len(events), 1)
+
+    def test_interval(self):
+        watcher = FilingWatcher(self.client, busy_interval=10,
+                                idle_interval=100)
+        watcher.poll()
+        self.assertEqual(watcher.interval(datetime(2017, 4, 15)), 10)
+        self.assertEqual(watcher.interval(datetime(2017, 6, 15)), 100)
+
+    def test_thread_and_failures(self):
+        self.broken = True
+        watcher = FilingWatcher(self.client, busy_interval=0.01,
+                                idle_interval=0.01)
+        watcher.start()
+        try:
+            for _ in range(100):
+                if watcher.failures >= 2:
+                    break
+                time.sleep(0.01)
+        finally:
+            watcher.stop(timeout=5)
+        self.assertGreaterEqual(watcher.failures, 2)
+        self.assertIn('busy', str(watcher.last_error))
+
+    def test_asyncio_queue(self):
+        watcher = FilingWatcher(self.client, periods=1, busy_interval=0.01,
+                                idle_interval=0.01, baseline=False)
+        self.filers['3/31/2017'] = {1: '4/20/2017 10:00:00 AM'}
+
+        async def first_event():
+            queue = asyncio.Queue()
+            task = asyncio.ensure_future(watcher.watch(queue))
+            try:
+                return await asyncio.wait_for(queue.get(), 5)
+            finally:
+                task.cancel()
+        event = asyncio.run(first_event())
+        self.assertEqual((event.kind, event.id_rssd), ('new', 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
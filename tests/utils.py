@@ -0,0 +1,121 @@
+#!/bin/python
+# ------------------------------------------------------------------------------
+# Purpose: helpers for testing ffipy without access to the FFIEC SOAP servers
+# ------------------------------------------------------------------------------
+
+import os
+
+import requests
+import zeep
+from zeep.cache import InMemoryCache
+
+from ffipy import FFIEC_Client
+from ffipy.cache import WSDLCache
+
+# Local copy of the RetrievalService WSDL
+wsdl_path = os.path.join(os.path.dirname(__file__), 'data',
+                         'RetrievalService.wsdl')
+with open(wsdl_path, 'rb') as f:
+    wsdl_content = f.read()
+
+envelope = ('<?xml version="1.0" encoding="utf-8"?>'
+            '<soap:Envelope '
+            'xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+            '<soap:Body>%s</soap:Body></soap:Envelope>')
+
+fault = ('<soap:Fault><faultcode>soap:Server</faultcode>'
+         '<faultstring>%s</faultstring></soap:Fault>')
+
+
+def seed_cache(path=None, timeout=None):
+    """Returns a cache holding the local copy of the WSDL.
+
+    The cache is a WSDLCache at `path`, or an InMemoryCache if path is None.
+    """
+    if path is None:
+        cache = InMemoryCache(timeout=timeout)
+    else:
+        cache = WSDLCache(path=path, timeout=timeout)
+    cache.add(FFIEC_Client.wsdl, wsdl_content)
+    return cache
+
+
+def soap_response(operation, result):
+    """Returns a SOAP response envelope for `operation` holding `result`."""
+    body = ('<{0}Response xmlns="http://cdr.ffiec.gov/public/services">'
+            '<{0}Result>{1}</{0}Result></{0}Response>'
+            .format(operation, result))
+    return (envelope % body).encode('utf-8')
+
+
+def soap_fault(message):
+    """Returns a SOAP fault envelope with the given message."""
+    return (envelope % (fault % message)).encode('utf-8')
+
+
+class OfflineTransport(zeep.Transport):
+    """A zeep.Transport that fails loudly if it touches the network."""
+
+    def _load_remote_data(self, url):
+        raise AssertionError('Unexpected download of %s' % url)
+
+    def post(self, address, message, headers):
+        raise AssertionError('Unexpected post to %s' % address)
+
+
+class FakeTransport(OfflineTransport):
+    """A transport replying to operations with canned responses.
+
+    Args:
+        replies (dict): maps operation name to a function taking the request
+            envelope (bytes) and returning a tuple (status_code, content)
+    """
+
+    def __init__(self, replies, cache=None):
+        OfflineTransport.__init__(self, cache=cache)
+        self.replies = replies
+        self.posted = []
+
+    def post(self, address, message, headers):
+        operation = headers['SOAPAction'].strip('"').rsplit('/', 1)[-1]
+        self.posted.append(operation)
+        status_code, content = self.replies[operation](message)
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers['Content-Type'] = 'text/xml; charset=utf-8'
+        response._content = content
+        return response
+
+
+def offline_client(replies=None, **kwargs):
+    """Returns an FFIEC_Client using a FakeTransport and the local WSDL."""
+    transport = FakeTransport(replies or {}, cache=seed_cache())
+    return FFIEC_Client(wsse=('user', 'token'), transport=transport,
+                        check_login=False, **kwargs)
+
+
+def reporter(id_rssd, state='WY', filing_type='041', has_filed=True):
+    """Returns a dict with the fields of an institution in the panel."""
+    return {'ID_RSSD': id_rssd, 'FDICCertNumber': id_rssd + 1000,
+            'OCCChartNumber': 0, 'OTSDockNumber': 0,
+            'PrimaryABARoutNumber': id_rssd + 2000,
+            'Name': 'BANK %d' % id_rssd, 'State': state, 'City': 'CITY',
+            'Address': '%d MAIN ST' % id_rssd, 'ZIP': '82001',
+            'FilingType': filing_type,
+            'HasFiledForReportingPeriod': has_filed}
+
+
+def panel_result(reporters):
+    """Returns the RetrievePanelOfReportersResult XML for the reporters."""
+    fields = ('ID_RSSD', 'FDICCertNumber', 'OCCChartNumber', 'OTSDockNumber',
+              'PrimaryABARoutNumber', 'Name', 'State', 'City', 'Address',
+              'ZIP', 'FilingType', 'HasFiledForReportingPeriod')
+    rows = []
+    for r in reporters:
+        values = dict(r, HasFiledForReportingPeriod=str(
+            r['HasFiledForReportingPeriod']).lower())
+        rows.append('<ReportingFinancialInstitution>%s'
+                    '</ReportingFinancialInstitution>'
+                    % ''.join('<{0}>{1}</{0}>'.format(f, values[f])
+                              for f in fields))
+    return ''.join(rows)